@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录验证及认证日志
+"""
+
+import atexit
+import hashlib
+import hmac
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import namedtuple
+from typing import Mapping, Optional
+
+# 认证日志文件及轮转设置
+AUTH_LOG_FILE = "auth.log"
+AUTH_LOG_MAX_BYTES = 5 * 1024 * 1024
+AUTH_LOG_BACKUP_COUNT = 5
+
+# 密码哈希使用的盐值
+# 实际应用中应该使用环境变量或其他安全方式存储
+PASSWORD_SALT = "RD_COST_SALT"
+
+# 未配置 secrets 时使用的默认凭据（仅用于开发环境）
+DEFAULT_USERNAME = "xd"
+DEFAULT_PASSWORD_HASH = "5c28b8dab232deda9713e631a3d5e2718f5cb082f5e8a688eec4742c3ac56e77"
+
+# 登录凭据：password_hash 与 password（明文，不推荐）二选一；source 为来源说明
+Credentials = namedtuple('Credentials', ['username', 'password_hash', 'password', 'source'])
+
+logger = logging.getLogger("auth")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def configure_auth_logging(path: str = AUTH_LOG_FILE) -> logging.Logger:
+    """配置认证日志（进程内只配置一次，重复调用直接返回）
+
+    调用方只把日志记录放入内存队列，由后台线程写入按大小轮转的日志文件及控制台，
+    登录请求不会因为写文件而相互阻塞。
+
+    Args:
+        path: 日志文件路径
+
+    Returns:
+        认证日志 logger
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return logger
+
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        file_handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=AUTH_LOG_MAX_BYTES,
+            backupCount=AUTH_LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        log_queue: queue.Queue = queue.Queue(-1)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        # 进程退出时把队列中剩余的日志写完
+        atexit.register(_listener.stop)
+    return logger
+
+
+def hash_password(password: str, salt: str = PASSWORD_SALT) -> str:
+    """对密码进行加盐哈希"""
+    return hashlib.sha256((password + salt).encode('utf-8')).hexdigest()
+
+
+def load_credentials(secrets: Mapping) -> Credentials:
+    """从 secrets 的 login 段读取凭据，读取失败时回退到默认凭据
+
+    Args:
+        secrets: 如 st.secrets
+
+    Returns:
+        Credentials
+    """
+    try:
+        login = secrets["login"]
+        password_hash = login.get("password_hash")
+        return Credentials(
+            username=login["username"],
+            password_hash=password_hash,
+            password=None if password_hash else login["password"],
+            source="secrets"
+        )
+    except Exception as e:
+        logger.warning("未读取到登录凭据配置，使用默认凭据: %s", e)
+        return Credentials(DEFAULT_USERNAME, DEFAULT_PASSWORD_HASH, None, "default")
+
+
+def verify_credentials(username: str, password: str, credentials: Credentials) -> bool:
+    """验证用户名和密码（只在内存中比较，使用常量时间比较）
+
+    日志只记录用户名、凭据来源和结果，不记录密码或哈希值。
+    """
+    if credentials.password_hash:
+        password_ok = hmac.compare_digest(hash_password(password), credentials.password_hash)
+    else:
+        password_ok = hmac.compare_digest(password.encode('utf-8'), credentials.password.encode('utf-8'))
+    result = hmac.compare_digest(username.encode('utf-8'), credentials.username.encode('utf-8')) and password_ok
+
+    logger.info("登录验证: 用户=%s, 凭据来源=%s, 结果=%s", username, credentials.source, result)
+    return result
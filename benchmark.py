@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库与看板热点路径的基准测试
+
+覆盖 WeeklyReportDB 增删改查、不同数据量下的 get_all_reports / get_reports_frame / aggregate、
+看板的环比计算以及对比表格 HTML 生成。结果写入 JSON 文件，并可与保存的基线比较，
+最短耗时（多轮取最优，受调度和缓存抖动影响最小）超过 基线 × (1 + 容差) + 噪声下限
+时判为回归。超出的测试项会重新运行一遍测试复测（最多 --confirm-runs 次），取各次中的
+最短耗时，仍然超出才以非零状态退出，共享机器上一段时间的整体变慢不会造成误报：
+
+    python benchmark.py --save-baseline          # 在基准机器上生成基线
+    python benchmark.py                          # 之后每次运行与基线比较
+    python benchmark.py --sizes 1000 100000      # 只测部分数据量
+
+测试数据由 generate_sample_data.generate_frame 以固定种子生成，
+按 (行数, 种子, 结构版本) 缓存在 --data-dir 目录中，重复运行时直接复用。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from database import WeeklyReportDB, REPORT_FIELDS, SCHEMA_VERSION
+from generate_sample_data import generate_frame
+from metrics import METRICS, compute_changes
+from report_table import render_comparison_table
+
+# 默认数据量（行数）
+DEFAULT_SIZES = (1000, 100000, 1000000)
+# 每个团队的周数，行数 = 团队数 × WEEKS_PER_TEAM
+WEEKS_PER_TEAM = 1000
+# 生成测试数据的随机种子
+BENCH_SEED = 20240101
+# 最后一周的周一（固定，保证每次生成的数据一致）
+BENCH_END_MONDAY = date(2024, 12, 30)
+
+DEFAULT_REPEAT = 15
+# 每项至少持续测量的时间（秒）与最多轮数：短耗时项的各轮分散在更长时间内，
+# 不会全部落在同一段系统抖动里
+DEFAULT_MIN_TIME = 0.5
+MAX_ROUNDS = 200
+DEFAULT_TOLERANCE = 0.25
+# 绝对噪声下限（秒）：亚毫秒级的测试项相差几十微秒不算回归
+DEFAULT_NOISE_FLOOR = 0.001
+# 按名称前缀单独设置的容差：批量写入受 fsync / WAL 检查点影响，波动明显更大
+CASE_TOLERANCES = {
+    'crud.insert_many': 0.5,
+    'crud.upsert_many': 0.5,
+    'crud.delete_reports': 0.5,
+    'crud.restore_reports': 0.5,
+}
+# 发现回归时重新运行测试复测的最多次数
+DEFAULT_CONFIRM_RUNS = 2
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_DATA_DIR = '.benchmarks'
+
+
+def time_call(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None,
+              min_time: float = DEFAULT_MIN_TIME) -> Dict:
+    """重复执行并统计耗时（秒）
+
+    至少执行 repeat 轮；总用时不足 min_time 时继续执行，最多 MAX_ROUNDS 轮。
+
+    Args:
+        func: 被测函数
+        repeat: 最少重复次数
+        setup: 每次执行前调用、不计入耗时的准备函数
+        min_time: 至少持续测量的时间（秒）
+
+    Returns:
+        包含 rounds / min / median / mean 的字典
+    """
+    timings = []
+    began = time.perf_counter()
+    while len(timings) < repeat or (time.perf_counter() - began < min_time and len(timings) < MAX_ROUNDS):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {
+        'rounds': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+    }
+
+
+def prepare_database(rows: int, data_dir: str) -> str:
+    """生成（或复用缓存的）指定行数的测试数据库，返回文件路径"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench_{rows}_s{BENCH_SEED}_v{SCHEMA_VERSION}.db")
+    if os.path.exists(path):
+        return path
+
+    teams = max(rows // WEEKS_PER_TEAM, 1)
+    weeks = min(rows, WEEKS_PER_TEAM)
+    print(f"生成测试数据库: {teams} 个团队 × {weeks} 周 ...", file=sys.stderr)
+
+    building = path + '.building'
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(building + suffix):
+            os.remove(building + suffix)
+    db = WeeklyReportDB(building)
+    team_ids = [1] + [db.create_team(f"压测团队{number}") for number in range(2, teams + 1)]
+    db.bulk_load(generate_frame(weeks, teams, seed=BENCH_SEED, end_monday=BENCH_END_MONDAY,
+                                team_ids=team_ids))
+    with db.connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close()
+    os.replace(building, path)
+    return path
+
+
+def bench_crud(path: str, repeat: int) -> Dict[str, Dict]:
+    """单条增删改查及批量写入（在数据库副本上执行）"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        copy = os.path.join(workdir, 'crud.db')
+        shutil.copy(path, copy)
+        db = WeeklyReportDB(copy)
+
+        template = {field: 1 for field in REPORT_FIELDS}
+        template['bug_fix_rate'] = 95.0
+        # 写入数据之后的周，避免与已有数据冲突
+        next_monday = [BENCH_END_MONDAY + timedelta(weeks=1)]
+
+        def new_week() -> Dict:
+            monday = next_monday[0]
+            next_monday[0] += timedelta(weeks=1)
+            return dict(template, monday_date=monday.isoformat(),
+                        sunday_date=(monday + timedelta(days=6)).isoformat())
+
+        created: List[int] = []
+        results['crud.insert_weekly_report'] = time_call(
+            lambda: created.append(db.insert_weekly_report(new_week())), repeat)
+
+        report_id = created[0]
+        results['crud.get_report_by_id.cold'] = time_call(
+            lambda: db.get_report_by_id(report_id), repeat, setup=db.clear_cache)
+        results['crud.get_report_by_id.cached'] = time_call(
+            lambda: db.get_report_by_id(report_id), repeat)
+
+        update = dict(db.get_report_by_id(report_id))
+        results['crud.update_report'] = time_call(lambda: db.update_report(report_id, update), repeat)
+
+        # 每轮先插入一条再删除，轮数不受前面插入条数的限制
+        results['crud.delete_report'] = time_call(
+            lambda: db.delete_report(created.pop()), repeat,
+            setup=lambda: created.append(db.insert_weekly_report(new_week())))
+
+        batch = []
+        results['crud.insert_many_1000'] = time_call(
+            lambda: db.insert_many(batch),
+            repeat,
+            setup=lambda: batch.__setitem__(slice(None), [new_week() for _ in range(1000)])
+        )
+        results['crud.upsert_many_1000'] = time_call(lambda: db.upsert_many(batch), repeat)
+
+        # 批量软删除并恢复最后一批写入的 1000 条（单个事务）
+        batch_ids = [outcome.report_id for outcome in db.upsert_many(batch)]
+        results['crud.delete_reports_1000'] = time_call(
+            lambda: db.delete_reports(batch_ids), repeat, setup=lambda: db.restore_reports(batch_ids))
+        results['crud.restore_reports_1000'] = time_call(
+            lambda: db.restore_reports(batch_ids), repeat, setup=lambda: db.delete_reports(batch_ids))
+        db.close()
+    return results
+
+
+def bench_reads(path: str, rows: int, repeat: int) -> Dict[str, Dict]:
+    """整表读取、DataFrame 构建、环比计算及表格渲染"""
+    results = {}
+    db = WeeklyReportDB(path)
+
+    results[f'read.get_all_reports.{rows}'] = time_call(db.get_all_reports, repeat, setup=db.clear_cache)
+
+    columns = ['team_id', 'monday_date', 'sunday_date'] + list(METRICS)
+    # 只保留最后一次的结果：轮数增加时不累积大量 DataFrame
+    frame_holder = []
+    results[f'read.get_reports_frame.{rows}'] = time_call(
+        lambda: frame_holder.__setitem__(slice(None), [db.get_reports_frame(columns=columns)]), repeat, setup=db.clear_cache)
+    frame = frame_holder[-1]
+
+    # 看板趋势图的数据库聚合（单个团队按周，带移动平均）
+    results[f'read.aggregate.{rows}'] = time_call(
+        lambda: db.aggregate(METRICS, window=13, team_id=1), repeat, setup=db.clear_cache)
+
+    changes_holder = []
+    results[f'dashboard.compute_changes.{rows}'] = time_call(
+        lambda: changes_holder.__setitem__(slice(None), [compute_changes(frame, group_by='team_id')]), repeat)
+
+    # 对比表格按看板的方式取单个团队的数据渲染
+    team_frame = compute_changes(db.get_reports_frame(columns=columns[1:], team_id=1))
+    results['dashboard.render_comparison_table.52w'] = time_call(
+        lambda: render_comparison_table(team_frame, window=52), repeat)
+
+    db.close()
+    return results
+
+
+def case_tolerance(name: str, tolerance: float) -> float:
+    """测试项的容差：CASE_TOLERANCES 中按前缀配置的与默认容差取较大者"""
+    for prefix, case in CASE_TOLERANCES.items():
+        if name.startswith(prefix):
+            return max(case, tolerance)
+    return tolerance
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                          tolerance: float, noise_floor: float = DEFAULT_NOISE_FLOOR) -> List[str]:
+    """与基线比较最短耗时，返回回归项的说明
+
+    Args:
+        results: 本次结果
+        baseline: 基线结果
+        tolerance: 默认允许的相对变慢比例
+        noise_floor: 绝对噪声下限（秒）
+
+    Returns:
+        回归项的说明列表
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        case = case_tolerance(name, tolerance)
+        limit = baseline[name]['min'] * (1 + case) + noise_floor
+        if result['min'] > limit:
+            regressions.append(
+                f"{name}: {result['min'] * 1000:.2f}ms > 基线 {baseline[name]['min'] * 1000:.2f}ms"
+                f" × {1 + case:.2f} + {noise_floor * 1000:.2f}ms"
+            )
+    return regressions
+
+
+def environment_info() -> Dict:
+    """运行环境信息，随结果一起保存"""
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'schema_version': SCHEMA_VERSION,
+        'seed': BENCH_SEED,
+    }
+
+
+def run_benchmarks(sizes: List[int], repeat: int, data_dir: str) -> Dict[str, Dict]:
+    """运行全部测试项，增删改查只在最小的数据量上测试"""
+    results: Dict[str, Dict] = {}
+    sizes = sorted(sizes)
+    for rows in sizes:
+        path = prepare_database(rows, data_dir)
+        if rows == sizes[0]:
+            results.update(bench_crud(path, repeat))
+        results.update(bench_reads(path, rows, repeat))
+    return results
+
+
+def merge_best(results: Dict[str, Dict], rerun: Dict[str, Dict]) -> Dict[str, Dict]:
+    """合并复测结果：每项保留最短耗时更小的一次"""
+    merged = dict(results)
+    for name, result in rerun.items():
+        if name not in merged or result['min'] < merged[name]['min']:
+            merged[name] = result
+    return merged
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="周报系统基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="测试的数据量（行数）")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="每项重复次数")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="结果 JSON 文件")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线 JSON 文件")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="允许的相对变慢比例")
+    parser.add_argument('--noise-floor', type=float, default=DEFAULT_NOISE_FLOOR, help="绝对噪声下限（秒）")
+    parser.add_argument('--confirm-runs', type=int, default=DEFAULT_CONFIRM_RUNS,
+                        help="发现回归时重新运行复测的最多次数")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="测试数据库缓存目录")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.repeat, args.data_dir)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.noise_floor)
+        for attempt in range(1, args.confirm_runs + 1):
+            if not regressions:
+                break
+            print(f"{len(regressions)} 项超出基线，第 {attempt} 次复测 ...", file=sys.stderr)
+            results = merge_best(results, run_benchmarks(args.sizes, args.repeat, args.data_dir))
+            regressions = compare_with_baseline(results, baseline, args.tolerance, args.noise_floor)
+
+    for name, result in sorted(results.items()):
+        print(f"{name:<45} median {result['median'] * 1000:>10.3f}ms   min {result['min'] * 1000:>10.3f}ms")
+
+    report = {'environment': environment_info(), 'results': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+
+    if args.save_baseline:
+        shutil.copy(args.output, args.baseline)
+        print(f"已保存为基线 {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"未找到基线 {args.baseline}，跳过回归检查（使用 --save-baseline 生成）")
+        return 0
+
+    if regressions:
+        print("\n❌ 发现性能回归:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\n✅ 未发现性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+趋势图构建：点数较多时在服务端用 LTTB 降采样，并自动切换为 WebGL 渲染
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+# 所有曲线的总点数超过该值时改用 WebGL（Scattergl）渲染
+WEBGL_THRESHOLD = 1000
+
+# 每条曲线最多保留的点数，超过时用 LTTB 降采样
+MAX_POINTS_PER_TRACE = 500
+
+# 单条曲线的点数不超过该值时显示数据点标记
+MARKER_THRESHOLD = 200
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标
+
+    首尾两点总是保留；其余点均分为 threshold-2 个桶，每个桶保留与
+    上一个保留点、下一个桶平均点组成三角形面积最大的点，从而保留峰谷形状。
+
+    Args:
+        x: 横坐标（数值或 datetime64，需升序）
+        y: 纵坐标
+        threshold: 保留的点数
+
+    Returns:
+        升序的下标数组
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+
+    # edges[i] 为第 i 个桶的起点，最后一个元素为末尾点的下标 n-1
+    every = (n - 2) / (threshold - 2)
+    edges = (np.floor(np.arange(threshold - 1) * every).astype('int64') + 1)
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _as_float(values) -> np.ndarray:
+    """横坐标转为浮点数（日期按纳秒时间戳）"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view('int64').astype('float64')
+    return values.astype('float64')
+
+
+def build_trend_figure(frame: pd.DataFrame, x_column: str, metrics: Dict[str, str],
+                       title: str, xaxis_title: str,
+                       max_points: int = MAX_POINTS_PER_TRACE,
+                       webgl_threshold: int = WEBGL_THRESHOLD) -> go.Figure:
+    """构建多指标趋势图
+
+    Args:
+        frame: 按横坐标升序的数据
+        x_column: 横坐标列
+        metrics: 曲线名称 -> 指标列
+        title: 图表标题
+        xaxis_title: 横轴标题
+        max_points: 每条曲线最多保留的点数
+        webgl_threshold: 总点数超过该值时使用 WebGL
+
+    Returns:
+        plotly Figure
+    """
+    x = frame[x_column].to_numpy()
+    total_points = len(frame) * len(metrics)
+    trace_class = go.Scattergl if total_points > webgl_threshold else go.Scatter
+
+    fig = go.Figure()
+    downsampled: Optional[int] = None
+    for name, column in metrics.items():
+        y = frame[column].to_numpy()
+        indices = lttb_indices(x, y, max_points)
+        if len(indices) < len(y):
+            downsampled = len(indices)
+        show_markers = len(indices) <= MARKER_THRESHOLD
+        fig.add_trace(trace_class(
+            x=x[indices],
+            y=y[indices],
+            mode='lines+markers' if show_markers else 'lines',
+            name=name,
+            line=dict(width=3 if show_markers else 2),
+            marker=dict(size=8)
+        ))
+
+    if downsampled is not None:
+        title = f"{title}（{len(frame)} 个点已降采样为 {downsampled} 个，缩小范围可查看完整数据）"
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=xaxis_title,
+        yaxis_title="数值",
+        hovermode='x unified',
+        height=500
+    )
+    return fig
+
+
+def add_anomaly_markers(fig: go.Figure, anomalies: pd.DataFrame, labels: Dict[str, str]):
+    """在趋势图上用红色标记标出异常点
+
+    Args:
+        fig: build_trend_figure 生成的图
+        anomalies: WeeklyReportDB.get_anomalies 的结果
+        labels: 指标 -> 显示名称
+    """
+    if anomalies.empty:
+        return
+    fig.add_trace(go.Scatter(
+        x=anomalies['monday_date'],
+        y=anomalies['value'],
+        mode='markers',
+        name='异常',
+        marker=dict(color='red', size=14, symbol='circle-open', line=dict(width=3)),
+        text=[f"{labels.get(metric, metric)}: z = {z:+.1f}" for metric, z in zip(anomalies['metric'], anomalies['z'])],
+        hovertemplate='%{text}<extra></extra>'
+    ))
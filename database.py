@@ -6,257 +6,2973 @@
 
 import sqlite3
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import re
+import json
+import math
+import queue
+import logging
+import functools
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Iterator, Callable, Tuple, Sequence
 
+import numpy as np
+import pandas as pd
 
+from perf import instrument_methods
+
+
+logger = logging.getLogger(__name__)
+
+
+# 连接池大小（Streamlit 每次重跑都在新线程中执行，因此使用连接池而不是线程局部连接）
+POOL_SIZE = 4
+
+# 每个连接缓存的预编译语句数量
+STATEMENT_CACHE_SIZE = 256
+
+# 获取连接时的最长等待时间（秒）
+POOL_TIMEOUT = 30.0
+
+# 读缓存最多保留的查询结果数
+READ_CACHE_SIZE = 128
+
+# 在线回填时每个事务处理的行数（按 id 区间划分）
+BACKFILL_CHUNK_SIZE = 5000
+
+# 每个新连接都会执行的PRAGMA
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+# 回填默认按 weekly_reports.id 划分区间，该语句返回回填开始时的最大 id
+BACKFILL_KEY_SQL = "SELECT COALESCE(MAX(id), 0) FROM weekly_reports"
+
+# 一个迁移步骤：upgrade(conn) 在单个事务内执行结构变更；
+# backfill(conn, first, last) 可选，按键区间 (first, last] 分批回填，每批一个事务；
+# 键默认为 weekly_reports.id，backfill_key 为返回最大键值的SQL，backfill_chunk 为每批的键数
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade', 'backfill',
+                                     'backfill_key', 'backfill_chunk'])
+
+# 迁移注册表：版本号 -> Migration，按版本号从小到大依次执行
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, description: str, backfill: Optional[Callable] = None,
+              backfill_key: str = BACKFILL_KEY_SQL, backfill_chunk: int = BACKFILL_CHUNK_SIZE):
+    """注册一个数据库迁移的装饰器
+
+    Args:
+        version: 迁移版本号，必须唯一且递增
+        description: 迁移说明
+        backfill: 可选的分批回填函数
+        backfill_key: 返回回填最大键值的SQL，默认按 weekly_reports.id
+        backfill_chunk: 每批回填的键数
+
+    Returns:
+        装饰器
+    """
+    def decorator(upgrade: Callable) -> Callable:
+        if version in MIGRATIONS:
+            raise ValueError(f"迁移版本 {version} 重复注册")
+        MIGRATIONS[version] = Migration(version, description, upgrade, backfill, backfill_key, backfill_chunk)
+        return upgrade
+    return decorator
+
+
+# 未指定团队时使用的默认团队（迁移前的单团队数据都归入该团队）
+DEFAULT_TEAM_ID = 1
+
+# 周报数据字段（与 INSERT/UPDATE 语句中 team_id 之后的参数顺序一致）
+REPORT_FIELDS = (
+    'monday_date', 'sunday_date', 'online_requirements', 'online_req_count',
+    'fixed_bugs', 'new_bugs', 'bug_fix_rate', 'release_orders', 'release_failures',
+    'new_reuse_units', 'new_reuse_events'
+)
+
+INSERT_REPORT_SQL = """
+    INSERT INTO weekly_reports (
+        team_id, monday_date, sunday_date, online_requirements, online_req_count,
+        fixed_bugs, new_bugs, bug_fix_rate, release_orders, release_failures,
+        new_reuse_units, new_reuse_events
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_REPORT_SQL = """
+    UPDATE weekly_reports SET
+        team_id = COALESCE(?, team_id),
+        monday_date = ?,
+        sunday_date = ?,
+        online_requirements = ?,
+        online_req_count = ?,
+        fixed_bugs = ?,
+        new_bugs = ?,
+        bug_fix_rate = ?,
+        release_orders = ?,
+        release_failures = ?,
+        new_reuse_units = ?,
+        new_reuse_events = ?,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+# 同一团队同一周已存在时什么也不做，由 rowcount 判断是否插入成功（命中团队周唯一索引）
+INSERT_REPORT_IF_ABSENT_SQL = INSERT_REPORT_SQL + """
+    ON CONFLICT (team_id, monday_date, sunday_date) DO NOTHING
+"""
+
+# 按团队周唯一键更新指标（命中团队周唯一索引）
+UPDATE_REPORT_BY_WEEK_SQL = """
+    UPDATE weekly_reports SET
+        online_requirements = ?,
+        online_req_count = ?,
+        fixed_bugs = ?,
+        new_bugs = ?,
+        bug_fix_rate = ?,
+        release_orders = ?,
+        release_failures = ?,
+        new_reuse_units = ?,
+        new_reuse_events = ?,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE team_id = ? AND monday_date = ? AND sunday_date = ?
+"""
+
+# 按团队周唯一键查询ID（命中团队周唯一索引）
+SELECT_REPORT_ID_BY_WEEK_SQL = """
+    SELECT id FROM weekly_reports WHERE team_id = ? AND monday_date = ? AND sunday_date = ?
+"""
+
+
+# 各列在 DataFrame 中的类型（get_reports_frame 按列直接构造数组，不经过逐行字典）
+COLUMN_DTYPES = {
+    'id': 'int64',
+    'team_id': 'int64',
+    'monday_date': 'datetime64[s]',
+    'sunday_date': 'datetime64[s]',
+    'online_requirements': 'int64',
+    'online_req_count': 'int64',
+    'fixed_bugs': 'int64',
+    'new_bugs': 'int64',
+    'bug_fix_rate': 'float64',
+    'release_orders': 'int64',
+    'release_failures': 'int64',
+    'new_reuse_units': 'int64',
+    'new_reuse_events': 'int64',
+    'created_at': 'datetime64[s]',
+    'updated_at': 'datetime64[s]',
+    'release_failure_rate': 'float64',
+    'net_bug_change': 'int64',
+    'reqs_per_requirement': 'float64',
+}
+
+# 汇总表维护的指标（按周累加）
+ROLLUP_METRICS = (
+    'online_requirements', 'online_req_count', 'fixed_bugs', 'new_bugs',
+    'release_orders', 'release_failures', 'new_reuse_units', 'new_reuse_events'
+)
+
+# 由周报指标派生、以生成列存储在 weekly_reports 中的指标：名称 -> (列类型, 基于同一行指标的SQL表达式)
+# 按周期聚合时同一表达式作用于周期合计，比率按合计重新计算而不是对各周比率取平均
+DERIVED_METRICS = OrderedDict([
+    ('release_failure_rate', ('REAL', "CASE WHEN release_orders > 0 THEN release_failures * 100.0 / release_orders END")),
+    ('net_bug_change', ('INTEGER', "new_bugs - fixed_bugs")),
+    ('reqs_per_requirement', ('REAL', "CASE WHEN online_requirements > 0 THEN online_req_count * 1.0 / online_requirements END")),
+])
+
+
+def _bug_fix_rate_sql(fixed_bugs: str, new_bugs: str) -> str:
+    """BUG修复率的SQL表达式，口径同 compute_bug_fix_rate"""
+    return f"CASE WHEN {new_bugs} > 0 THEN round(min({fixed_bugs} * 100.0 / {new_bugs}, 100.0), 1) ELSE 100.0 END"
+
+
+def compute_bug_fix_rate(fixed_bugs, new_bugs):
+    """计算BUG修复率：解决的BUG数 / 新增BUG数（百分比，保留一位小数，封顶 100）
+
+    没有新增BUG时记为 100。
+
+    Args:
+        fixed_bugs: 解决的BUG数（数值或数组）
+        new_bugs: 新增BUG数（数值或数组）
+
+    Returns:
+        与输入形状相同的修复率，标量输入返回 float
+    """
+    fixed = np.asarray(fixed_bugs, dtype='float64')
+    new = np.asarray(new_bugs, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(new > 0, np.minimum(fixed * 100 / new, 100.0), 100.0).round(1)
+    return float(rate) if rate.ndim == 0 else rate
+
+
+# 未提供时由其他指标计算的周报字段
+COMPUTED_FIELDS = ('bug_fix_rate',)
+
+# 比率类指标：不可累加，聚合时由合计重新计算，没有周期平均值和滚动合计
+RATIO_METRICS = ('bug_fix_rate', 'release_failure_rate', 'reqs_per_requirement')
+
+# aggregate 及团队汇总支持的指标：可累加指标、派生指标及BUG修复率
+AGGREGATE_METRICS = ROLLUP_METRICS + tuple(DERIVED_METRICS) + ('bug_fix_rate',)
+
+# 汇总粒度，周报按其周一日期归入对应的月/季度/年
+ROLLUP_GRANULARITIES = ('month', 'quarter', 'year')
+
+# 写入时增量维护滚动统计（EWMA 均值/方差、滚动均值）的指标
+STATS_METRICS = ROLLUP_METRICS
+
+# 看板默认提醒异常的指标
+ANOMALY_METRICS = ('release_failures', 'new_bugs')
+
+# EWMA 的跨度（周），平滑系数 alpha = 2 / (span + 1)
+EWMA_SPAN = 13
+EWMA_ALPHA = 2 / (EWMA_SPAN + 1)
+
+# 滚动均值包含的周报数
+STATS_WINDOW = 13
+
+# 此前至少有这么多份周报时才计算 z 分数
+ANOMALY_MIN_HISTORY = 8
+
+# |z| 达到该值视为异常
+ANOMALY_THRESHOLD = 3.0
+
+# aggregate 支持的统计周期：周直接聚合周报，月/季度/年读取汇总表
+AGGREGATE_PERIODS = ('week',) + ROLLUP_GRANULARITIES
+
+# aggregate 支持的分组维度
+AGGREGATE_GROUPS = ('team_id',)
+
+# 各统计周期回看 N 个周期对应的 SQLite 日期修饰符（数量, 单位）
+PERIOD_MODIFIERS = {
+    'week': (7, 'days'),
+    'month': (1, 'months'),
+    'quarter': (3, 'months'),
+    'year': (1, 'years'),
+}
+
+
+
+def _metric_sql(metric: str) -> str:
+    """指标基于周报指标列（或其周期合计）的SQL表达式"""
+    if metric == 'bug_fix_rate':
+        return _bug_fix_rate_sql('fixed_bugs', 'new_bugs')
+    if metric in DERIVED_METRICS:
+        return DERIVED_METRICS[metric][1]
+    return metric
+
+
+def _metric_inputs(metric: str) -> List[str]:
+    """计算指标需要的可累加指标"""
+    expression = _metric_sql(metric)
+    return [column for column in ROLLUP_METRICS if re.search(rf"\b{column}\b", expression)]
+
+
+# 各汇总粒度组成的常量表
+ROLLUP_GRANULARITIES_SQL = " UNION ALL ".join(
+    f"SELECT '{granularity}' AS granularity" for granularity in ROLLUP_GRANULARITIES
+)
+
+
+def _rollup_period_sql(date_expr: str, granularity_expr: str = 'granularity') -> str:
+    """根据 granularity 列计算日期所在周期起始日期的SQL表达式"""
+    return f"""CASE {granularity_expr}
+        WHEN 'month' THEN date({date_expr}, 'start of month')
+        WHEN 'quarter' THEN printf('%s-%02d-01', strftime('%Y', {date_expr}),
+                                   (CAST(strftime('%m', {date_expr}) AS INTEGER) - 1) / 3 * 3 + 1)
+        ELSE date({date_expr}, 'start of year')
+    END"""
+
+
+# 批量写入时已存在的周直接按唯一键更新
+UPSERT_REPORT_SQL = INSERT_REPORT_SQL + """
+    ON CONFLICT (team_id, monday_date, sunday_date) DO UPDATE SET
+        online_requirements = excluded.online_requirements,
+        online_req_count = excluded.online_req_count,
+        fixed_bugs = excluded.fixed_bugs,
+        new_bugs = excluded.new_bugs,
+        bug_fix_rate = excluded.bug_fix_rate,
+        release_orders = excluded.release_orders,
+        release_failures = excluded.release_failures,
+        new_reuse_units = excluded.new_reuse_units,
+        new_reuse_events = excluded.new_reuse_events,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _partial_upsert_sql(fields: Tuple[str, ...]) -> str:
+    """已存在的周只更新指定指标的 UPSERT 语句（按字段组合缓存）
+
+    更新了解决/新增BUG数但没有给出BUG修复率时，按更新后的BUG数重新计算修复率。
+    """
+    updates = "".join(f"        {field} = excluded.{field},\n" for field in fields)
+    if 'bug_fix_rate' not in fields and ('fixed_bugs' in fields or 'new_bugs' in fields):
+        fixed_bugs, new_bugs = (f"excluded.{field}" if field in fields else field
+                                for field in ('fixed_bugs', 'new_bugs'))
+        updates += f"        bug_fix_rate = {_bug_fix_rate_sql(fixed_bugs, new_bugs)},\n"
+    return INSERT_REPORT_SQL + f"""
+    ON CONFLICT (team_id, monday_date, sunday_date) DO UPDATE SET
+{updates}        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+# 修改历史记录的字段（派生指标由这些字段计算，不单独记录）
+HISTORY_FIELDS = ('team_id',) + REPORT_FIELDS
+
+# as_of 可以返回的列
+HISTORY_COLUMNS = ('id',) + HISTORY_FIELDS
+
+# 修改历史每累计这么多条自动保存一次检查点（只保存上一个检查点之后修改过的周报）
+HISTORY_CHECKPOINT_INTERVAL = 10000
+
+# purge_checkpoints 默认保留的检查点数，更早的检查点合并进保留的最早一个
+HISTORY_CHECKPOINT_KEEP = 10
+
+# 修改历史及检查点的时间戳（UTC，毫秒精度）
+HISTORY_TIME_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# 修改历史的操作类型
+HISTORY_INSERT = 'insert'
+HISTORY_UPDATE = 'update'
+HISTORY_DELETE = 'delete'
+
+# 软删除时移入 deleted_reports 的列（生成列由恢复后的周报重新计算）
+ARCHIVE_COLUMNS = ('id', 'team_id') + REPORT_FIELDS + ('created_at', 'updated_at')
+
+# 当前上下文的操作人（记录到修改历史），按线程/协程上下文隔离
+_current_actor: ContextVar[Optional[str]] = ContextVar('report_actor', default=None)
+
+
+def set_current_actor(actor: Optional[str]):
+    """设置当前线程（协程）的操作人，此后的写入在修改历史中记为该操作人"""
+    _current_actor.set(actor)
+
+
+# iter_reports 默认每块读取的行数
+EXPORT_CHUNK_SIZE = 5000
+
+# 按周批量查询ID时每条语句包含的周数（每周3个参数，低于SQLite默认的999个参数上限）
+WEEK_LOOKUP_BATCH = 300
+
+# 批量写入的单行结果状态
+STATUS_INSERTED = 'inserted'
+STATUS_UPDATED = 'updated'
+STATUS_DUPLICATE = 'duplicate'
+STATUS_INVALID = 'invalid'
+
+# 批量写入的单行结果：index 为输入中的下标，report_id 在 invalid 时为 None
+RowOutcome = namedtuple('RowOutcome', ['index', 'report_id', 'status', 'error'])
+
+
+def cached_read(method: Callable) -> Callable:
+    """读方法缓存装饰器
+
+    结果按 (方法名, 参数) 缓存在内存中，并以数据代数（get_data_generation）为版本：
+    只要期间没有任何写入（包括其他进程的写入），相同查询直接返回缓存结果的副本。
+    在写事务内调用时不走缓存，保证能读到事务中尚未提交的修改。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self._local, 'depth', 0) > 0:
+            return method(self, *args, **kwargs)
+
+        key = (method.__name__, _freeze(args), _freeze(kwargs))
+        generation = self.get_data_generation()
+        with self._cache_lock:
+            entry = self._read_cache.get(key)
+            if entry is not None and entry[0] == generation:
+                self._read_cache.move_to_end(key)
+                return _copy_result(entry[1])
+
+        value = method(self, *args, **kwargs)
+
+        with self._cache_lock:
+            self._read_cache[key] = (generation, value)
+            self._read_cache.move_to_end(key)
+            while len(self._read_cache) > READ_CACHE_SIZE:
+                self._read_cache.popitem(last=False)
+        return _copy_result(value)
+
+    return wrapper
+
+
+def _pandas_copy_on_write() -> bool:
+    """pandas 是否启用写时复制（pandas 3 起总是启用，pandas 2 需打开 mode.copy_on_write）"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.get_option('mode.copy_on_write') is True
+
+
+def _freeze(value):
+    """将参数转换为可哈希的缓存键"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _copy_result(value):
+    """返回缓存结果的副本，避免调用方修改影响缓存
+
+    pandas 启用写时复制时 DataFrame 只做浅复制：调用方修改时才复制数据，
+    快照内存映射的列也不会在每次读取时被整体复制。
+    """
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=not _pandas_copy_on_write())
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_result(item) for item in value)
+    return value
+
+
+def _report_params(data: Dict) -> tuple:
+    """取出写入参数：团队ID（缺省为默认团队）+ 按 REPORT_FIELDS 顺序的周报字段值
+
+    未提供BUG修复率（或为空值）时按解决/新增BUG数计算。
+    """
+    if pd.isna(data.get('bug_fix_rate')):
+        data = dict(data, bug_fix_rate=compute_bug_fix_rate(data['fixed_bugs'], data['new_bugs']))
+    return (data.get('team_id', DEFAULT_TEAM_ID),) + tuple(data[field] for field in REPORT_FIELDS)
+
+
+def _date_range_conditions(start: Optional[str], end: Optional[str],
+                           team_id: Optional[int] = None) -> Tuple[List[str], List]:
+    """生成按团队及周一日期过滤的 WHERE 条件及参数"""
+    conditions, params = [], []
+    if team_id is not None:
+        conditions.append("team_id = ?")
+        params.append(int(team_id))
+    if start is not None:
+        conditions.append("monday_date >= ?")
+        params.append(str(start))
+    if end is not None:
+        conditions.append("monday_date <= ?")
+        params.append(str(end))
+    return conditions, params
+
+
+def _history_time(timestamp) -> str:
+    """时间点转换为修改历史中的时间戳（UTC，毫秒精度）
+
+    不带时区的时间按 UTC 处理（与 CURRENT_TIMESTAMP 一致）；只给日期时表示当天结束。
+    """
+    only_date = isinstance(timestamp, date) and not isinstance(timestamp, datetime)
+    if isinstance(timestamp, str):
+        only_date = len(timestamp.strip()) == 10
+    moment = pd.Timestamp(timestamp)
+    if moment.tzinfo is not None:
+        moment = moment.tz_convert('UTC').tz_localize(None)
+    if only_date:
+        moment += pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def _rows_to_frame(rows: List[tuple], columns: List[str],
+                   dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """将查询结果按列转换为带类型的 DataFrame，默认按 COLUMN_DTYPES 确定类型"""
+    dtypes = dtypes or COLUMN_DTYPES
+    if not rows:
+        return pd.DataFrame({column: np.array([], dtype=dtypes[column]) for column in columns})
+
+    data = {}
+    for column, values in zip(columns, zip(*rows)):
+        dtype = dtypes[column]
+        try:
+            data[column] = np.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            # 含 NULL 或历史脏数据时退回到 pandas 的宽松转换
+            if dtype.startswith('datetime64'):
+                data[column] = pd.to_datetime(pd.Series(values), errors='coerce')
+            else:
+                data[column] = pd.to_numeric(pd.Series(values), errors='coerce')
+    return pd.DataFrame(data, copy=False)
+
+
+def _validated_params(data: Dict) -> tuple:
+    """校验一条周报数据并返回写入参数
+
+    Raises:
+        ValueError: 缺少字段、日期格式错误或日期范围不是同一周
+    """
+    missing = [field for field in REPORT_FIELDS if field not in data and field not in COMPUTED_FIELDS]
+    if missing:
+        raise ValueError(f"缺少字段: {', '.join(missing)}")
+
+    try:
+        monday = date.fromisoformat(str(data['monday_date']))
+        sunday = date.fromisoformat(str(data['sunday_date']))
+    except ValueError:
+        raise ValueError(f"日期格式错误: {data['monday_date']} / {data['sunday_date']}，应为 YYYY-MM-DD")
+    if sunday - monday != timedelta(days=6):
+        raise ValueError(f"时间范围 {data['monday_date']} 至 {data['sunday_date']} 不是完整的一周")
+
+    try:
+        team_id = int(data.get('team_id', DEFAULT_TEAM_ID))
+    except (TypeError, ValueError):
+        raise ValueError(f"团队ID无效: {data.get('team_id')}")
+
+    # 日期统一为 YYYY-MM-DD 字符串，与库中存储及唯一索引的取值一致
+    return (team_id, monday.isoformat(), sunday.isoformat()) + _report_params(data)[3:]
+
+
+@instrument_methods('db')
 class WeeklyReportDB:
-    """周报表数据库操作类"""
-    
-    def __init__(self, db_path: str = "rd_report.db"):
+    """周报表数据库操作类
+
+    对象持有一个小型连接池，连接在多次调用之间复用，
+    从而避免每次操作都重新建立连接、重新编译SQL语句。
+    所有公开方法的耗时都会记录到 perf 模块（名称为 db.<方法名>）。
+    """
+
+    def __init__(self, db_path: str = "rd_report.db", pool_size: int = POOL_SIZE):
         """初始化数据库连接
-        
+
         Args:
             db_path: 数据库文件路径
+            pool_size: 连接池中最多保留的连接数
         """
         self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pool_lock = threading.Lock()
+        self._all_connections = []
+        self._local = threading.local()
+        self._cache_lock = threading.Lock()
+        self._read_cache = OrderedDict()
+        self._generation = 0
+        self._seen_data_versions: Dict[int, int] = {}
+        self._write_listeners: List[Callable[[], None]] = []
+        # 已由迁移建立的表（滚动统计、修改历史等），建立之前写事务提交时跳过相应的维护
+        self._installed_tables = set()
+        # 可选的列式快照（见 snapshot.ReportSnapshot），get_reports_frame 优先从快照读取
+        self.snapshot = None
         self.init_database()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建一个新的、已调优的数据库连接"""
+        # isolation_level=None: 由 transaction() 显式管理事务
+        # check_same_thread=False: 连接在线程之间借出/归还，但同一时刻只被一个线程使用
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=POOL_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        try:
+            conn.execute("SELECT sqrt(1)")
+        except sqlite3.OperationalError:
+            # 未启用数学函数的 SQLite 版本，由 Python 提供异常检测触发器用到的 sqrt
+            conn.create_function('sqrt', 1, math.sqrt, deterministic=True)
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        """从连接池借出一个连接，池中没有空闲连接且未满时新建"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if len(self._all_connections) < self.pool_size:
+                conn = self._connect()
+                self._all_connections.append(conn)
+                return conn
+
+        try:
+            return self._pool.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError(f"等待数据库连接超时 ({POOL_TIMEOUT}s)")
+
+    @contextmanager
+    def _detached_connection(self) -> Iterator[sqlite3.Connection]:
+        """借用一个不登记为当前线程连接的连接，用于跨 yield 长时间持有的读事务
+
+        持有期间同一线程的其他读写仍通过 connection() / transaction() 借用另一个连接，
+        不会与这里打开的事务冲突。
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._pool.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借用一个连接，同一线程内可重入
+
+        Yields:
+            sqlite3.Connection 对象
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                # 兜底：不要把未结束的事务归还给连接池
+                conn.execute("ROLLBACK")
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务上下文管理器
+
+        最外层使用 BEGIN IMMEDIATE 提前获取写锁，嵌套调用使用 SAVEPOINT；
+        正常退出时提交，抛出异常时回滚。
+
+        最外层提交前在写锁内重算被触发器标记的团队的滚动统计（见 _settle_stats）：追加最新一周、
+        修改最新一周不需要重算；删除、恢复、补录较早的周或修改日期时，从受影响的最早一周起重算，
+        耗时与该周之后的周数成正比。
+
+        Yields:
+            sqlite3.Connection 对象
+        """
+        with self.connection() as conn:
+            depth = getattr(self._local, 'depth', 0)
+            if depth == 0:
+                begin, commit = "BEGIN IMMEDIATE", "COMMIT"
+                rollback = ("ROLLBACK",)
+            else:
+                savepoint = f"sp_{depth}"
+                begin, commit = f"SAVEPOINT {savepoint}", f"RELEASE {savepoint}"
+                rollback = (f"ROLLBACK TO {savepoint}", f"RELEASE {savepoint}")
+
+            conn.execute(begin)
+            self._local.depth = depth + 1
+            try:
+                # 最外层事务记下开始前最后一条修改历史的序号，提交前为本事务追加的历史补写操作人
+                actor = _current_actor.get() if depth == 0 else None
+                history_start = self._history_seq(conn) if actor is not None else None
+                yield conn
+                if depth == 0:
+                    self._settle_stats(conn)
+                    if history_start is not None:
+                        conn.execute("UPDATE report_history SET actor = ? WHERE seq > ? AND actor IS NULL",
+                                     (actor, history_start))
+            except BaseException:
+                self._local.depth = depth
+                if conn.in_transaction:
+                    for statement in rollback:
+                        conn.execute(statement)
+                raise
+            self._local.depth = depth
+            conn.execute(commit)
+            if depth == 0:
+                self._bump_generation()
+
+    def _settle_stats(self, conn: sqlite3.Connection):
+        """写事务提交前重算本事务中被触发器标记为待重算的团队
+
+        统计随写入一起提交，读取方（get_anomalies 等）不需要写锁；没有待重算的团队时只做一次主键查询。
+        """
+        if not self._table_installed(conn, 'report_stats_dirty'):
+            return
+        teams = _recompute_stats(conn)
+        if teams:
+            logger.info("已重算 %d 个团队的滚动统计", teams)
+
+    def _history_seq(self, conn: sqlite3.Connection) -> Optional[int]:
+        """最后一条修改历史的序号，尚未启用修改历史时返回 None"""
+        if not self._table_installed(conn, 'report_history'):
+            return None
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM report_history").fetchone()[0]
+
+    def _table_installed(self, conn: sqlite3.Connection, name: str) -> bool:
+        """表是否已由迁移建立（建立后不会删除，只缓存已存在的结果）"""
+        if name not in self._installed_tables:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (name,)).fetchone() is None:
+                return False
+            self._installed_tables.add(name)
+        return True
+
+    def get_data_generation(self) -> int:
+        """获取数据代数，数据库内容发生变化后该值一定会增大
+
+        本进程内的写事务提交时直接递增；其他连接/进程的写入通过 PRAGMA data_version 感知。
+
+        Returns:
+            当前数据代数
+        """
+        with self.connection() as conn:
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            with self._cache_lock:
+                # 首次见到某个连接时无法确认它之前错过了哪些写入，按已变化处理
+                if self._seen_data_versions.get(id(conn)) != data_version:
+                    self._seen_data_versions[id(conn)] = data_version
+                    self._generation += 1
+                return self._generation
+
+    def _bump_generation(self):
+        """本进程写入后使读缓存失效，并通知写入监听器"""
+        with self._cache_lock:
+            self._generation += 1
+        for listener in list(self._write_listeners):
+            try:
+                listener()
+            except Exception:
+                logger.exception("写入监听器执行失败")
+
+    def add_write_listener(self, listener: Callable[[], None]):
+        """注册写入监听器：本进程的写事务提交后调用（在提交写入的线程中执行，应尽快返回）"""
+        self._write_listeners.append(listener)
+
+    def get_change_version(self) -> int:
+        """获取持久化的周报数据变更版本号
+
+        由触发器在每次插入/更新/删除周报时递增，跨进程、跨重启都可用于判断数据是否变化。
+
+        Returns:
+            变更版本号
+        """
+        with self.connection() as conn:
+            return conn.execute("SELECT version FROM report_changes WHERE id = 1").fetchone()[0]
+
+    def clear_cache(self):
+        """清空读缓存"""
+        with self._cache_lock:
+            self._read_cache.clear()
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        with self._pool_lock:
+            for conn in self._all_connections:
+                conn.close()
+            self._all_connections = []
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        with self._cache_lock:
+            self._seen_data_versions.clear()
+            self._read_cache.clear()
+
+    def get_schema_version(self) -> int:
+        """读取数据库中记录的结构版本
+
+        Returns:
+            PRAGMA user_version 的值
+        """
+        with self.connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
     def init_database(self):
-        """初始化数据库表结构"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建周报表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS weekly_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                monday_date DATE NOT NULL,
-                sunday_date DATE NOT NULL,
-                online_requirements INTEGER DEFAULT 0,
-                online_req_count INTEGER DEFAULT 0,
-                fixed_bugs INTEGER DEFAULT 0,
-                new_bugs INTEGER DEFAULT 0,
-                bug_fix_rate REAL DEFAULT 0.0,
-                release_orders INTEGER DEFAULT 0,
-                release_failures INTEGER DEFAULT 0,
-                new_reuse_units INTEGER DEFAULT 0,
-                new_reuse_events INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """初始化数据库表结构
+
+        已是最新版本的数据库只读取一次 user_version，不执行任何DDL或表结构检查。
+        """
+        if self.get_schema_version() >= SCHEMA_VERSION:
+            return
+
+        self.migrate()
+
+    def migrate(self, target: Optional[int] = None) -> List[int]:
+        """按版本号顺序执行尚未完成的迁移
+
+        每个迁移的结构变更与进度记录在同一事务中提交，只会执行一次；
+        带回填的迁移在结构变更后分批回填，每批一个短事务，中断后可从上次进度继续。
+        PRAGMA user_version 只在迁移（含回填）全部完成后才更新。
+
+        Args:
+            target: 目标版本，默认为 SCHEMA_VERSION
+
+        Returns:
+            本次完成的迁移版本号列表
+        """
+        target = SCHEMA_VERSION if target is None else target
+
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    backfill_last_id INTEGER DEFAULT 0,
+                    completed_at TIMESTAMP
+                )
+            """)
+
+        completed = []
+        for version in sorted(MIGRATIONS):
+            if version > target:
+                break
+            if version <= self.get_schema_version():
+                continue
+            self._apply_migration(MIGRATIONS[version])
+            completed.append(version)
+
+        return completed
+
+    def _apply_migration(self, step: Migration):
+        """执行单个迁移：结构变更 -> 分批回填 -> 标记完成"""
+        with self.transaction() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= step.version:
+                # 其他进程已完成该迁移
+                return
+
+            recorded = conn.execute(
+                "SELECT version FROM schema_migrations WHERE version = ?",
+                (step.version,)
+            ).fetchone()
+            if not recorded:
+                step.upgrade(conn)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                    (step.version, step.description)
+                )
+                logger.info("数据库迁移 v%d 已执行：%s", step.version, step.description)
+
+        if step.backfill is not None:
+            self._run_backfill(step)
+
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE schema_migrations SET completed_at = CURRENT_TIMESTAMP WHERE version = ?",
+                (step.version,)
             )
-        """)
-        
-        # 检查并添加new_bugs字段（用于数据库迁移）
-        self._migrate_add_new_bugs_column(cursor)
-        
-        conn.commit()
-        conn.close()
-    
-    def _migrate_add_new_bugs_column(self, cursor):
-        """迁移：添加new_bugs字段到现有表"""
-        try:
-            # 检查new_bugs字段是否存在
-            cursor.execute("PRAGMA table_info(weekly_reports)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'new_bugs' not in columns:
-                # 添加new_bugs字段
-                cursor.execute("ALTER TABLE weekly_reports ADD COLUMN new_bugs INTEGER DEFAULT 0")
-                print("数据库迁移：已添加new_bugs字段")
-        except Exception as e:
-            print(f"数据库迁移警告：{e}")
-    
+            if conn.execute("PRAGMA user_version").fetchone()[0] < step.version:
+                conn.execute(f"PRAGMA user_version = {step.version}")
+
+    def _run_backfill(self, step: Migration):
+        """按键区间（默认 id）分批执行回填，每批提交一次并记录进度
+
+        回填范围为开始时已存在的行，之后写入的行由新代码直接写出正确的值。
+        """
+        with self.connection() as conn:
+            last_id = conn.execute(
+                "SELECT backfill_last_id FROM schema_migrations WHERE version = ?",
+                (step.version,)
+            ).fetchone()[0]
+            max_id = conn.execute(step.backfill_key).fetchone()[0]
+
+        while last_id < max_id:
+            upper = min(last_id + step.backfill_chunk, max_id)
+            with self.transaction() as conn:
+                step.backfill(conn, last_id, upper)
+                conn.execute(
+                    "UPDATE schema_migrations SET backfill_last_id = ? WHERE version = ?",
+                    (upper, step.version)
+                )
+            last_id = upper
+            logger.info("数据库迁移 v%d 回填进度：%d/%d", step.version, last_id, max_id)
+
     def insert_weekly_report(self, data: Dict) -> int:
         """插入周报数据
-        
+
+        Args:
+            data: 周报数据字典
+
+        Returns:
+            插入记录的ID
+        """
+        with self.transaction() as conn:
+            # 直接插入，由周唯一索引拒绝重复记录，无需预先扫描
+            try:
+                cursor = conn.execute(INSERT_REPORT_SQL, _report_params(data))
+            except sqlite3.IntegrityError:
+                existing_record = conn.execute("""
+                    SELECT id FROM weekly_reports
+                    WHERE team_id = ? AND monday_date = ? AND sunday_date = ?
+                """, (data.get('team_id', DEFAULT_TEAM_ID), data['monday_date'], data['sunday_date'])).fetchone()
+                if not existing_record:
+                    raise
+                raise ValueError(f"该时间范围 ({data['monday_date']} 至 {data['sunday_date']}) 已存在记录 (ID: {existing_record[0]})，无法重复添加")
+
+            return cursor.lastrowid
+
+    def upsert_weekly_report(self, data: Dict) -> Tuple[int, bool]:
+        """插入或更新周报数据
+
+        以 (team_id, monday_date, sunday_date) 为唯一键：该团队该周不存在时插入，已存在时更新指标。
+        新周只执行一条 INSERT ... ON CONFLICT 语句；已存在的周再按唯一索引执行一次 UPDATE，
+        两步在同一个写事务内完成，并发会话之间不会产生重复记录。
+
+        Args:
+            data: 周报数据字典
+
+        Returns:
+            (记录ID, 是否为新插入) 元组
+        """
+        with self.transaction() as conn:
+            return self._upsert(conn, _report_params(data))
+
+    def _upsert(self, conn: sqlite3.Connection, params: tuple) -> Tuple[int, bool]:
+        """在当前事务内执行一次 upsert"""
+        cursor = conn.execute(INSERT_REPORT_IF_ABSENT_SQL, params)
+        if cursor.rowcount > 0:
+            return cursor.lastrowid, True
+
+        # 不用 UPDATE ... RETURNING（需要 SQLite 3.35），更新后按唯一键再查ID
+        conn.execute(UPDATE_REPORT_BY_WEEK_SQL, params[3:] + params[:3])
+        return conn.execute(SELECT_REPORT_ID_BY_WEEK_SQL, params[:3]).fetchone()[0], False
+
+    def insert_many(self, reports: List[Dict]) -> List[RowOutcome]:
+        """批量插入周报数据（单个事务，executemany）
+
+        已存在的周以及同一批次中重复的周不会写入，状态为 duplicate；
+        校验失败的行状态为 invalid，不影响其他行写入。
+
+        Args:
+            reports: 周报数据字典列表
+
+        Returns:
+            与输入一一对应的 RowOutcome 列表
+        """
+        return self._write_many(reports, upsert=False)
+
+    def upsert_many(self, reports: List[Dict], fields: Optional[Sequence[str]] = None) -> List[RowOutcome]:
+        """批量插入或更新周报数据（单个事务，executemany）
+
+        已存在的周按唯一键更新；同一批次中同一周出现多次时以最后一次为准。
+
+        Args:
+            reports: 周报数据字典列表
+            fields: 已存在的周只更新这些指标，其余指标保持原值；None 表示更新全部指标
+
+        Returns:
+            与输入一一对应的 RowOutcome 列表
+        """
+        sql = UPSERT_REPORT_SQL
+        if fields is not None:
+            unknown = set(fields) - set(REPORT_FIELDS[2:])
+            if unknown or not fields:
+                raise ValueError(f"无效的更新字段: {', '.join(sorted(unknown)) or '(空)'}")
+            sql = _partial_upsert_sql(tuple(field for field in REPORT_FIELDS[2:] if field in fields))
+        return self._write_many(reports, upsert=True, upsert_sql=sql)
+
+    def _write_many(self, reports: List[Dict], upsert: bool,
+                    upsert_sql: str = UPSERT_REPORT_SQL) -> List[RowOutcome]:
+        """insert_many / upsert_many 的共同实现"""
+        outcomes: List[Optional[RowOutcome]] = [None] * len(reports)
+        params_by_week: Dict[tuple, tuple] = {}
+        indexes_by_week: Dict[tuple, List[int]] = {}
+
+        for index, data in enumerate(reports):
+            try:
+                params = _validated_params(data)
+            except ValueError as e:
+                outcomes[index] = RowOutcome(index, None, STATUS_INVALID, str(e))
+                continue
+
+            week = params[:3]
+            if week in params_by_week and not upsert:
+                outcomes[index] = RowOutcome(index, None, STATUS_DUPLICATE, "同一批次中存在相同的时间范围")
+                continue
+            params_by_week[week] = params
+            indexes_by_week.setdefault(week, []).append(index)
+
+        if not params_by_week:
+            return outcomes
+
+        with self.transaction() as conn:
+            existing = self._lookup_week_ids(conn, list(params_by_week))
+
+            if upsert:
+                conn.executemany(upsert_sql, params_by_week.values())
+            else:
+                conn.executemany(
+                    INSERT_REPORT_SQL,
+                    [params for week, params in params_by_week.items() if week not in existing]
+                )
+
+            week_ids = self._lookup_week_ids(conn, list(params_by_week))
+
+        for week, indexes in indexes_by_week.items():
+            report_id = week_ids[week]
+            for index in indexes:
+                if week not in existing:
+                    status, error = STATUS_INSERTED, None
+                elif upsert:
+                    status, error = STATUS_UPDATED, None
+                else:
+                    status, error = STATUS_DUPLICATE, "该时间范围已存在记录"
+                outcomes[index] = RowOutcome(index, report_id, status, error)
+
+        # 同一批次中重复出现的周：首次出现的行才是插入，后续行都是更新
+        if upsert:
+            for week, indexes in indexes_by_week.items():
+                for index in indexes[1:]:
+                    outcomes[index] = outcomes[index]._replace(status=STATUS_UPDATED)
+
+        return outcomes
+
+    def bulk_load(self, frame: pd.DataFrame, keep_checkpoints: Optional[int] = None) -> int:
+        """一次性导入大量周报数据（压测、容量规划等场景）
+
+        与 insert_many 不同，不逐行校验也不返回逐行结果，数据需已对齐到整周。
+        在同一事务内先移除汇总、滚动统计、变更版本号及修改历史触发器，executemany 写入后再一次性
+        重建汇总表、重算涉及团队的滚动统计、递增版本号，并保存一个检查点代替逐行的修改历史，
+        避免每行触发多次更新。检查点只保存新插入的行及上一个检查点之后修改过的周报。
+        已存在的团队周会被跳过。
+
+        Args:
+            frame: 包含 REPORT_FIELDS 各列（及可选的 team_id 列）的 DataFrame，
+                日期列可以是 YYYY-MM-DD 字符串或日期类型；没有 bug_fix_rate 列时按解决/新增BUG数计算
+            keep_checkpoints: 导入后只保留最近这么多个检查点（见 purge_checkpoints），None 表示不清理
+
+        Returns:
+            实际插入的行数
+        """
+        columns = []
+        for field in ('team_id',) + REPORT_FIELDS:
+            if field not in frame.columns:
+                if field == 'team_id':
+                    columns.append([DEFAULT_TEAM_ID] * len(frame))
+                elif field == 'bug_fix_rate':
+                    columns.append(compute_bug_fix_rate(frame['fixed_bugs'], frame['new_bugs']).tolist())
+                else:
+                    raise ValueError(f"缺少字段: {field}")
+            elif field.endswith('_date') and pd.api.types.is_datetime64_any_dtype(frame[field]):
+                columns.append(frame[field].dt.strftime('%Y-%m-%d').tolist())
+            else:
+                # tolist() 转为 Python 原生类型，sqlite3 才能直接绑定
+                columns.append(frame[field].tolist())
+
+        with self.transaction() as conn:
+            _drop_rollups(conn)
+            _drop_version_triggers(conn)
+            _drop_stats_triggers(conn)
+            _drop_history_triggers(conn)
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM weekly_reports").fetchone()[0]
+            before = conn.total_changes
+            conn.executemany(INSERT_REPORT_IF_ABSENT_SQL, zip(*columns))
+            inserted = conn.total_changes - before
+            conn.execute("UPDATE report_changes SET version = version + 1 WHERE id = 1")
+            _install_version_triggers(conn)
+            _install_history_triggers(conn)
+            _create_checkpoint(conn, since_id=last_id)
+            if keep_checkpoints is not None:
+                _purge_checkpoints(conn, keep_checkpoints)
+            _install_stats_triggers(conn)
+            # 各团队从导入的最早一周起重算
+            earliest = {}
+            for team, monday in zip(columns[0], columns[1]):
+                monday = str(monday)[:10]
+                if monday < earliest.get(team, '9999'):
+                    earliest[team] = monday
+            conn.executemany("""
+                INSERT INTO report_stats_dirty (team_id, since) VALUES (?, ?)
+                ON CONFLICT (team_id) DO UPDATE SET since = min(since, excluded.since)
+            """, earliest.items())
+            _recompute_stats(conn)
+            _rebuild_rollups(conn)
+        logger.info("批量导入 %d 行，插入 %d 行", len(frame), inserted)
+        return inserted
+
+    def _lookup_week_ids(self, conn: sqlite3.Connection, weeks: List[tuple]) -> Dict[tuple, int]:
+        """按 (team_id, monday_date, sunday_date) 批量查询记录ID（走团队周唯一索引）"""
+        found = {}
+        for start in range(0, len(weeks), WEEK_LOOKUP_BATCH):
+            batch = weeks[start:start + WEEK_LOOKUP_BATCH]
+            placeholders = ", ".join(["(?, ?, ?)"] * len(batch))
+            # 以 VALUES 为驱动表逐周探测唯一索引（行值 IN 写法会退化为扫描整个索引）
+            rows = conn.execute(f"""
+                SELECT r.team_id, r.monday_date, r.sunday_date, r.id
+                FROM (VALUES {placeholders}) AS w
+                JOIN weekly_reports AS r
+                  ON r.team_id = w.column1 AND r.monday_date = w.column2 AND r.sunday_date = w.column3
+            """, [value for week in batch for value in week])
+            for team_id, monday_date, sunday_date, report_id in rows:
+                found[(team_id, monday_date, sunday_date)] = report_id
+        return found
+
+    @cached_read
+    def get_all_reports(self, team_id: Optional[int] = None) -> List[Dict]:
+        """获取所有周报数据
+
+        Args:
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            周报数据列表
+        """
+        conditions, params = _date_range_conditions(None, None, team_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT * FROM weekly_reports {where}
+                ORDER BY monday_date DESC
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    @cached_read
+    def get_reports_frame(self, columns: Optional[Sequence[str]] = None,
+                          start: Optional[str] = None, end: Optional[str] = None,
+                          team_id: Optional[int] = None) -> pd.DataFrame:
+        """以列式方式读取周报数据为 DataFrame（按周一日期升序）
+
+        只查询需要的列，按列直接构造带类型的数组，日期列已是 datetime64 类型，
+        调用方不需要再做 pd.to_datetime 转换。
+
+        Args:
+            columns: 需要的列，默认全部列
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            周报数据 DataFrame
+        """
+        columns = list(columns) if columns else list(COLUMN_DTYPES)
+        unknown = [column for column in columns if column not in COLUMN_DTYPES]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+
+        # 快照与数据库一致时直接从内存映射的快照读取
+        if self.snapshot is not None:
+            frame = self.snapshot.read_frame(columns, start, end, team_id)
+            if frame is not None:
+                return frame
+
+        conditions, params = _date_range_conditions(start, end, team_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # 元组行比 sqlite3.Row 更省开销，这里只需要按位置取列
+            cursor.row_factory = None
+            rows = cursor.execute(
+                f"SELECT {', '.join(columns)} FROM weekly_reports {where} ORDER BY monday_date",
+                params
+            ).fetchall()
+
+        return _rows_to_frame(rows, columns)
+
+    def iter_reports(self, chunk_size: int = EXPORT_CHUNK_SIZE, columns: Optional[Sequence[str]] = None,
+                     start: Optional[str] = None, end: Optional[str] = None,
+                     team_id: Optional[int] = None) -> Iterator[List[Dict]]:
+        """按块流式读取周报数据（按周一日期、ID 升序），用于导出等大数据量场景
+
+        基于 fetchmany 逐块读取，内存占用只与 chunk_size 有关；不经过读缓存。
+        迭代期间占用连接池中单独的一个连接，所有块来自同一个读事务快照；迭代期间同一线程
+        仍可以写入（写入不影响正在读取的快照）。在写事务中调用时使用该事务的连接，能读到未提交的修改。
+
+        Args:
+            chunk_size: 每块行数
+            columns: 需要的列，默认全部列
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+
+        Yields:
+            周报数据字典列表
+        """
+        columns = list(columns) if columns else list(COLUMN_DTYPES)
+        for rows in self._iter_rows(chunk_size, columns, start, end, team_id):
+            yield [dict(zip(columns, row)) for row in rows]
+
+    def iter_report_frames(self, chunk_size: int = EXPORT_CHUNK_SIZE, columns: Optional[Sequence[str]] = None,
+                           start: Optional[str] = None, end: Optional[str] = None,
+                           team_id: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """与 iter_reports 相同，但每块直接按列构造为带类型的 DataFrame（类型同 get_reports_frame）
+
+        Yields:
+            周报数据 DataFrame
+        """
+        columns = list(columns) if columns else list(COLUMN_DTYPES)
+        for rows in self._iter_rows(chunk_size, columns, start, end, team_id):
+            yield _rows_to_frame(rows, columns)
+
+    def _iter_rows(self, chunk_size: int, columns: List[str], start: Optional[str],
+                   end: Optional[str], team_id: Optional[int]) -> Iterator[List[tuple]]:
+        """按块读取元组行，供 iter_reports / iter_report_frames 使用"""
+        unknown = [column for column in columns if column not in COLUMN_DTYPES]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+
+        conditions, params = _date_range_conditions(start, end, team_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # 生成器在两块之间挂起，读事务不能占用当前线程的连接，否则期间的写入无法开始事务
+        in_write = getattr(self._local, 'depth', 0) > 0
+        with self.connection() if in_write else self._detached_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # 显式读事务：迭代期间其他连接的写入不会让前后块不一致
+            began = not conn.in_transaction
+            if began:
+                cursor.execute("BEGIN")
+            try:
+                cursor.execute(
+                    f"SELECT {', '.join(columns)} FROM weekly_reports {where} ORDER BY monday_date, id",
+                    params
+                )
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+                if began and conn.in_transaction:
+                    conn.execute("COMMIT")
+
+    @cached_read
+    def get_reports_in_range(self, start: Optional[str] = None, end: Optional[str] = None,
+                             team_id: Optional[int] = None) -> List[Dict]:
+        """获取周一日期在指定范围内的周报数据（按周一日期倒序，走 (团队, 周一日期) 索引）
+
+        Args:
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            周报数据列表
+        """
+        conditions, params = _date_range_conditions(start, end, team_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.connection() as conn:
+            cursor = conn.execute(
+                f"SELECT * FROM weekly_reports {where} ORDER BY monday_date DESC, id DESC",
+                params
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    @cached_read
+    def get_reports_page(self, limit: int = 50, after: Optional[Tuple[str, int]] = None,
+                         start: Optional[str] = None, end: Optional[str] = None,
+                         team_id: Optional[int] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """按键集（keyset）分页获取周报数据，按周一日期倒序
+
+        使用上一页最后一行的 (monday_date, id) 作为游标定位下一页，
+        每页只读取 limit 行，开销与翻到第几页无关。
+
+        Args:
+            limit: 每页行数
+            after: 上一页返回的游标，None 表示第一页
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            (本页周报数据列表, 下一页游标) 元组，没有下一页时游标为 None
+        """
+        conditions, params = _date_range_conditions(start, end, team_id)
+        if after is not None:
+            conditions.append("(monday_date, id) < (?, ?)")
+            params.extend([str(after[0]), int(after[1])])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.connection() as conn:
+            # 多取一行用于判断是否还有下一页
+            rows = conn.execute(
+                f"SELECT * FROM weekly_reports {where} ORDER BY monday_date DESC, id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        reports = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = reports[-1]
+            next_cursor = (last['monday_date'], last['id'])
+        return reports, next_cursor
+
+    @cached_read
+    def get_reports_by_metric(self, metric: str, descending: bool = True, limit: int = 20,
+                              min_value: Optional[float] = None, max_value: Optional[float] = None,
+                              start: Optional[str] = None, end: Optional[str] = None,
+                              team_id: Optional[int] = None) -> List[Dict]:
+        """按派生指标排序、过滤周报（可走派生指标生成列上的索引，只读取 limit 行）
+
+        指标无定义（如没有发布工单时的发布失败率）的周报不参与排序。
+
+        Args:
+            metric: 派生指标，取自 DERIVED_METRICS
+            descending: 是否按指标从高到低排序
+            limit: 返回的行数
+            min_value: 指标下限（含），None 表示不限
+            max_value: 指标上限（含），None 表示不限
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            周报数据列表
+        """
+        if metric not in DERIVED_METRICS:
+            raise ValueError(f"不支持的指标: {metric}，可选: {', '.join(DERIVED_METRICS)}")
+
+        conditions, params = _date_range_conditions(start, end, team_id)
+        conditions.append(f"{metric} IS NOT NULL")
+        if min_value is not None:
+            conditions.append(f"{metric} >= ?")
+            params.append(min_value)
+        if max_value is not None:
+            conditions.append(f"{metric} <= ?")
+            params.append(max_value)
+        direction = "DESC" if descending else "ASC"
+
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT * FROM weekly_reports
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {metric} {direction}, id {direction}
+                LIMIT ?
+            """, params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    @cached_read
+    def get_reports_summary(self, start: Optional[str] = None, end: Optional[str] = None,
+                            team_id: Optional[int] = None) -> Dict:
+        """在数据库中汇总周报统计数据
+
+        Args:
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            包含记录数、各指标合计及平均发布工单数的字典
+        """
+        conditions, params = _date_range_conditions(start, end, team_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.connection() as conn:
+            row = conn.execute(f"""
+                SELECT
+                    COUNT(*) AS report_count,
+                    COALESCE(SUM(online_requirements), 0) AS total_online_requirements,
+                    COALESCE(SUM(fixed_bugs), 0) AS total_fixed_bugs,
+                    COALESCE(SUM(new_bugs), 0) AS total_new_bugs,
+                    COALESCE(AVG(release_orders), 0.0) AS avg_release_orders
+                FROM weekly_reports {where}
+            """, params).fetchone()
+
+        return dict(row)
+
+    @cached_read
+    def get_rollup(self, granularity: str, start: Optional[str] = None,
+                   end: Optional[str] = None, team_id: Optional[int] = None) -> pd.DataFrame:
+        """读取按月/季度/年汇总的指标（由触发器在每次写入时增量维护）
+
+        Args:
+            granularity: 汇总粒度，month / quarter / year
+            start: 起始周期日期（含），YYYY-MM-DD
+            end: 截止周期日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示把所有团队的汇总再合计
+
+        Returns:
+            按周期起始日期升序的 DataFrame，包含 period_start、week_count 及各指标合计
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"不支持的汇总粒度: {granularity}，可选: {', '.join(ROLLUP_GRANULARITIES)}")
+
+        conditions, params = ["granularity = ?"], [granularity]
+        if start is not None:
+            conditions.append("period_start >= ?")
+            params.append(str(start))
+        if end is not None:
+            conditions.append("period_start <= ?")
+            params.append(str(end))
+
+        columns = ['period_start', 'week_count'] + list(ROLLUP_METRICS)
+        if team_id is not None:
+            conditions.insert(0, "team_id = ?")
+            params.insert(0, int(team_id))
+            select = ", ".join(columns)
+            group_by = ""
+        else:
+            select = "period_start, " + ", ".join(f"SUM({column})" for column in columns[1:])
+            group_by = "GROUP BY period_start"
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(f"""
+                SELECT {select} FROM report_rollups
+                WHERE {' AND '.join(conditions)}
+                {group_by}
+                ORDER BY period_start
+            """, params).fetchall()
+
+        dtypes = dict.fromkeys(columns, 'int64')
+        dtypes['period_start'] = 'datetime64[s]'
+        return _rows_to_frame(rows, columns, dtypes)
+
+    @cached_read
+    def aggregate(self, metrics: Sequence[str] = ROLLUP_METRICS, group_by: Optional[str] = None,
+                  window: Optional[int] = None, start: Optional[str] = None, end: Optional[str] = None,
+                  period: str = 'week', team_id: Optional[int] = None) -> pd.DataFrame:
+        """在数据库中按周期聚合指标，并用窗口函数计算滚动窗口和环比，只返回结果行
+
+        按周聚合时在 (team_id, monday_date) 索引上做范围扫描；按月/季度/年时读取增量维护的汇总表。
+        为了让范围内第一个周期也有完整的滚动窗口和上期数据，内部会向前多读取 window 个周期，
+        但只返回 [start, end] 内的周期。
+
+        每个指标 m 返回以下列：
+        - m: 周期内合计；比率类指标（RATIO_METRICS）为由周期合计计算的比率
+        - m_avg: 周期内平均每份周报的值（比率类指标没有该列）
+        - m_delta: 与上一个有数据的周期相比的差值（每组第一个周期为 NaN）
+        - m_change: 与上一个有数据的周期相比的变化百分比（口径同 metrics.change_rate）
+        - m_rolling_sum / m_rolling_avg: 最近 window 个周期（含本期）的合计/平均，仅在指定 window 时返回
+          （比率类指标只有 m_rolling_avg，为各周期比率的平均）
+
+        Args:
+            metrics: 需要聚合的指标，取自 AGGREGATE_METRICS
+            group_by: 分组维度，取自 AGGREGATE_GROUPS；None 表示所有团队合计
+            window: 滚动窗口包含的周期数
+            start: 起始周期日期（含），YYYY-MM-DD
+            end: 截止周期日期（含），YYYY-MM-DD
+            period: 统计周期，取自 AGGREGATE_PERIODS
+            team_id: 只统计某个团队，None 表示所有团队
+
+        Returns:
+            按 (分组, 周期起始日期) 升序的 DataFrame，包含分组列、period_start、week_count 及上述指标列
+        """
+        metrics = list(metrics)
+        unknown = [metric for metric in metrics if metric not in AGGREGATE_METRICS]
+        if not metrics or unknown:
+            raise ValueError(f"不支持的指标: {', '.join(unknown)}，可选: {', '.join(AGGREGATE_METRICS)}")
+        if group_by is not None and group_by not in AGGREGATE_GROUPS:
+            raise ValueError(f"不支持的分组: {group_by}，可选: {', '.join(AGGREGATE_GROUPS)}")
+        if period not in AGGREGATE_PERIODS:
+            raise ValueError(f"不支持的统计周期: {period}，可选: {', '.join(AGGREGATE_PERIODS)}")
+        if window is not None and int(window) < 1:
+            raise ValueError("滚动窗口至少包含 1 个周期")
+
+        # 第一个周期需要回看的周期数：上期数据 1 个，滚动窗口 window-1 个
+        lookback = max(int(window) - 1, 1) if window else 1
+        amount, unit = PERIOD_MODIFIERS[period]
+
+        if period == 'week':
+            source, date_column, week_count = "weekly_reports", "monday_date", "COUNT(*)"
+            conditions, params = [], []
+        else:
+            source, date_column, week_count = "report_rollups", "period_start", "SUM(week_count)"
+            conditions, params = ["granularity = ?"], [period]
+        if team_id is not None:
+            conditions.append("team_id = ?")
+            params.append(int(team_id))
+        if start is not None:
+            conditions.append(f"{date_column} >= date(?, ?)")
+            params += [str(start), f"-{amount * lookback} {unit}"]
+        if end is not None:
+            conditions.append(f"{date_column} <= ?")
+            params.append(str(end))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        group = f"{group_by}, " if group_by else ""
+        partition = f"PARTITION BY {group_by} " if group_by else ""
+        # 先合计计算各指标需要的可累加指标，派生指标由合计计算
+        inputs = [column for column in ROLLUP_METRICS
+                  if any(column in _metric_inputs(metric) for metric in metrics)]
+        sums = ", ".join(f"SUM({column}) AS {column}" for column in inputs)
+        values = ", ".join(f"{_metric_sql(metric)} AS {metric}" for metric in metrics)
+
+        # 每个窗口函数只计算一次（SQLite 对每个窗口函数表达式单独计算），派生列在外层查询中计算
+        frame = f"(w ROWS BETWEEN {int(window) - 1} PRECEDING AND CURRENT ROW)" if window else None
+        windowed = ["COUNT(*) OVER {frame} AS window_size".format(frame=frame)] if window else []
+        selects = []
+        for metric in metrics:
+            previous = f"{metric}_previous"
+            windowed.append(f"LAG({metric}) OVER w AS {previous}")
+            selects.append(metric)
+            if metric not in RATIO_METRICS:
+                selects.append(f"CAST({metric} AS REAL) / week_count AS {metric}_avg")
+            selects += [
+                f"{metric} - {previous} AS {metric}_delta",
+                f"""CASE
+                    WHEN {previous} IS NULL THEN NULL
+                    WHEN {previous} = 0 THEN CASE WHEN {metric} = 0 THEN 0.0 ELSE 100.0 END
+                    ELSE CAST({metric} - {previous} AS REAL) * 100 / {previous}
+                END AS {metric}_change""",
+            ]
+            if window and metric in RATIO_METRICS:
+                windowed.append(f"AVG({metric}) OVER {frame} AS {metric}_rolling_avg")
+                selects.append(f"{metric}_rolling_avg")
+            elif window:
+                windowed.append(f"SUM({metric}) OVER {frame} AS {metric}_rolling_sum")
+                selects += [
+                    f"{metric}_rolling_sum",
+                    f"CAST({metric}_rolling_sum AS REAL) / window_size AS {metric}_rolling_avg",
+                ]
+
+        sql = f"""
+            WITH buckets AS (
+                SELECT {group}{date_column} AS period_start, {week_count} AS week_count, {sums}
+                FROM {source} {where}
+                GROUP BY {group}{date_column}
+            ),
+            metric_values AS (
+                SELECT {group}period_start, week_count, {values}
+                FROM buckets
+            ),
+            windowed AS (
+                SELECT *, {', '.join(windowed)}
+                FROM metric_values
+                WINDOW w AS ({partition}ORDER BY period_start)
+            )
+            SELECT {group}period_start, week_count, {', '.join(selects)}
+            FROM windowed
+            {"WHERE period_start >= ?" if start is not None else ""}
+            ORDER BY {group}period_start
+        """
+        if start is not None:
+            params.append(str(start))
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+
+        dtypes = {column: 'float64' for column in columns}
+        dtypes.update(dict.fromkeys(
+            [group_by, 'week_count'] + [metric for metric in metrics if metric not in RATIO_METRICS], 'int64'))
+        dtypes['period_start'] = 'datetime64[s]'
+        return _rows_to_frame(rows, columns, dtypes)
+
+    def refresh_stats(self) -> int:
+        """重算被标记为待重算的团队的滚动统计及 z 分数
+
+        通过本类的写入在提交前已自动重算（见 _settle_stats），只有其他客户端（如 sqlite3
+        命令行）直接写入了较早的周或删除了周报时才需要调用；没有待重算的团队时只做一次主键查询。
+
+        Returns:
+            重算的团队数
+        """
+        with self.connection() as conn:
+            if conn.execute("SELECT 1 FROM report_stats_dirty LIMIT 1").fetchone() is None:
+                return 0
+        with self.transaction() as conn:
+            teams = _recompute_stats(conn)
+        logger.info("已重算 %d 个团队的滚动统计", teams)
+        return teams
+
+    def get_anomalies(self, start: Optional[str] = None, end: Optional[str] = None,
+                      team_id: Optional[int] = None, metrics: Sequence[str] = ANOMALY_METRICS,
+                      threshold: float = ANOMALY_THRESHOLD) -> pd.DataFrame:
+        """读取写入时记录的异常（|z| 不低于阈值的指标），不扫描历史数据，只读不加写锁
+
+        z 分数 = (本周值 - 此前的 EWMA 均值) / 此前的 EWMA 标准差，在周报写入时计算。
+
+        Args:
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+            team_id: 团队ID，None 表示所有团队
+            metrics: 需要检查的指标，取自 STATS_METRICS
+            threshold: |z| 的阈值
+
+        Returns:
+            每个异常一行的 DataFrame，包含 report_id、team_id、monday_date、metric、value、z，
+            按周一日期倒序
+        """
+        metrics = list(metrics)
+        unknown = [metric for metric in metrics if metric not in STATS_METRICS]
+        if not metrics or unknown:
+            raise ValueError(f"不支持的指标: {', '.join(unknown)}，可选: {', '.join(STATS_METRICS)}")
+
+        conditions, params = _date_range_conditions(start, end, team_id)
+        conditions = [f"s.{condition}" for condition in conditions]
+        conditions.append("(" + " OR ".join(f"abs(s.{metric}_z) >= ?" for metric in metrics) + ")")
+        params += [float(threshold)] * len(metrics)
+        z_columns = ", ".join(f"s.{metric}_z" for metric in metrics)
+        value_columns = ", ".join(f"r.{metric}" for metric in metrics)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(f"""
+                SELECT s.report_id, s.team_id, s.monday_date, {z_columns}, {value_columns}
+                FROM report_scores AS s
+                JOIN weekly_reports AS r ON r.id = s.report_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY s.monday_date DESC, s.team_id
+            """, params).fetchall()
+
+        anomalies = []
+        for row in rows:
+            for i, metric in enumerate(metrics):
+                z = row[3 + i]
+                if z is not None and abs(z) >= threshold:
+                    anomalies.append((row[0], row[1], row[2], metric, row[3 + len(metrics) + i], z))
+
+        columns = ['report_id', 'team_id', 'monday_date', 'metric', 'value', 'z']
+        dtypes = {'report_id': 'int64', 'team_id': 'int64', 'monday_date': 'datetime64[s]',
+                  'metric': 'object', 'value': 'int64', 'z': 'float64'}
+        return _rows_to_frame(anomalies, columns, dtypes)
+
+    def get_metric_stats(self, team_id: Optional[int] = None) -> pd.DataFrame:
+        """读取各团队各指标当前的滚动统计基线
+
+        Args:
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            每个 (团队, 指标) 一行的 DataFrame，包含 team_id、metric、last_monday、n、
+            ewma、ewstd 及最近 STATS_WINDOW 份周报的 rolling_mean
+        """
+        where, params = ("WHERE team_id = ?", [int(team_id)]) if team_id is not None else ("", [])
+        selects = " UNION ALL ".join(
+            f"""SELECT team_id, '{metric}', last_monday, n, {metric}_ewma, sqrt(max({metric}_ewvar, 0)),
+                       CAST({metric}_rolling_sum AS REAL) / min(n, {STATS_WINDOW})
+                FROM report_stats {where}"""
+            for metric in STATS_METRICS
+        )
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(f"SELECT * FROM ({selects}) ORDER BY 1", params * len(STATS_METRICS)).fetchall()
+
+        columns = ['team_id', 'metric', 'last_monday', 'n', 'ewma', 'ewstd', 'rolling_mean']
+        dtypes = {'team_id': 'int64', 'metric': 'object', 'last_monday': 'datetime64[s]', 'n': 'int64',
+                  'ewma': 'float64', 'ewstd': 'float64', 'rolling_mean': 'float64'}
+        return _rows_to_frame(rows, columns, dtypes)
+
+    @cached_read
+    def get_teams(self) -> List[Dict]:
+        """获取所有团队
+
+        Returns:
+            团队列表（id, name），按ID升序
+        """
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute("SELECT id, name FROM teams ORDER BY id")]
+
+    def create_team(self, name: str) -> int:
+        """创建团队，同名团队已存在时直接返回其ID
+
         Args:
-            data: 周报数据字典
-            
+            name: 团队名称
+
         Returns:
-            插入记录的ID
+            团队ID
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 检查是否存在相同时间范围的记录
-        cursor.execute("""
-            SELECT id FROM weekly_reports 
-            WHERE monday_date = ? AND sunday_date = ?
-        """, (data['monday_date'], data['sunday_date']))
-        
-        existing_record = cursor.fetchone()
-        if existing_record:
-            conn.close()
-            raise ValueError(f"该时间范围 ({data['monday_date']} 至 {data['sunday_date']}) 已存在记录 (ID: {existing_record[0]})，无法重复添加")
-        
-        cursor.execute("""
-            INSERT INTO weekly_reports (
-                monday_date, sunday_date, online_requirements, online_req_count,
-                fixed_bugs, new_bugs, bug_fix_rate, release_orders, release_failures,
-                new_reuse_units, new_reuse_events
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data['monday_date'],
-            data['sunday_date'],
-            data['online_requirements'],
-            data['online_req_count'],
-            data['fixed_bugs'],
-            data['new_bugs'],
-            data['bug_fix_rate'],
-            data['release_orders'],
-            data['release_failures'],
-            data['new_reuse_units'],
-            data['new_reuse_events']
-        ))
-        
-        report_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return report_id
-    
-    def get_all_reports(self) -> List[Dict]:
-        """获取所有周报数据
-        
+        name = name.strip()
+        if not name:
+            raise ValueError("团队名称不能为空")
+
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO teams (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (name,))
+            return conn.execute("SELECT id FROM teams WHERE name = ?", (name,)).fetchone()[0]
+
+    @cached_read
+    def get_team_summaries(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """按团队汇总指标，用于跨团队对比
+
+        每个团队在 (team_id, monday_date) 索引上做一次范围扫描。
+
+        Args:
+            start: 起始周一日期（含），YYYY-MM-DD
+            end: 截止周一日期（含），YYYY-MM-DD
+
         Returns:
-            周报数据列表
+            DataFrame，包含 team_id、team_name、week_count、各指标合计，
+            以及由合计计算的派生指标及BUG修复率（口径同 aggregate）
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT * FROM weekly_reports 
-            ORDER BY monday_date DESC
-        """)
-        
-        reports = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        
-        return reports
-    
+        conditions, params = _date_range_conditions(start, end)
+        where = f"AND {' AND '.join(conditions)}" if conditions else ""
+        sums = ", ".join(f"COALESCE(SUM(r.{metric}), 0) AS {metric}" for metric in ROLLUP_METRICS)
+        derived = [metric for metric in AGGREGATE_METRICS if metric not in ROLLUP_METRICS]
+        values = ", ".join(f"{_metric_sql(metric)} AS {metric}" for metric in derived)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(f"""
+                SELECT *, {values}
+                FROM (
+                    SELECT t.id, t.name, COUNT(r.id), {sums}
+                    FROM teams AS t
+                    LEFT JOIN weekly_reports AS r ON r.team_id = t.id {where}
+                    GROUP BY t.id
+                )
+                ORDER BY 1
+            """, params).fetchall()
+
+        columns = ['team_id', 'team_name', 'week_count'] + list(ROLLUP_METRICS) + derived
+        dtypes = dict.fromkeys(columns, 'int64')
+        dtypes['team_name'] = 'object'
+        dtypes.update(dict.fromkeys(RATIO_METRICS, 'float64'))
+        return _rows_to_frame(rows, columns, dtypes)
+
+    @cached_read
     def get_report_by_id(self, report_id: int) -> Optional[Dict]:
         """根据ID获取周报数据
-        
+
         Args:
             report_id: 周报ID
-            
+
         Returns:
             周报数据字典或None
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT * FROM weekly_reports WHERE id = ?", 
-            (report_id,)
-        )
-        
-        row = cursor.fetchone()
-        conn.close()
-        
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM weekly_reports WHERE id = ?",
+                (report_id,)
+            ).fetchone()
+
         return dict(row) if row else None
-    
+
     def update_report(self, report_id: int, data: Dict) -> bool:
         """更新周报数据
-        
+
         Args:
             report_id: 周报ID
             data: 更新的数据字典
-            
+
         Returns:
             更新是否成功
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 检查记录是否存在
-        cursor.execute(
-            "SELECT id FROM weekly_reports WHERE id = ?", 
-            (report_id,)
-        )
-        
-        if not cursor.fetchone():
-            conn.close()
-            raise ValueError(f"记录 ID: {report_id} 不存在")
-        
-        # 直接更新记录，不进行时间范围重复检查
-        # 因为这是更新已存在的记录，允许保持相同的时间范围
-        cursor.execute("""
-            UPDATE weekly_reports SET
-                monday_date = ?,
-                sunday_date = ?,
-                online_requirements = ?,
-                online_req_count = ?,
-                fixed_bugs = ?,
-                new_bugs = ?,
-                bug_fix_rate = ?,
-                release_orders = ?,
-                release_failures = ?,
-                new_reuse_units = ?,
-                new_reuse_events = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (
-            data['monday_date'],
-            data['sunday_date'],
-            data['online_requirements'],
-            data['online_req_count'],
-            data['fixed_bugs'],
-            data['new_bugs'],
-            data['bug_fix_rate'],
-            data['release_orders'],
-            data['release_failures'],
-            data['new_reuse_units'],
-            data['new_reuse_events'],
-            report_id
-        ))
-        
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        
-        return success
-    
+        with self.transaction() as conn:
+            # 检查记录是否存在
+            if not conn.execute(
+                "SELECT id FROM weekly_reports WHERE id = ?",
+                (report_id,)
+            ).fetchone():
+                raise ValueError(f"记录 ID: {report_id} 不存在")
+
+            # 允许保持相同的时间范围；改成另一条记录已占用的周时由唯一索引拒绝
+            # 未指定 team_id 时保持记录原有团队
+            params = (data.get('team_id'),) + _report_params(data)[1:] + (report_id,)
+            try:
+                cursor = conn.execute(UPDATE_REPORT_SQL, params)
+            except sqlite3.IntegrityError:
+                raise ValueError(f"该时间范围 ({data['monday_date']} 至 {data['sunday_date']}) 已被其他记录占用")
+
+            return cursor.rowcount > 0
+
     def delete_report(self, report_id: int) -> bool:
-        """删除周报数据
-        
+        """删除周报数据（软删除，可通过 restore_reports 恢复）
+
         Args:
             report_id: 周报ID
-            
+
         Returns:
             删除是否成功
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM weekly_reports WHERE id = ?", (report_id,))
-        
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        
-        return success
-    
+        return self.delete_reports([report_id]) > 0
+
+    def delete_reports(self, report_ids: Sequence[int]) -> int:
+        """批量软删除周报（单个事务）
+
+        周报移入 deleted_reports（记录删除时间及操作人）后从 weekly_reports 删除，
+        汇总表、滚动统计、修改历史由删除触发器同步维护，所有查询不需要额外过滤。
+
+        Args:
+            report_ids: 周报ID列表，不存在的ID忽略
+
+        Returns:
+            删除的条数
+        """
+        ids = _ids_json(report_ids)
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        with self.transaction() as conn:
+            conn.execute(f"""
+                INSERT INTO deleted_reports ({columns}, deleted_at, deleted_by)
+                SELECT {columns}, CURRENT_TIMESTAMP, ? FROM weekly_reports
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (_current_actor.get(), ids))
+            cursor = conn.execute("DELETE FROM weekly_reports WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            return cursor.rowcount
+
+    def restore_reports(self, report_ids: Sequence[int]) -> List[int]:
+        """恢复软删除的周报（单个事务，保留原ID）
+
+        删除后同一团队的同一周又录入了新数据时，该条不恢复，仍留在已删除列表中。
+
+        Args:
+            report_ids: 周报ID列表
+
+        Returns:
+            已恢复的周报ID（升序）
+        """
+        ids = _ids_json(report_ids)
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        # 不用 RETURNING（需要 SQLite 3.35）：插入前后各查一次哪些ID在周报表中
+        live_sql = "SELECT id FROM weekly_reports WHERE id IN (SELECT value FROM json_each(?))"
+        with self.transaction() as conn:
+            existing = {row[0] for row in conn.execute(live_sql, (ids,))}
+            conn.execute(f"""
+                INSERT INTO weekly_reports ({columns})
+                SELECT {columns} FROM deleted_reports
+                WHERE id IN (SELECT value FROM json_each(?))
+                ORDER BY id
+                ON CONFLICT DO NOTHING
+            """, (ids,))
+            restored = [row[0] for row in conn.execute(live_sql, (ids,)) if row[0] not in existing]
+            conn.execute("DELETE FROM deleted_reports WHERE id IN (SELECT value FROM json_each(?))",
+                         (json.dumps(restored),))
+        return sorted(restored)
+
+    @cached_read
+    def get_deleted_reports(self, limit: int = 100, team_id: Optional[int] = None) -> List[Dict]:
+        """获取软删除的周报（最近删除的在前）
+
+        Args:
+            limit: 最多返回的条数
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            周报数据字典列表，另含 deleted_at（UTC）、deleted_by
+        """
+        where, params = "", []
+        if team_id is not None:
+            where = "WHERE team_id = ?"
+            params.append(int(team_id))
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT * FROM deleted_reports {where}
+                ORDER BY deleted_at DESC, id DESC
+                LIMIT ?
+            """, params + [int(limit)]).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge_deleted_reports(self, before: Optional[str] = None) -> int:
+        """彻底清除软删除的周报，清除后不能再恢复
+
+        Args:
+            before: 只清除该时间（UTC，YYYY-MM-DD[ HH:MM:SS]）之前删除的，None 表示全部
+
+        Returns:
+            清除的条数
+        """
+        with self.transaction() as conn:
+            if before is None:
+                cursor = conn.execute("DELETE FROM deleted_reports")
+            else:
+                cursor = conn.execute("DELETE FROM deleted_reports WHERE deleted_at < ?", (before,))
+            return cursor.rowcount
+
+    @cached_read
+    def get_report_history(self, report_id: int) -> List[Dict]:
+        """获取一条周报的修改历史（按时间先后）
+
+        Args:
+            report_id: 周报ID
+
+        Returns:
+            每次修改一个字典：seq、changed_at（UTC）、actor、action（insert/update/delete）
+            及 changes（字段 -> 修改后的值；插入时为全部字段，删除时为 None）
+        """
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT seq, changed_at, actor, action, changes
+                FROM report_history
+                WHERE report_id = ?
+                ORDER BY seq
+            """, (report_id,)).fetchall()
+
+        history = []
+        for row in rows:
+            entry = dict(row)
+            entry['changes'] = json.loads(entry['changes']) if entry['changes'] is not None else None
+            history.append(entry)
+        return history
+
+    @cached_read
+    def as_of(self, timestamp, columns: Optional[Sequence[str]] = None,
+              team_id: Optional[int] = None) -> pd.DataFrame:
+        """重建某个时间点的周报数据
+
+        从该时间点之前最近的检查点出发，只重放检查点之后到该时间点的修改历史
+        （最多约 HISTORY_CHECKPOINT_INTERVAL 条），不需要从头重放整个日志。
+        启用修改历史（首个检查点）之前、或早于 purge_checkpoints 保留的最早检查点的时间点没有数据，返回空表。
+
+        Args:
+            timestamp: 时间点（字符串、date 或 datetime），不带时区时按 UTC；只给日期时表示当天结束
+            columns: 需要的列，取自 HISTORY_COLUMNS，默认全部
+            team_id: 团队ID，None 表示所有团队
+
+        Returns:
+            按 (周一日期, id) 升序的 DataFrame，列类型同 get_reports_frame
+        """
+        columns = list(columns or HISTORY_COLUMNS)
+        unknown = [column for column in columns if column not in HISTORY_COLUMNS]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+        moment = _history_time(timestamp)
+
+        # 排序需要的列也一并读取
+        selected = list(dict.fromkeys(['id', 'monday_date'] + columns))
+
+        with self.connection() as conn:
+            # 检查点、修改历史在同一个读事务内读取，避免期间的写入造成不一致
+            began = not conn.in_transaction
+            if began:
+                conn.execute("BEGIN")
+            try:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                checkpoint = cursor.execute("""
+                    SELECT id, seq FROM report_checkpoints
+                    WHERE created_at <= ?
+                    ORDER BY id DESC LIMIT 1
+                """, (moment,)).fetchone()
+                if checkpoint is None:
+                    return _rows_to_frame([], columns)
+                checkpoint_id, since = checkpoint
+
+                # 该时间点之前的最后一条修改（走 changed_at 索引，不扫描之前的历史）
+                last = cursor.execute("""
+                    SELECT seq FROM report_history
+                    WHERE changed_at <= ?
+                    ORDER BY changed_at DESC, seq DESC LIMIT 1
+                """, (moment,)).fetchone()
+                until = max(last[0] if last else 0, since)
+                entries = cursor.execute("""
+                    SELECT report_id, action, changes FROM report_history
+                    WHERE seq > ? AND seq <= ?
+                    ORDER BY seq
+                """, (since, until)).fetchall()
+
+                # 检查点之后改过的周报：读取检查点时的全部字段，在此基础上重放修改
+                touched = cursor.execute(_checkpoint_state_sql(
+                    f"report_id, {', '.join(HISTORY_FIELDS)}",
+                    inner="AND report_id IN (SELECT report_id FROM report_history WHERE seq > ? AND seq <= ?)",
+                ), (checkpoint_id, since, until)).fetchall()
+
+                # 其余周报直接取检查点时的值
+                team_condition, params = "", [checkpoint_id]
+                if team_id is not None:
+                    team_condition = "AND team_id = ?"
+                    params.append(int(team_id))
+                checkpoint_columns = ", ".join('report_id' if column == 'id' else column for column in selected)
+                rows = cursor.execute(_checkpoint_state_sql(checkpoint_columns, outer=team_condition),
+                                      params).fetchall()
+            finally:
+                if began and conn.in_transaction:
+                    conn.execute("COMMIT")
+
+        state = {row[0]: dict(zip(HISTORY_FIELDS, row[1:])) for row in touched}
+        for report_id, action, changes in entries:
+            if action == HISTORY_DELETE:
+                state[report_id] = None
+            elif action == HISTORY_INSERT:
+                state[report_id] = json.loads(changes)
+            elif state.get(report_id) is not None:
+                state[report_id].update(json.loads(changes))
+
+        frame = _rows_to_frame(rows, selected)
+        if state:
+            changed = [
+                tuple(report_id if column == 'id' else values[column] for column in selected)
+                for report_id, values in state.items()
+                if values is not None and (team_id is None or values['team_id'] == int(team_id))
+            ]
+            frame = pd.concat([frame[~frame['id'].isin(list(state))], _rows_to_frame(changed, selected)],
+                              ignore_index=True)
+        return frame.sort_values(['monday_date', 'id'], ignore_index=True)[columns]
+
+    def create_checkpoint(self, keep: Optional[int] = None) -> int:
+        """立即保存一个检查点（通常由触发器每隔 HISTORY_CHECKPOINT_INTERVAL 条修改自动保存）
+
+        只保存上一个检查点之后修改过的周报。
+
+        Args:
+            keep: 保存后只保留最近这么多个检查点（见 purge_checkpoints），None 表示不清理
+
+        Returns:
+            检查点ID
+        """
+        with self.transaction() as conn:
+            checkpoint_id = _create_checkpoint(conn)
+            if keep is not None:
+                _purge_checkpoints(conn, keep)
+            return checkpoint_id
+
+    def purge_checkpoints(self, keep: int = HISTORY_CHECKPOINT_KEEP) -> int:
+        """只保留最近 keep 个检查点，更早的检查点合并进保留的最早一个
+
+        触发器自动保存的检查点只含期间修改过的周报，不会自动清理；可定期调用本方法控制检查点占用的空间。
+        清理后 as_of 不再能重建早于保留的最早检查点的时间点。
+
+        Args:
+            keep: 保留的检查点数（至少 1 个）
+
+        Returns:
+            删除的检查点数
+        """
+        with self.transaction() as conn:
+            return _purge_checkpoints(conn, keep)
+
     def get_week_dates(self, date_str: str) -> tuple:
         """根据给定日期获取该周的周一和周日日期
-        
+
         Args:
             date_str: 日期字符串 (YYYY-MM-DD)
-            
+
         Returns:
             (周一日期, 周日日期) 元组
         """
         date = datetime.strptime(date_str, '%Y-%m-%d')
         monday = date - timedelta(days=date.weekday())
         sunday = monday + timedelta(days=6)
-        
+
         return monday.strftime('%Y-%m-%d'), sunday.strftime('%Y-%m-%d')
 
 
+# ==================== 迁移定义 ====================
+
+@migration(1, "创建weekly_reports表")
+def _migration_create_weekly_reports(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS weekly_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            monday_date DATE NOT NULL,
+            sunday_date DATE NOT NULL,
+            online_requirements INTEGER DEFAULT 0,
+            online_req_count INTEGER DEFAULT 0,
+            fixed_bugs INTEGER DEFAULT 0,
+            new_bugs INTEGER DEFAULT 0,
+            bug_fix_rate REAL DEFAULT 0.0,
+            release_orders INTEGER DEFAULT 0,
+            release_failures INTEGER DEFAULT 0,
+            new_reuse_units INTEGER DEFAULT 0,
+            new_reuse_events INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 早期版本建的表没有new_bugs字段，这里只在迁移时检查一次
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(weekly_reports)")]
+    if 'new_bugs' not in columns:
+        conn.execute("ALTER TABLE weekly_reports ADD COLUMN new_bugs INTEGER DEFAULT 0")
+
+
+
+@migration(2, "为周时间范围建立唯一索引")
+def _migration_unique_week_index(conn: sqlite3.Connection):
+    # 旧版本的"先查后插"存在并发竞争，可能留下重复周；保留每周最新写入的一条，
+    # 其余的先原样归档到 weekly_reports_duplicates（附移除时间），不直接丢弃
+    duplicates = """
+        FROM weekly_reports
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM weekly_reports GROUP BY monday_date, sunday_date
+        )
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS weekly_reports_duplicates AS
+        SELECT *, CURRENT_TIMESTAMP AS removed_at FROM weekly_reports WHERE 0
+    """)
+    removed_ids = [row[0] for row in conn.execute(f"SELECT id {duplicates} ORDER BY id")]
+    if removed_ids:
+        conn.execute(f"INSERT INTO weekly_reports_duplicates SELECT *, CURRENT_TIMESTAMP {duplicates}")
+        conn.execute(f"DELETE {duplicates}")
+        logger.warning("数据库迁移：%d 条重复周记录已移入 weekly_reports_duplicates，ID: %s",
+                       len(removed_ids), ", ".join(map(str, removed_ids)))
+
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_weekly_reports_week
+        ON weekly_reports (monday_date, sunday_date)
+    """)
+
+
+
+@migration(3, "为周一日期建立索引，支持范围查询与键集分页")
+def _migration_monday_date_index(conn: sqlite3.Connection):
+    # 索引隐含 rowid(id) 作为末尾键，可直接满足 ORDER BY monday_date DESC, id DESC
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_weekly_reports_monday
+        ON weekly_reports (monday_date)
+    """)
+
+
+
+@migration(4, "创建月/季度/年汇总表及增量维护触发器")
+def _migration_report_rollups(conn: sqlite3.Connection):
+    _install_rollups(conn)
+
+
+@migration(5, "增加团队维度及 (team_id, monday_date) 组合索引")
+def _migration_teams(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS teams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO teams (id, name) VALUES (?, '默认团队')", (DEFAULT_TEAM_ID,))
+
+    # 开启外键时 ADD COLUMN 不能带非 NULL 默认值的 REFERENCES，团队ID由应用层保证有效
+    conn.execute(f"ALTER TABLE weekly_reports ADD COLUMN team_id INTEGER NOT NULL DEFAULT {DEFAULT_TEAM_ID}")
+
+    # 唯一键从"周"变为"团队+周"
+    conn.execute("DROP INDEX IF EXISTS idx_weekly_reports_week")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_weekly_reports_team_week
+        ON weekly_reports (team_id, monday_date, sunday_date)
+    """)
+    # 隐含 rowid(id) 末尾键：单团队的范围查询与键集分页都只需一次索引范围扫描
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_weekly_reports_team_monday
+        ON weekly_reports (team_id, monday_date)
+    """)
+
+
+@migration(6, "汇总表增加团队维度")
+def _migration_team_rollups(conn: sqlite3.Connection):
+    _rebuild_rollups(conn)
+
+
+@migration(7, "汇总触发器按完整主键定位汇总行")
+def _migration_rollup_trigger_lookup(conn: sqlite3.Connection):
+    _rebuild_rollups(conn)
+
+
+@migration(8, "记录周报数据的持久化变更版本号")
+def _migration_change_version(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO report_changes (id, version) VALUES (1, 0)")
+    _install_version_triggers(conn)
+
+
+# 周报写入时递增变更版本号的触发器对应的操作
+VERSION_TRIGGER_ACTIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def _drop_version_triggers(conn: sqlite3.Connection):
+    """删除变更版本号触发器"""
+    for action in VERSION_TRIGGER_ACTIONS:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_weekly_reports_version_{action.lower()}")
+
+
+def _install_version_triggers(conn: sqlite3.Connection):
+    """创建变更版本号触发器：周报每插入/更新/删除一行，版本号加一"""
+    for action in VERSION_TRIGGER_ACTIONS:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_version_{action.lower()}
+            AFTER {action} ON weekly_reports
+            BEGIN
+                UPDATE report_changes SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+
+def _rebuild_rollups(conn: sqlite3.Connection):
+    """按当前结构重建汇总表及触发器（需在事务中调用）"""
+    _drop_rollups(conn)
+    _install_rollups(conn, key_columns=('team_id',))
+
+
+def _drop_rollups(conn: sqlite3.Connection):
+    """删除汇总表及其维护触发器"""
+    for action in ('insert', 'update', 'delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_weekly_reports_rollup_{action}")
+    conn.execute("DROP TABLE IF EXISTS report_rollups")
+
+
+def _install_rollups(conn: sqlite3.Connection, key_columns: Tuple[str, ...] = ()):
+    """创建汇总表及增量维护触发器，并全量重建汇总数据
+
+    Args:
+        conn: 处于迁移事务中的连接
+        key_columns: 周期之外的汇总维度（weekly_reports 中的列名）
+    """
+    keys = "".join(f"{column}, " for column in key_columns)
+    key_definitions = "".join(f"            {column} INTEGER NOT NULL,\n" for column in key_columns)
+    metric_columns = ",\n".join(f"            {metric} INTEGER NOT NULL DEFAULT 0" for metric in ROLLUP_METRICS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS report_rollups (
+{key_definitions}            granularity TEXT NOT NULL,
+            period_start DATE NOT NULL,
+            week_count INTEGER NOT NULL DEFAULT 0,
+{metric_columns},
+            PRIMARY KEY ({keys}granularity, period_start)
+        ) WITHOUT ROWID
+    """)
+
+    metrics = ", ".join(ROLLUP_METRICS)
+
+    def add_sql(row: str) -> str:
+        key_values = "".join(f"{row}.{column}, " for column in key_columns)
+        values = ", ".join(f"{row}.{metric}" for metric in ROLLUP_METRICS)
+        updates = ", ".join(f"{metric} = {metric} + excluded.{metric}" for metric in ROLLUP_METRICS)
+        return f"""
+            INSERT INTO report_rollups ({keys}granularity, period_start, week_count, {metrics})
+            SELECT {key_values}granularity, {_rollup_period_sql(f'{row}.monday_date')}, 1, {values}
+            FROM ({ROLLUP_GRANULARITIES_SQL})
+            WHERE true
+            ON CONFLICT ({keys}granularity, period_start) DO UPDATE SET
+                week_count = week_count + excluded.week_count, {updates};
+        """
+
+    def subtract_sql(row: str) -> str:
+        updates = ", ".join(f"{metric} = {metric} - {row}.{metric}" for metric in ROLLUP_METRICS)
+        statements = []
+        # 每个粒度单独按完整主键定位（行值 IN 子查询只能用上主键的第一列，会扫描大量汇总行）
+        for granularity in ROLLUP_GRANULARITIES:
+            key_match = "".join(f"{column} = {row}.{column} AND " for column in key_columns)
+            match = (f"{key_match}granularity = '{granularity}' AND "
+                     f"period_start = {_rollup_period_sql(f'{row}.monday_date', repr(granularity))}")
+            statements.append(f"""
+            UPDATE report_rollups SET week_count = week_count - 1, {updates}
+            WHERE {match};
+            DELETE FROM report_rollups WHERE week_count <= 0 AND {match};""")
+        return "".join(statements)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_rollup_insert
+        AFTER INSERT ON weekly_reports
+        BEGIN {add_sql('NEW')} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_rollup_update
+        AFTER UPDATE OF {keys}monday_date, {metrics} ON weekly_reports
+        BEGIN {subtract_sql('OLD')} {add_sql('NEW')} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_rollup_delete
+        AFTER DELETE ON weekly_reports
+        BEGIN {subtract_sql('OLD')} END
+    """)
+
+    # 汇总表必须与触发器在同一事务内一次性建好：分批回填期间旧行被更新会导致重复计算
+    sums = ", ".join(f"SUM(r.{metric})" for metric in ROLLUP_METRICS)
+    group_keys = "".join(f"r.{column}, " for column in key_columns)
+    conn.execute("DELETE FROM report_rollups")
+    conn.execute(f"""
+        INSERT INTO report_rollups ({keys}granularity, period_start, week_count, {metrics})
+        SELECT {group_keys}'month', date(r.monday_date, 'start of month') AS period, COUNT(*), {sums}
+        FROM weekly_reports AS r
+        GROUP BY {group_keys}period
+    """)
+
+    # 季度/年由月汇总再合并：周报只扫描一次，不必对每条周报计算三次周期
+    month_keys = "".join(f"m.{column}, " for column in key_columns)
+    month_sums = ", ".join(f"SUM(m.{metric})" for metric in ROLLUP_METRICS)
+    conn.execute(f"""
+        INSERT INTO report_rollups ({keys}granularity, period_start, week_count, {metrics})
+        SELECT {month_keys}g.granularity, {_rollup_period_sql('m.period_start', 'g.granularity')} AS period,
+               SUM(m.week_count), {month_sums}
+        FROM report_rollups AS m
+        CROSS JOIN (SELECT 'quarter' AS granularity UNION ALL SELECT 'year') AS g
+        WHERE m.granularity = 'month'
+        GROUP BY {month_keys}g.granularity, period
+    """)
+
+
+def _backfill_metric_stats(conn: sqlite3.Connection, first_team: int, last_team: int):
+    """按团队ID区间 (first_team, last_team] 用历史数据计算滚动统计及 z 分数"""
+    conn.execute("""
+        INSERT INTO report_stats_dirty (team_id)
+        SELECT DISTINCT team_id FROM weekly_reports WHERE team_id > ? AND team_id <= ?
+        ON CONFLICT (team_id) DO UPDATE SET since = NULL
+    """, (first_team, last_team))
+    _recompute_stats(conn)
+
+
+# 滚动统计回填时每批处理的团队数（统计按团队递推，不能按 id 区间划分）
+STATS_BACKFILL_TEAMS = 5
+
+
+# 已有数据的统计在回填中按团队分批计算，不在结构变更的事务里一次算完整张表
+@migration(9, "写入时增量维护指标的滚动统计及异常 z 分数", backfill=_backfill_metric_stats,
+           backfill_key="SELECT COALESCE(MAX(team_id), 0) FROM weekly_reports",
+           backfill_chunk=STATS_BACKFILL_TEAMS)
+def _migration_metric_stats(conn: sqlite3.Connection):
+    _install_stats(conn)
+
+
+def _install_stats(conn: sqlite3.Connection):
+    """创建滚动统计表、z 分数表及维护触发器
+
+    - report_stats: 每个团队一行，保存各指标的 EWMA 均值/方差、滚动窗口合计，
+      以及最新一周写入前的状态（prev_*），用于 O(1) 修正最新一周；
+    - report_scores: 每份周报一行，保存写入时各指标相对此前基线的 z 分数，
+      以及写入该周后的 EWMA 均值/方差，重算时可以从任意一周接着递推；
+    - report_stats_dirty: 写入了较早的周、删除周报或修改团队/日期时，增量更新无法成立，
+      记录需要按历史重新计算的团队及受影响的最早一周（since，为空表示整个团队，见 _recompute_stats）。
+    """
+    stats_columns = ",\n".join(
+        f"""            {metric}_ewma REAL,
+            {metric}_ewvar REAL,
+            {metric}_prev_ewma REAL,
+            {metric}_prev_ewvar REAL,
+            {metric}_rolling_sum INTEGER NOT NULL DEFAULT 0"""
+        for metric in STATS_METRICS
+    )
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS report_stats (
+            team_id INTEGER PRIMARY KEY,
+            last_monday DATE NOT NULL,
+            n INTEGER NOT NULL,
+            prev_n INTEGER NOT NULL,
+{stats_columns}
+        )
+    """)
+    z_columns = ",\n".join(f"            {metric}_z REAL" for metric in STATS_METRICS)
+    state_columns = ",\n".join(f"            {metric}_ewma REAL,\n            {metric}_ewvar REAL"
+                               for metric in STATS_METRICS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS report_scores (
+            report_id INTEGER PRIMARY KEY,
+            team_id INTEGER NOT NULL,
+            monday_date DATE NOT NULL,
+{z_columns},
+{state_columns}
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_report_scores_team_monday
+        ON report_scores (team_id, monday_date)
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS report_stats_dirty (team_id INTEGER PRIMARY KEY, since DATE)")
+    _install_stats_triggers(conn)
+
+
+def _drop_stats_triggers(conn: sqlite3.Connection):
+    """删除滚动统计维护触发器"""
+    for action in ('insert', 'update', 'delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_weekly_reports_stats_{action}")
+
+
+def _z_score_sql(value: str, mean: str, variance: str, history: str) -> str:
+    """z 分数的SQL表达式：历史不足或方差为 0 时为 NULL"""
+    return (f"CASE WHEN {history} >= {ANOMALY_MIN_HISTORY} AND {variance} > 0 "
+            f"THEN ({value} - {mean}) / sqrt({variance}) END")
+
+
+def _install_stats_triggers(conn: sqlite3.Connection):
+    """创建滚动统计维护触发器
+
+    追加更新的一周（周一日期晚于团队已统计的最后一周）或修改最新一周的指标时 O(1) 更新；
+    其他写入把团队标记为待重算。
+    """
+    alpha = repr(EWMA_ALPHA)
+    metrics = ", ".join(STATS_METRICS)
+    z_columns = ", ".join(f"{metric}_z" for metric in STATS_METRICS)
+    state_columns = ", ".join(f"{metric}_ewma, {metric}_ewvar" for metric in STATS_METRICS)
+    clean = "NOT EXISTS (SELECT 1 FROM report_stats_dirty AS d WHERE d.team_id = NEW.team_id)"
+    # 触发器内不能用 INSERT OR IGNORE/REPLACE：外层语句的冲突处理方式会覆盖它，改用 UPSERT 子句
+    score_updates = ", ".join(f"{column} = excluded.{column}"
+                              for column in ['team_id', 'monday_date'] + [f"{m}_z" for m in STATS_METRICS]
+                              + [f"{m}_{s}" for m in STATS_METRICS for s in ('ewma', 'ewvar')])
+    # 待重算的起始周取最早的一周；已要求整个团队重算（since 为空）时 min() 仍为空
+    mark_dirty = "ON CONFLICT (team_id) DO UPDATE SET since = min(since, excluded.since)"
+
+    def appended(metric: str, mean: str, variance: str) -> Tuple[str, str]:
+        """追加一周后的 EWMA 均值、方差表达式"""
+        return (f"{mean} + {alpha} * (NEW.{metric} - {mean})",
+                f"(1 - {alpha}) * ({variance} + {alpha} * (NEW.{metric} - {mean}) * (NEW.{metric} - {mean}))")
+
+    append_scores = ", ".join(
+        _z_score_sql(f"NEW.{metric}", f"{metric}_ewma", f"{metric}_ewvar", "n") for metric in STATS_METRICS
+    )
+    append_states = ", ".join(
+        ", ".join(appended(metric, f"{metric}_ewma", f"{metric}_ewvar")) for metric in STATS_METRICS
+    )
+    initial_states = ", ".join(f"NEW.{metric}, 0" for metric in STATS_METRICS)
+    append_updates = ",\n".join(
+        f"""                {metric}_prev_ewma = {metric}_ewma,
+                {metric}_prev_ewvar = {metric}_ewvar,
+                {metric}_ewma = {metric}_ewma + {alpha} * (NEW.{metric} - {metric}_ewma),
+                {metric}_ewvar = (1 - {alpha}) * ({metric}_ewvar
+                    + {alpha} * (NEW.{metric} - {metric}_ewma) * (NEW.{metric} - {metric}_ewma)),
+                {metric}_rolling_sum = {metric}_rolling_sum + NEW.{metric} - COALESCE(leaving.{metric}, 0)"""
+        for metric in STATS_METRICS
+    )
+    initial_columns = ", ".join(f"{metric}_ewma, {metric}_ewvar, {metric}_rolling_sum" for metric in STATS_METRICS)
+    initial_values = ", ".join(f"NEW.{metric}, 0, NEW.{metric}" for metric in STATS_METRICS)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_stats_insert
+        AFTER INSERT ON weekly_reports
+        BEGIN
+            -- 插入的不是最新一周：增量统计不成立，从这一周起待重算
+            INSERT INTO report_stats_dirty (team_id, since)
+            SELECT team_id, NEW.monday_date FROM report_stats
+            WHERE team_id = NEW.team_id AND last_monday >= NEW.monday_date
+            {mark_dirty};
+
+            -- 以写入前的基线计算 z 分数，并记下写入后的状态
+            INSERT INTO report_scores (report_id, team_id, monday_date, {z_columns}, {state_columns})
+            SELECT NEW.id, NEW.team_id, NEW.monday_date, {append_scores}, {append_states}
+            FROM report_stats
+            WHERE team_id = NEW.team_id AND last_monday < NEW.monday_date AND {clean}
+            ON CONFLICT (report_id) DO UPDATE SET {score_updates};
+
+            -- 更新基线；滚动窗口移出 STATS_WINDOW 份之前的那一周
+            UPDATE report_stats SET
+                last_monday = NEW.monday_date,
+                prev_n = n,
+                n = n + 1,
+{append_updates}
+            FROM (SELECT 1) LEFT JOIN (
+                SELECT {metrics} FROM weekly_reports
+                WHERE team_id = NEW.team_id AND monday_date < NEW.monday_date
+                ORDER BY monday_date DESC
+                LIMIT 1 OFFSET {STATS_WINDOW - 1}
+            ) AS leaving ON 1
+            WHERE report_stats.team_id = NEW.team_id AND report_stats.last_monday < NEW.monday_date AND {clean};
+
+            -- 团队的第一份周报
+            INSERT INTO report_scores (report_id, team_id, monday_date, {state_columns})
+            SELECT NEW.id, NEW.team_id, NEW.monday_date, {initial_states}
+            WHERE NOT EXISTS (SELECT 1 FROM report_stats WHERE team_id = NEW.team_id) AND {clean}
+            ON CONFLICT (report_id) DO UPDATE SET {score_updates};
+
+            INSERT INTO report_stats (team_id, last_monday, n, prev_n, {initial_columns})
+            SELECT NEW.team_id, NEW.monday_date, 1, 0, {initial_values}
+            WHERE NOT EXISTS (SELECT 1 FROM report_stats WHERE team_id = NEW.team_id) AND {clean};
+        END
+    """)
+
+    def latest(stats: str) -> str:
+        """条件：修改的是团队已统计的最新一周，且团队和日期都没变"""
+        return ("OLD.team_id = NEW.team_id AND OLD.monday_date = NEW.monday_date "
+                f"AND {stats}.team_id = NEW.team_id AND {stats}.last_monday = NEW.monday_date")
+
+    def rewritten(metric: str, stats: str) -> str:
+        """以最新一周写入前的状态（stats 前缀的 prev_* 列）重新计算该周写入后的 EWMA 均值、方差"""
+        mean, variance = appended(metric, f"{stats}{metric}_prev_ewma", f"{stats}{metric}_prev_ewvar")
+        return (f"{metric}_ewma = CASE WHEN {stats}prev_n = 0 THEN NEW.{metric} ELSE {mean} END,\n"
+                f"                {metric}_ewvar = CASE WHEN {stats}prev_n = 0 THEN 0 ELSE {variance} END")
+
+    rescore = ", ".join(
+        f"{metric}_z = "
+        + _z_score_sql(f"NEW.{metric}", f"s.{metric}_prev_ewma", f"s.{metric}_prev_ewvar", "s.prev_n")
+        + f", {rewritten(metric, 's.')}"
+        for metric in STATS_METRICS
+    )
+    latest_updates = ",\n".join(
+        f"""                {rewritten(metric, '')},
+                {metric}_rolling_sum = {metric}_rolling_sum - OLD.{metric} + NEW.{metric}"""
+        for metric in STATS_METRICS
+    )
+    # 只在相关列的值真正变化时触发：按原值整行回写（如 update_report）不必重算
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}"
+                          for column in ['team_id', 'monday_date'] + list(STATS_METRICS))
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_stats_update
+        AFTER UPDATE OF team_id, monday_date, {metrics} ON weekly_reports
+        WHEN {changed}
+        BEGIN
+            -- 修改的不是团队最新一周（或改了团队/日期）：从修改前后较早的一周起待重算
+            INSERT INTO report_stats_dirty (team_id, since)
+            SELECT team_id, MIN(monday_date) FROM (
+                SELECT OLD.team_id AS team_id, OLD.monday_date AS monday_date
+                UNION ALL SELECT NEW.team_id, NEW.monday_date
+            )
+            WHERE NOT EXISTS (SELECT 1 FROM report_stats AS s WHERE {latest('s')})
+            GROUP BY team_id
+            {mark_dirty};
+
+            -- 修改最新一周：基于该周写入前的状态重新计算
+            UPDATE report_scores SET {rescore}
+            FROM report_stats AS s
+            WHERE report_scores.report_id = NEW.id AND {latest('s')} AND {clean};
+
+            UPDATE report_stats SET
+{latest_updates}
+            WHERE {latest('report_stats')} AND {clean};
+        END
+    """)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_stats_delete
+        AFTER DELETE ON weekly_reports
+        BEGIN
+            DELETE FROM report_scores WHERE report_id = OLD.id;
+            INSERT INTO report_stats_dirty (team_id, since) VALUES (OLD.team_id, OLD.monday_date)
+            {mark_dirty};
+        END
+    """)
+
+
+def _recompute_stats(conn: sqlite3.Connection, only_dirty: bool = True) -> int:
+    """按历史数据重新计算滚动统计及 z 分数（需在写事务中调用）
+
+    与触发器的增量更新使用相同的递推公式，结果一致。记录了起始周（since）的团队
+    只从该周起重算（见 _recompute_stats_since），其余团队读取全部历史重算。
+
+    Args:
+        conn: 处于写事务中的连接
+        only_dirty: 只重算 report_stats_dirty 中的团队；False 时重算所有团队
+
+    Returns:
+        重算的团队数
+    """
+    team_filter = "WHERE team_id IN (SELECT team_id FROM report_stats_dirty)" if only_dirty else ""
+    partial = 0
+    if only_dirty:
+        dirty = conn.execute("SELECT team_id, since FROM report_stats_dirty WHERE since IS NOT NULL").fetchall()
+        for team_id, since in dirty:
+            if _recompute_stats_since(conn, team_id, since):
+                conn.execute("DELETE FROM report_stats_dirty WHERE team_id = ?", (team_id,))
+                partial += 1
+        if conn.execute("SELECT 1 FROM report_stats_dirty LIMIT 1").fetchone() is None:
+            return partial
+
+    columns = ['id', 'team_id', 'monday_date'] + list(STATS_METRICS)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(f"""
+        SELECT {', '.join(columns)} FROM weekly_reports {team_filter}
+        ORDER BY team_id, monday_date, id
+    """).fetchall()
+    dtypes = dict.fromkeys(columns, 'int64')
+    dtypes['monday_date'] = 'object'
+    frame = _rows_to_frame(rows, columns, dtypes)
+
+    conn.execute(f"DELETE FROM report_scores {team_filter}")
+    conn.execute(f"DELETE FROM report_stats {team_filter}")
+    conn.execute("DELETE FROM report_stats_dirty")
+    if frame.empty:
+        return 0
+
+    teams = frame['team_id'].to_numpy()
+    history = frame.groupby('team_id').cumcount().to_numpy()
+    is_last = np.append(teams[1:] != teams[:-1], True)
+
+    values = frame[list(STATS_METRICS)].astype('float64')
+    ewm = values.groupby(teams).ewm(alpha=EWMA_ALPHA, adjust=False)
+    means = ewm.mean().droplevel(0).sort_index().to_numpy()
+    variances = ewm.var(bias=True).droplevel(0).sort_index().fillna(0).to_numpy()
+    rolling_sums = (values.groupby(teams).rolling(STATS_WINDOW, min_periods=1).sum()
+                    .droplevel(0).sort_index().to_numpy())
+
+    # 每份周报的基线是同一团队上一份周报写入后的状态
+    previous_means = np.vstack([np.full(len(STATS_METRICS), np.nan), means[:-1]])
+    previous_variances = np.vstack([np.full(len(STATS_METRICS), np.nan), variances[:-1]])
+    previous_means[history == 0] = np.nan
+    previous_variances[history == 0] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = (values.to_numpy() - previous_means) / np.sqrt(previous_variances)
+    scores[history < ANOMALY_MIN_HISTORY] = np.nan
+    scores[~(previous_variances > 0)] = np.nan
+
+    def nullable(array: np.ndarray) -> list:
+        """NaN 转为 None 以便写入 NULL"""
+        return np.where(np.isnan(array), None, array.astype(object)).tolist()
+
+    states = np.empty((len(frame), 2 * len(STATS_METRICS)))
+    states[:, 0::2], states[:, 1::2] = means, variances
+    conn.executemany(
+        f"""INSERT OR REPLACE INTO report_scores (report_id, team_id, monday_date, {_score_columns()})
+            VALUES ({', '.join(['?'] * (3 + 3 * len(STATS_METRICS)))})""",
+        zip(frame['id'].tolist(), teams.tolist(), frame['monday_date'].tolist(),
+            *zip(*nullable(scores)), *zip(*states.tolist()))
+    )
+
+    last = np.flatnonzero(is_last)
+    state_columns = ['team_id', 'last_monday', 'n', 'prev_n']
+    state_values = [teams[last].tolist(), frame['monday_date'].to_numpy()[last].tolist(),
+                    (history[last] + 1).tolist(), history[last].tolist()]
+    for i, metric in enumerate(STATS_METRICS):
+        state_columns += [f'{metric}_ewma', f'{metric}_ewvar', f'{metric}_prev_ewma',
+                          f'{metric}_prev_ewvar', f'{metric}_rolling_sum']
+        state_values += [
+            means[last, i].tolist(),
+            variances[last, i].tolist(),
+            nullable(previous_means[last, i]),
+            nullable(previous_variances[last, i]),
+            rolling_sums[last, i].astype('int64').tolist(),
+        ]
+    conn.executemany(
+        f"INSERT INTO report_stats ({', '.join(state_columns)}) VALUES ({', '.join(['?'] * len(state_columns))})",
+        zip(*state_values)
+    )
+    return partial + len(last)
+
+
+def _score_columns() -> str:
+    """report_scores 中 z 分数及 EWMA 状态列（各指标的 z 分数在前，EWMA 均值/方差交替在后）"""
+    return ", ".join([f"{metric}_z" for metric in STATS_METRICS]
+                     + [f"{metric}_{state}" for metric in STATS_METRICS for state in ('ewma', 'ewvar')])
+
+
+def _recompute_stats_since(conn: sqlite3.Connection, team_id: int, since: str) -> bool:
+    """从 since 这一周起重算一个团队的滚动统计及 z 分数（需在写事务中调用）
+
+    以 since 之前最后一份周报写入后的 EWMA 状态（report_scores）为起点，按触发器的公式逐周递推，
+    只读取 since 之后的周报及之前的 STATS_WINDOW 份（滚动窗口），耗时与 since 之后的周数成正比。
+
+    Returns:
+        是否已重算；since 之前不足两份周报或缺少起点状态时返回 False，由调用方整体重算
+    """
+    count = len(STATS_METRICS)
+    metrics = ", ".join(f"r.{metric}" for metric in STATS_METRICS)
+    states = ", ".join(f"s.{metric}_ewma, s.{metric}_ewvar" for metric in STATS_METRICS)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    context = cursor.execute(f"""
+        SELECT r.monday_date, {metrics}, {states}
+        FROM weekly_reports AS r LEFT JOIN report_scores AS s ON s.report_id = r.id
+        WHERE r.team_id = ? AND r.monday_date < ?
+        ORDER BY r.monday_date DESC, r.id DESC
+        LIMIT {STATS_WINDOW}
+    """, (team_id, since)).fetchall()[::-1]
+    if len(context) < 2 or any(value is None for row in context[-2:] for value in row):
+        return False
+
+    n = cursor.execute("SELECT COUNT(*) FROM weekly_reports WHERE team_id = ? AND monday_date < ?",
+                       (team_id, since)).fetchone()[0]
+    rows = cursor.execute(f"""
+        SELECT r.id, r.monday_date, {metrics} FROM weekly_reports AS r
+        WHERE r.team_id = ? AND r.monday_date >= ?
+        ORDER BY r.monday_date, r.id
+    """, (team_id, since)).fetchall()
+
+    window = [list(row[1:1 + count]) for row in context]
+    prev_means, prev_variances = list(context[-2][1 + count::2]), list(context[-2][2 + count::2])
+    means, variances = list(context[-1][1 + count::2]), list(context[-1][2 + count::2])
+    last_monday = context[-1][0]
+    scores = []
+    for report_id, monday, *values in rows:
+        z = [(value - mean) / math.sqrt(variance)
+             if n >= ANOMALY_MIN_HISTORY and variance > 0 else None
+             for value, mean, variance in zip(values, means, variances)]
+        prev_means, prev_variances = means, variances
+        means = [mean + EWMA_ALPHA * (value - mean) for value, mean in zip(values, prev_means)]
+        variances = [(1 - EWMA_ALPHA) * (variance + EWMA_ALPHA * (value - mean) * (value - mean))
+                     for value, mean, variance in zip(values, prev_means, prev_variances)]
+        window.append(values)
+        n += 1
+        last_monday = monday
+        scores.append((report_id, team_id, monday, *z,
+                       *(state for pair in zip(means, variances) for state in pair)))
+    rolling_sums = [sum(column) for column in zip(*window[-STATS_WINDOW:])]
+
+    conn.execute("DELETE FROM report_scores WHERE team_id = ? AND monday_date >= ?", (team_id, since))
+    conn.executemany(
+        f"""INSERT OR REPLACE INTO report_scores (report_id, team_id, monday_date, {_score_columns()})
+            VALUES ({', '.join(['?'] * (3 + 3 * count))})""",
+        scores
+    )
+    state_columns = ['team_id', 'last_monday', 'n', 'prev_n']
+    state_values = [team_id, last_monday, n, n - 1]
+    for i, metric in enumerate(STATS_METRICS):
+        state_columns += [f'{metric}_ewma', f'{metric}_ewvar', f'{metric}_prev_ewma',
+                          f'{metric}_prev_ewvar', f'{metric}_rolling_sum']
+        state_values += [means[i], variances[i], prev_means[i], prev_variances[i], rolling_sums[i]]
+    conn.execute(
+        f"INSERT OR REPLACE INTO report_stats ({', '.join(state_columns)}) "
+        f"VALUES ({', '.join(['?'] * len(state_columns))})",
+        state_values
+    )
+    return True
+
+
+def _backfill_bug_fix_rate(conn: sqlite3.Connection, first_id: int, last_id: int):
+    """此前录入页面新增、修改周报时固定写入占位值 95.0，按解决/新增BUG数重新计算
+
+    只修改值为 95.0 且与解决/新增BUG数算出的修复率不一致的行。导入文件或其他客户端写入的、
+    恰好为 95.0 又与BUG数不一致的修复率无法与占位值区分，同样会被重算，原值不保留。
+    """
+    rate = _bug_fix_rate_sql('fixed_bugs', 'new_bugs')
+    updated = conn.execute(f"""
+        UPDATE weekly_reports SET bug_fix_rate = {rate}
+        WHERE id > ? AND id <= ? AND bug_fix_rate = 95.0 AND {rate} <> 95.0
+    """, (first_id, last_id)).rowcount
+    if updated:
+        logger.info("数据库迁移：ID %d 至 %d 中 %d 条占位的BUG修复率已按BUG数重算", first_id + 1, last_id, updated)
+
+
+@migration(10, "派生指标生成列及索引，重算占位的BUG修复率", backfill=_backfill_bug_fix_rate)
+def _migration_derived_metrics(conn: sqlite3.Connection):
+    # 虚拟生成列不占存储空间，读取时计算；索引中保存计算结果，按派生指标过滤、排序可以走索引
+    columns = {column[1] for column in conn.execute("PRAGMA table_xinfo(weekly_reports)")}
+    for metric, (column_type, expression) in DERIVED_METRICS.items():
+        if metric not in columns:
+            conn.execute(f"""
+                ALTER TABLE weekly_reports
+                ADD COLUMN {metric} {column_type} GENERATED ALWAYS AS ({expression}) VIRTUAL
+            """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_weekly_reports_{metric} ON weekly_reports({metric})")
+
+
+@migration(11, "记录周报修改历史（字段级差异）及定期检查点")
+def _migration_report_history(conn: sqlite3.Connection):
+    # changes 为 JSON：字段 -> 修改后的值（插入时为全部字段，删除时为 NULL）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            changed_at TEXT NOT NULL,
+            actor TEXT,
+            changes TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_history_report ON report_history(report_id, seq)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_history_changed_at ON report_history(changed_at)")
+
+    # 检查点：seq 之前（含）的修改都已反映在 report_checkpoint_rows 中
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_checkpoints (
+            id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    _create_checkpoint_rows_table(conn)
+
+    _install_history_guards(conn)
+    _install_checkpoint_trigger(conn)
+    _install_history_triggers(conn)
+
+    # 启用前的数据没有历史，以当前全部数据作为第一个检查点
+    _create_checkpoint(conn, full=True)
+
+
+def _history_column_type(field: str) -> str:
+    """检查点中字段的列类型（删除标记行的字段为空）"""
+    if field.endswith('_date'):
+        return 'DATE'
+    return 'REAL' if field == 'bug_fix_rate' else 'INTEGER'
+
+
+def _create_checkpoint_rows_table(conn: sqlite3.Connection):
+    """创建检查点数据表
+
+    每行是一份周报在某个检查点的版本，只在上一个检查点之后修改过时才保存；deleted 为 1 表示
+    该检查点时周报已删除。某个检查点时刻的全部数据为每份周报在该检查点（含）之前最新的版本。
+    """
+    field_columns = "".join(f"{field} {_history_column_type(field)},\n" for field in HISTORY_FIELDS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS report_checkpoint_rows (
+            report_id INTEGER NOT NULL,
+            checkpoint_id INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            {field_columns}
+            PRIMARY KEY (report_id, checkpoint_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _install_checkpoint_trigger(conn: sqlite3.Connection):
+    """每 HISTORY_CHECKPOINT_INTERVAL 条修改保存一次检查点，重建历史时点最多重放这么多条
+
+    只保存这期间修改过的周报（最多 HISTORY_CHECKPOINT_INTERVAL 行），与表的大小无关。
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_report_history_checkpoint
+        AFTER INSERT ON report_history
+        WHEN NEW.seq % {HISTORY_CHECKPOINT_INTERVAL} = 0
+        BEGIN
+            {_checkpoint_sql('NEW.seq')}
+        END
+    """)
+
+
+def _checkpoint_sql(seq: str, extra_reports: str = "") -> str:
+    """保存检查点的SQL语句：检查点对应修改历史序号 seq
+
+    只保存上一个检查点之后修改过的周报，已删除的记为删除标记；extra_reports 为额外需要保存的
+    周报ID子查询（如批量导入时没有修改历史的新行）。
+    """
+    fields = ", ".join(HISTORY_FIELDS)
+    values = ", ".join(f"r.{field}" for field in HISTORY_FIELDS)
+    previous = "COALESCE((SELECT seq FROM report_checkpoints ORDER BY id DESC LIMIT 1 OFFSET 1), 0)"
+    extra = f" UNION {extra_reports}" if extra_reports else ""
+    return f"""
+            INSERT INTO report_checkpoints (seq, created_at) VALUES ({seq}, {HISTORY_TIME_SQL});
+            INSERT INTO report_checkpoint_rows (report_id, checkpoint_id, deleted, {fields})
+            SELECT changed.report_id, (SELECT MAX(id) FROM report_checkpoints), r.id IS NULL, {values}
+            FROM (
+                SELECT DISTINCT report_id FROM report_history WHERE seq > {previous} AND seq <= {seq}{extra}
+            ) AS changed
+            LEFT JOIN weekly_reports AS r ON r.id = changed.report_id;
+    """
+
+
+def _create_checkpoint(conn: sqlite3.Connection, full: bool = False, since_id: Optional[int] = None) -> int:
+    """以当前最后一条修改历史为序号保存检查点（需在事务中调用），返回检查点ID
+
+    Args:
+        conn: 处于写事务中的连接
+        full: 保存全部周报（启用修改历史时的第一个检查点）
+        since_id: 另外保存 id 大于该值的周报（批量导入的新行没有修改历史）
+    """
+    seq = int(conn.execute("SELECT COALESCE(MAX(seq), 0) FROM report_history").fetchone()[0])
+    if full:
+        extra = "SELECT id FROM weekly_reports"
+    elif since_id is not None:
+        extra = f"SELECT id FROM weekly_reports WHERE id > {int(since_id)}"
+    else:
+        extra = ""
+    for statement in _checkpoint_sql(str(seq), extra).split(';'):
+        if statement.strip():
+            conn.execute(statement)
+    checkpoint_id = conn.execute("SELECT MAX(id) FROM report_checkpoints").fetchone()[0]
+    logger.info("已保存周报检查点 %d（修改历史序号 %d）", checkpoint_id, seq)
+    return checkpoint_id
+
+
+def _checkpoint_state_sql(columns: str, inner: str = "", outer: str = "") -> str:
+    """某个检查点时刻周报数据的查询：每份周报取该检查点（含）之前最新的版本，去掉已删除的
+
+    第一个参数为检查点ID；inner 为在选取版本前的过滤条件（如限定周报ID），
+    outer 为对选出的版本的过滤条件（如团队，团队可能在版本之间变化）。
+    """
+    return f"""
+        SELECT {columns} FROM (
+            SELECT *, MAX(checkpoint_id) FROM report_checkpoint_rows
+            WHERE checkpoint_id <= ? {inner}
+            GROUP BY report_id
+        )
+        WHERE NOT deleted {outer}
+    """
+
+
+def _purge_checkpoints(conn: sqlite3.Connection, keep: int) -> int:
+    """只保留最近 keep 个检查点（需在事务中调用），返回删除的检查点数
+
+    更早检查点的版本合并进保留的最早一个：每份周报只留下该检查点时刻的版本，当时已删除的不留。
+    """
+    oldest = conn.execute("SELECT id FROM report_checkpoints ORDER BY id DESC LIMIT 1 OFFSET ?",
+                          (max(int(keep), 1) - 1,)).fetchone()
+    if oldest is None or conn.execute("SELECT 1 FROM report_checkpoints WHERE id < ? LIMIT 1",
+                                      (oldest[0],)).fetchone() is None:
+        return 0
+    oldest = oldest[0]
+    conn.execute("""
+        DELETE FROM report_checkpoint_rows
+        WHERE checkpoint_id < ? AND (report_id, checkpoint_id) NOT IN (
+            SELECT report_id, MAX(checkpoint_id) FROM report_checkpoint_rows
+            WHERE checkpoint_id <= ? GROUP BY report_id
+        )
+    """, (oldest, oldest))
+    conn.execute("DELETE FROM report_checkpoint_rows WHERE checkpoint_id <= ? AND deleted", (oldest,))
+    removed = conn.execute("DELETE FROM report_checkpoints WHERE id < ?", (oldest,)).rowcount
+    logger.info("已清理 %d 个早于检查点 %d 的检查点", removed, oldest)
+    return removed
+
+
+def _install_history_guards(conn: sqlite3.Connection):
+    """修改历史只能追加：不能删除，只允许为操作人为空的记录补写一次操作人"""
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_report_history_no_update
+        BEFORE UPDATE ON report_history
+        WHEN NOT (OLD.actor IS NULL AND NEW.seq IS OLD.seq AND NEW.report_id IS OLD.report_id
+                  AND NEW.action IS OLD.action AND NEW.changed_at IS OLD.changed_at
+                  AND NEW.changes IS OLD.changes)
+        BEGIN
+            SELECT RAISE(ABORT, '修改历史只能追加，只允许补写一次操作人');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_report_history_no_delete
+        BEFORE DELETE ON report_history
+        BEGIN
+            SELECT RAISE(ABORT, '修改历史只能追加，不能删除');
+        END
+    """)
+
+
+# 记录修改历史的触发器对应的操作
+HISTORY_TRIGGER_ACTIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def _drop_history_triggers(conn: sqlite3.Connection):
+    """删除周报修改历史触发器"""
+    for action in HISTORY_TRIGGER_ACTIONS:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_weekly_reports_history_{action.lower()}")
+
+
+def _install_history_triggers(conn: sqlite3.Connection):
+    """创建周报修改历史触发器
+
+    插入记录全部字段，更新只记录值发生变化的字段（没有字段变化时不记录），删除只记录操作本身。
+    触发器不调用自定义函数，任何 SQLite 客户端都可以写入；操作人为空，由 WeeklyReportDB
+    的写事务在提交前补写。
+    """
+    record = "INSERT INTO report_history (report_id, action, changed_at, actor, changes)"
+    all_fields = ", ".join(f"'{field}', NEW.{field}" for field in HISTORY_FIELDS)
+    changed = " OR ".join(f"NEW.{field} IS NOT OLD.{field}" for field in HISTORY_FIELDS)
+    diffs = " UNION ALL ".join(
+        f"SELECT '{field}' AS field, NEW.{field} AS value WHERE NEW.{field} IS NOT OLD.{field}"
+        for field in HISTORY_FIELDS
+    )
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_history_insert
+        AFTER INSERT ON weekly_reports
+        BEGIN
+            {record}
+            VALUES (NEW.id, '{HISTORY_INSERT}', {HISTORY_TIME_SQL}, NULL, json_object({all_fields}));
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_history_update
+        AFTER UPDATE ON weekly_reports
+        WHEN {changed}
+        BEGIN
+            {record}
+            SELECT NEW.id, '{HISTORY_UPDATE}', {HISTORY_TIME_SQL}, NULL, json_group_object(field, value)
+            FROM ({diffs});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weekly_reports_history_delete
+        AFTER DELETE ON weekly_reports
+        BEGIN
+            {record}
+            VALUES (OLD.id, '{HISTORY_DELETE}', {HISTORY_TIME_SQL}, NULL, NULL);
+        END
+    """)
+
+
+@migration(12, "软删除：删除的周报移入 deleted_reports，可批量恢复")
+def _migration_deleted_reports(conn: sqlite3.Connection):
+    # 列与 weekly_reports 的存储列一致；deleted_at/deleted_by 为删除标记
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS deleted_reports (
+            id INTEGER PRIMARY KEY,
+            team_id INTEGER NOT NULL,
+            monday_date DATE NOT NULL,
+            sunday_date DATE NOT NULL,
+            online_requirements INTEGER DEFAULT 0,
+            online_req_count INTEGER DEFAULT 0,
+            fixed_bugs INTEGER DEFAULT 0,
+            new_bugs INTEGER DEFAULT 0,
+            bug_fix_rate REAL,
+            release_orders INTEGER DEFAULT 0,
+            release_failures INTEGER DEFAULT 0,
+            new_reuse_units INTEGER DEFAULT 0,
+            new_reuse_events INTEGER DEFAULT 0,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            deleted_by TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_deleted_reports_deleted_at ON deleted_reports(deleted_at)")
+
+
+def _ids_json(report_ids: Sequence[int]) -> str:
+    """ID列表转为 JSON 数组，SQL 中用 json_each 展开，不受绑定参数个数限制"""
+    return json.dumps([int(report_id) for report_id in report_ids])
+
+
+# 当前代码期望的数据库结构版本（记录在 PRAGMA user_version 中）
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
 if __name__ == "__main__":
     # 测试数据库初始化
+    logging.basicConfig(level=logging.INFO)
     db = WeeklyReportDB()
-    print("数据库初始化完成")
\ No newline at end of file
+    print(f"数据库初始化完成（结构版本: {db.get_schema_version()}）")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周报数据流式导出（CSV / JSON Lines / Parquet）
+
+数据通过 WeeklyReportDB.iter_reports 按块读取并逐块写出，内存占用与总行数无关：
+
+    python exporter.py --format parquet --output reports.parquet
+    python exporter.py --format csv --start 2024-01-01 --team 2 > reports.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import BinaryIO, Dict, List, Optional
+
+from database import WeeklyReportDB, EXPORT_CHUNK_SIZE, REPORT_FIELDS
+
+# 导出的列（顺序即文件中的列顺序）
+EXPORT_COLUMNS = ('id', 'team_id') + REPORT_FIELDS + ('created_at', 'updated_at')
+
+# 导出格式 -> (文件扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+class CsvExportWriter:
+    """逐块写出 CSV（UTF-8 BOM，便于 Excel 直接打开）"""
+
+    def __init__(self, output: BinaryIO):
+        self._text = io.TextIOWrapper(output, encoding='utf-8-sig', newline='')
+        self._writer = csv.DictWriter(self._text, fieldnames=EXPORT_COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, rows: List[Dict]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        # 分离文本包装，不关闭调用方传入的输出流
+        self._text.detach()
+
+
+class JsonlExportWriter:
+    """逐块写出 JSON Lines，每行一条记录"""
+
+    def __init__(self, output: BinaryIO):
+        self._output = output
+
+    def write(self, rows: List[Dict]):
+        self._output.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode('utf-8'))
+
+    def close(self):
+        self._output.flush()
+
+
+class ParquetExportWriter:
+    """逐块写出 Parquet，每块一个 row group"""
+
+    def __init__(self, output: BinaryIO):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        fields = []
+        for column in EXPORT_COLUMNS:
+            if column in ('monday_date', 'sunday_date'):
+                arrow_type = pa.date32()
+            elif column in ('created_at', 'updated_at'):
+                arrow_type = pa.timestamp('s')
+            elif column == 'bug_fix_rate':
+                arrow_type = pa.float64()
+            else:
+                arrow_type = pa.int64()
+            fields.append(pa.field(column, arrow_type))
+        self._schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(output, self._schema)
+
+    def write(self, rows: List[Dict]):
+        pa = self._pa
+        arrays = []
+        for field in self._schema:
+            values = [row[field.name] for row in rows]
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+                arrays.append(pa.array(values, type=field.type))
+            else:
+                # 日期/时间在库中是文本，先按字符串读入再转换类型
+                arrays.append(pa.array(values, type=pa.string()).cast(field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+EXPORT_WRITERS = {
+    'csv': CsvExportWriter,
+    'jsonl': JsonlExportWriter,
+    'parquet': ParquetExportWriter,
+}
+
+
+def export_reports(db: WeeklyReportDB, fmt: str, output: BinaryIO,
+                   chunk_size: int = EXPORT_CHUNK_SIZE, start: Optional[str] = None,
+                   end: Optional[str] = None, team_id: Optional[int] = None) -> int:
+    """把周报数据按块写入二进制输出流
+
+    Args:
+        db: 数据库对象
+        fmt: 导出格式，取自 EXPORT_FORMATS
+        output: 二进制输出流（文件、sys.stdout.buffer 等）
+        chunk_size: 每块行数
+        start: 起始周一日期（含），YYYY-MM-DD
+        end: 截止周一日期（含），YYYY-MM-DD
+        team_id: 团队ID，None 表示所有团队
+
+    Returns:
+        导出的行数
+    """
+    if fmt not in EXPORT_WRITERS:
+        raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_WRITERS)}")
+
+    writer = EXPORT_WRITERS[fmt](output)
+    count = 0
+    for rows in db.iter_reports(chunk_size, columns=EXPORT_COLUMNS, start=start, end=end, team_id=team_id):
+        writer.write(rows)
+        count += len(rows)
+    writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导出周报数据")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', help="导出格式")
+    parser.add_argument('--output', default='-', help="输出文件，- 表示标准输出")
+    parser.add_argument('--db', default='rd_report.db', help="数据库文件路径")
+    parser.add_argument('--start', default=None, help="起始周一日期（含），YYYY-MM-DD")
+    parser.add_argument('--end', default=None, help="截止周一日期（含），YYYY-MM-DD")
+    parser.add_argument('--team', type=int, default=None, help="团队ID，默认全部团队")
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="每块读取的行数")
+    args = parser.parse_args()
+
+    db = WeeklyReportDB(args.db)
+    try:
+        if args.output == '-':
+            count = export_reports(db, args.format, sys.stdout.buffer, args.chunk_size,
+                                   args.start, args.end, args.team)
+        else:
+            with open(args.output, 'wb') as output:
+                count = export_reports(db, args.format, output, args.chunk_size,
+                                       args.start, args.end, args.team)
+    finally:
+        db.close()
+    print(f"已导出 {count} 条记录", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
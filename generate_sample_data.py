@@ -1,96 +1,154 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-生成近7周的测试数据
+生成测试数据
+
+默认生成近7周的数据；可指定随机种子、年数、团队数及趋势/噪声类型，
+用 NumPy 一次性向量化生成后批量写入，用于压测和容量规划：
+
+    python generate_sample_data.py --seed 42 --years 20 --teams 1000 --db bench.db
 """
 
-import random
-from datetime import datetime, timedelta
-from database import WeeklyReportDB
-
-
-def generate_sample_data():
-    """生成近7周的测试数据"""
-    db = WeeklyReportDB()
-    
-    # 获取当前日期
-    today = datetime.now().date()
-    
-    # 计算7周前的周一
-    current_monday = today - timedelta(days=today.weekday())
-    start_monday = current_monday - timedelta(weeks=6)
-    
-    print("开始生成近7周的测试数据...")
-    
-    for week in range(7):
-        # 计算当前周的周一和周日
-        monday = start_monday + timedelta(weeks=week)
-        sunday = monday + timedelta(days=6)
-        
-        # 生成随机但合理的数据
-        # 基础值随着周数有一定的趋势变化
-        base_trend = 1 + (week * 0.1)  # 轻微上升趋势
-        
-        # 上线需求数 (5-20)
-        online_requirements = random.randint(5, 15) + int(week * 0.5)
-        
-        # 需求关联req数 (通常是需求数的1-3倍)
-        online_req_count = online_requirements * random.randint(1, 3)
-        
-        # 修复BUG数 (3-25)
-        fixed_bugs = random.randint(3, 20) + int(week * 0.3)
-        
-        # BUG按时修复率 (80-100%)
-        bug_fix_rate = round(random.uniform(85.0, 100.0), 1)
-        
-        # 发布工单数 (8-30)
-        release_orders = random.randint(8, 25) + int(week * 0.4)
-        
-        # 发布失败数 (0-5，通常较少)
-        release_failures = random.randint(0, min(5, release_orders // 5))
-        
-        # 新增复用unit数 (1-10)
-        new_reuse_units = random.randint(1, 8) + int(week * 0.2)
-        
-        # 新增复用事件数 (2-15)
-        new_reuse_events = random.randint(2, 12) + int(week * 0.3)
-        
-        # 准备数据
-        report_data = {
-            'monday_date': monday.strftime('%Y-%m-%d'),
-            'sunday_date': sunday.strftime('%Y-%m-%d'),
-            'online_requirements': online_requirements,
-            'online_req_count': online_req_count,
-            'fixed_bugs': fixed_bugs,
-            'bug_fix_rate': bug_fix_rate,
-            'release_orders': release_orders,
-            'release_failures': release_failures,
-            'new_reuse_units': new_reuse_units,
-            'new_reuse_events': new_reuse_events
-        }
-        
-        # 插入数据
-        report_id = db.insert_weekly_report(report_data)
-        print(f"第{week+1}周数据已生成 (ID: {report_id}): {monday} 至 {sunday}")
-        print(f"  - 上线需求: {online_requirements}, 修复BUG: {fixed_bugs}, 修复率: {bug_fix_rate}%")
-    
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from database import WeeklyReportDB, DEFAULT_TEAM_ID
+
+
+# 各指标的基础取值范围（每个团队在范围内随机取一个基础值）
+BASE_RANGES = {
+    'online_requirements': (5, 15),
+    'fixed_bugs': (3, 20),
+    'new_bugs': (2, 12),
+    'release_orders': (8, 25),
+    'new_reuse_units': (1, 8),
+    'new_reuse_events': (2, 12),
+}
+
+# 趋势类型：t 为距起始周的年数，返回各周的倍数
+TREND_PROFILES = {
+    'flat': lambda t: np.ones_like(t),
+    'growth': lambda t: 1 + 0.3 * t,
+    'decline': lambda t: np.maximum(0.3, 1 - 0.15 * t),
+    'seasonal': lambda t: 1 + 0.25 * np.sin(2 * np.pi * t),
+}
+
+# 噪声类型 -> 对数正态噪声的标准差
+NOISE_PROFILES = {
+    'low': 0.05,
+    'medium': 0.15,
+    'high': 0.35,
+}
+
+
+def generate_frame(weeks: int, teams: int = 1, seed: Optional[int] = None,
+                   trend: str = 'growth', noise: str = 'medium',
+                   end_monday: Optional[date] = None, team_ids: Optional[list] = None) -> pd.DataFrame:
+    """向量化生成周报数据
+
+    Args:
+        weeks: 每个团队的周数
+        teams: 团队数
+        seed: 随机种子，相同参数和种子生成相同数据
+        trend: 趋势类型，取自 TREND_PROFILES
+        noise: 噪声类型，取自 NOISE_PROFILES
+        end_monday: 最后一周的周一，默认为本周
+        team_ids: 各团队的ID，默认为 1..teams
+
+    Returns:
+        每行一个 (团队, 周) 的 DataFrame，列与 REPORT_FIELDS 一致（不含由 bulk_load 计算的 bug_fix_rate）并包含 team_id
+    """
+    rng = np.random.default_rng(seed)
+    end_monday = end_monday or date.today() - timedelta(days=date.today().weekday())
+    team_ids = np.asarray(team_ids if team_ids is not None else np.arange(1, teams + 1), dtype='int64')
+
+    mondays = np.datetime64(end_monday, 'D') - 7 * np.arange(weeks - 1, -1, -1)
+    years = np.arange(weeks) / 52.0
+    multiplier = TREND_PROFILES[trend](years)[None, :]
+    sigma = NOISE_PROFILES[noise]
+
+    def metric(name: str) -> np.ndarray:
+        low, high = BASE_RANGES[name]
+        base = rng.uniform(low, high, size=(teams, 1))
+        mean = base * multiplier * rng.lognormal(0.0, sigma, size=(teams, weeks))
+        return rng.poisson(mean).ravel()
+
+    online_requirements = metric('online_requirements')
+    release_orders = metric('release_orders')
+    data = {
+        'team_id': np.repeat(team_ids, weeks),
+        # 日期只对每周格式化一次，再按团队平铺
+        'monday_date': np.tile(mondays.astype(str).astype(object), teams),
+        'sunday_date': np.tile((mondays + 6).astype(str).astype(object), teams),
+        'online_requirements': online_requirements,
+        # 需求关联req数通常是需求数的1-3倍
+        'online_req_count': online_requirements * rng.integers(1, 4, size=online_requirements.size),
+        'fixed_bugs': metric('fixed_bugs'),
+        'new_bugs': metric('new_bugs'),
+        'release_orders': release_orders,
+        # 发布失败数不超过发布工单数，失败率约 5%
+        'release_failures': rng.binomial(release_orders, 0.05),
+        'new_reuse_units': metric('new_reuse_units'),
+        'new_reuse_events': metric('new_reuse_events'),
+    }
+    return pd.DataFrame(data)
+
+
+def generate_sample_data(db_path: str = "rd_report.db", weeks: int = 7, teams: int = 1,
+                         seed: Optional[int] = None, trend: str = 'growth', noise: str = 'medium'):
+    """生成测试数据并批量写入数据库"""
+    db = WeeklyReportDB(db_path)
+
+    # 第一个团队使用默认团队，其余按序号创建
+    team_ids = [DEFAULT_TEAM_ID] + [db.create_team(f"测试团队{number}") for number in range(2, teams + 1)]
+
+    print(f"开始生成测试数据：{teams} 个团队 × {weeks} 周 = {teams * weeks} 行...")
+    started = time.perf_counter()
+    frame = generate_frame(weeks, teams, seed=seed, trend=trend, noise=noise, team_ids=team_ids)
+    generated = time.perf_counter()
+    inserted = db.bulk_load(frame)
+    loaded = time.perf_counter()
+
+    skipped = len(frame) - inserted
+    print(f"生成耗时 {generated - started:.2f}s，写入耗时 {loaded - generated:.2f}s")
+    if skipped:
+        print(f"⚠️ {skipped} 个团队周已存在，已跳过")
+
     print("\n✅ 测试数据生成完成！")
     print("\n📊 数据概览:")
-    
-    # 显示生成的数据统计
-    reports = db.get_all_reports()
-    if reports:
-        total_requirements = sum(r['online_requirements'] for r in reports)
-        total_bugs = sum(r['fixed_bugs'] for r in reports)
-        avg_fix_rate = sum(r['bug_fix_rate'] for r in reports) / len(reports)
-        
-        print(f"  - 总记录数: {len(reports)}")
-        print(f"  - 累计上线需求: {total_requirements}")
-        print(f"  - 累计修复BUG: {total_bugs}")
-        print(f"  - 平均修复率: {avg_fix_rate:.1f}%")
-    
-    print("\n🚀 现在可以运行 'streamlit run app.py' 查看数据可视化效果！")
+
+    # 显示生成的数据统计（在数据库中汇总）
+    summary = db.get_reports_summary()
+    if summary['report_count']:
+        print(f"  - 总记录数: {summary['report_count']}")
+        print(f"  - 累计上线需求: {summary['total_online_requirements']}")
+        print(f"  - 累计修复BUG: {summary['total_fixed_bugs']}")
+        print(f"  - 平均发布工单: {summary['avg_release_orders']:.1f}")
+
+    db.close()
+    print("\n🚀 现在可以运行 'streamlit run streamlit_app.py' 查看数据可视化效果！")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成周报测试数据")
+    parser.add_argument('--db', default='rd_report.db', help="数据库文件路径")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    parser.add_argument('--weeks', type=int, default=7, help="每个团队的周数")
+    parser.add_argument('--years', type=float, default=None, help="每个团队的年数（指定时覆盖 --weeks）")
+    parser.add_argument('--teams', type=int, default=1, help="团队数")
+    parser.add_argument('--trend', choices=list(TREND_PROFILES), default='growth', help="趋势类型")
+    parser.add_argument('--noise', choices=list(NOISE_PROFILES), default='medium', help="噪声类型")
+    args = parser.parse_args()
+
+    weeks = int(round(args.years * 52)) if args.years is not None else args.weeks
+    generate_sample_data(args.db, weeks=weeks, teams=args.teams, seed=args.seed,
+                         trend=args.trend, noise=args.noise)
 
 
 if __name__ == "__main__":
-    generate_sample_data()
\ No newline at end of file
+    main()
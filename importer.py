@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周报数据批量导入模块（CSV / Excel 分块流式读取）
+"""
+
+import os
+from collections import namedtuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from database import DEFAULT_TEAM_ID, REPORT_FIELDS
+
+
+# 每次读取并写入数据库的行数
+IMPORT_CHUNK_SIZE = 5000
+
+# 导入文件支持的列名：英文字段名或页面上显示的中文列名
+COLUMN_ALIASES = {
+    '团队ID': 'team_id',
+    '周一日期': 'monday_date',
+    '周日日期': 'sunday_date',
+    '上线需求数': 'online_requirements',
+    '需求关联req数': 'online_req_count',
+    '解决的BUG数': 'fixed_bugs',
+    '新增BUG数': 'new_bugs',
+    'BUG按时修复率': 'bug_fix_rate',
+    '发布工单数': 'release_orders',
+    '发布失败数': 'release_failures',
+    '新增可复用的最小单元数': 'new_reuse_units',
+    '新增复用事件数': 'new_reuse_events',
+}
+
+# 文件中缺少的指标列使用的默认值，None 表示写入时由其他指标计算（如BUG修复率）
+DEFAULT_VALUES = {
+    'bug_fix_rate': None,
+}
+
+# 一个数据块：rows 为 (文件行号, 周报数据) 列表，errors 为 (文件行号, 错误信息) 列表
+ImportChunk = namedtuple('ImportChunk', ['rows', 'errors'])
+
+
+def iter_import_chunks(file: BinaryIO, filename: str,
+                       chunk_size: int = IMPORT_CHUNK_SIZE,
+                       team_id: Optional[int] = None) -> Iterator[ImportChunk]:
+    """分块读取上传的 CSV / XLSX 文件
+
+    文件不会一次性读入内存：CSV 使用 pandas 的分块读取，XLSX 使用 openpyxl 只读模式逐行读取。
+
+    Args:
+        file: 文件对象
+        filename: 原始文件名，用于判断格式
+        chunk_size: 每块行数
+        team_id: 文件中没有团队ID列时使用的团队，默认为 DEFAULT_TEAM_ID
+
+    Yields:
+        ImportChunk
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        frames = _iter_csv_frames(file, chunk_size)
+    elif extension in ('.xlsx', '.xlsm'):
+        frames = _iter_excel_frames(file, chunk_size)
+    else:
+        raise ValueError(f"不支持的文件格式: {extension}，请上传 CSV 或 XLSX 文件")
+
+    # 表头占第1行，数据从第2行开始
+    first_line = 2
+    for frame in frames:
+        yield normalize_frame(frame, first_line, team_id)
+        first_line += len(frame)
+
+
+def _iter_csv_frames(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按块读取CSV"""
+    reader = pd.read_csv(
+        file,
+        chunksize=chunk_size,
+        dtype=str,
+        keep_default_na=False,
+        encoding='utf-8-sig'
+    )
+    with reader:
+        for frame in reader:
+            yield frame
+
+
+def _iter_excel_frames(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按块读取XLSX第一个工作表"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+
+        buffer = []
+        for values in rows:
+            buffer.append(values)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def normalize_frame(frame: pd.DataFrame, first_line: int = 2,
+                    team_id: Optional[int] = None) -> ImportChunk:
+    """将一块原始数据转换为可写入数据库的周报字典（按列向量化处理）
+
+    日期可以是该周的任意一天，会统一对齐到周一和周日；缺少的指标列按默认值填充。
+
+    Args:
+        frame: 原始数据块
+        first_line: 数据块第一行在文件中的行号
+        team_id: 文件中没有团队ID列时使用的团队，默认为 DEFAULT_TEAM_ID
+
+    Returns:
+        ImportChunk
+    """
+    frame = frame.rename(columns=lambda name: COLUMN_ALIASES.get(str(name).strip(), str(name).strip()))
+    if 'monday_date' not in frame.columns:
+        raise ValueError("导入文件缺少日期列（monday_date 或 周一日期）")
+
+    lines = range(first_line, first_line + len(frame))
+    invalid = pd.Series(False, index=frame.index)
+    reasons = pd.Series('', index=frame.index)
+
+    dates = pd.to_datetime(frame['monday_date'], errors='coerce')
+    bad_dates = dates.isna()
+    invalid |= bad_dates
+    reasons[bad_dates] = "日期无法识别"
+
+    monday = (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d')
+    sunday = (dates + pd.to_timedelta(6 - dates.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d')
+    normalized = {'monday_date': monday, 'sunday_date': sunday}
+
+    if 'team_id' in frame.columns:
+        teams = pd.to_numeric(frame['team_id'].replace('', None), errors='coerce')
+        bad_teams = teams.isna() | (teams != teams.round())
+        invalid |= bad_teams
+        reasons[bad_teams & (reasons == '')] = "team_id 不是有效的团队ID"
+        normalized['team_id'] = teams.fillna(0).astype('int64')
+    else:
+        default_team = DEFAULT_TEAM_ID if team_id is None else team_id
+        normalized['team_id'] = pd.Series(default_team, index=frame.index, dtype='int64')
+
+    for field in REPORT_FIELDS[2:]:
+        if field not in frame.columns:
+            normalized[field] = pd.Series(DEFAULT_VALUES.get(field, 0), index=frame.index)
+            continue
+
+        values = pd.to_numeric(frame[field].replace('', None), errors='coerce')
+        bad_values = values.isna() | (values < 0)
+        invalid |= bad_values
+        reasons[bad_values & (reasons == '')] = f"{field} 不是有效的非负数"
+
+        if field == 'bug_fix_rate':
+            normalized[field] = values.astype(float)
+        else:
+            normalized[field] = values.fillna(0).round().astype('int64')
+
+    records = pd.DataFrame(normalized)
+    rows: List[Tuple[int, Dict]] = []
+    errors: List[Tuple[int, str]] = []
+    for line, is_invalid, reason, record in zip(lines, invalid, reasons, records.to_dict('records')):
+        if is_invalid:
+            errors.append((line, reason))
+        else:
+            rows.append((line, record))
+
+    return ImportChunk(rows, errors)
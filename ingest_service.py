@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周报数据 HTTP 写入服务（asyncio）
+
+供 CI / 发布工具自动推送指标：请求校验后先进入内存缓冲区，
+攒够 FLUSH_SIZE 条或等待 FLUSH_INTERVAL 秒后在一个事务中批量写入 SQLite，
+多个写入方不再各自占用写锁。
+
+    POST /reports    单条或多条周报（JSON 对象 / 数组 / {"reports": [...]}），
+                     加 ?wait=1 时等待落库并返回每条的写入结果
+    GET  /health     服务状态
+
+设置环境变量 RD_INGEST_TOKEN 后，请求需携带 Authorization: Bearer <token>。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from database import WeeklyReportDB, DEFAULT_TEAM_ID, REPORT_FIELDS, STATUS_INVALID, RowOutcome
+from importer import DEFAULT_VALUES
+
+logger = logging.getLogger(__name__)
+
+
+# 默认只监听本机
+INGEST_HOST = '127.0.0.1'
+INGEST_PORT = 8765
+
+# 缓冲区达到该条数时立即写入
+FLUSH_SIZE = 500
+# 缓冲区中最早一条数据最多等待的秒数
+FLUSH_INTERVAL = 1.0
+# 缓冲区上限，超过时返回 503 让写入方稍后重试
+MAX_BUFFER = 20000
+# 请求体大小上限（字节）
+MAX_BODY_SIZE = 1024 * 1024
+
+METRIC_FIELDS = REPORT_FIELDS[2:]
+
+# 缓冲区中的一条待写入数据：fields 为请求中提供的指标，已存在的周只更新这些指标
+PendingReport = namedtuple('PendingReport', ['report', 'fields', 'future'])
+
+HTTP_REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    503: 'Service Unavailable',
+}
+
+
+def validate_payload(payload: Dict) -> Tuple[Dict, Tuple[str, ...]]:
+    """校验一条推送数据，转换为可写入数据库的周报字典
+
+    日期可以用 monday_date 或 date 字段给出该周任意一天，会对齐到周一和周日；
+    指标只需提供一部分，缺少的指标在新建记录时按默认值填充，更新已有记录时保持原值；
+    没有提供BUG修复率时由数据库按解决/新增BUG数计算。
+
+    Args:
+        payload: 请求中的一条数据
+
+    Returns:
+        (周报数据, 请求中提供的指标字段) 元组
+
+    Raises:
+        ValueError: 数据格式错误
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("每条数据必须是 JSON 对象")
+
+    unknown = set(payload) - set(REPORT_FIELDS) - {'date', 'team_id'}
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+
+    day = payload.get('monday_date', payload.get('date'))
+    try:
+        day = date.fromisoformat(str(day))
+    except ValueError:
+        raise ValueError(f"日期格式错误: {day}，应为 YYYY-MM-DD")
+    monday = day - timedelta(days=day.weekday())
+
+    team_id = payload.get('team_id', DEFAULT_TEAM_ID)
+    if isinstance(team_id, bool) or not isinstance(team_id, int):
+        raise ValueError(f"团队ID无效: {team_id}")
+
+    fields = tuple(field for field in METRIC_FIELDS if field in payload)
+    if not fields:
+        raise ValueError("至少需要提供一个指标")
+
+    report = {
+        'team_id': team_id,
+        'monday_date': monday.isoformat(),
+        'sunday_date': (monday + timedelta(days=6)).isoformat(),
+    }
+    for field in METRIC_FIELDS:
+        if field not in payload:
+            report[field] = DEFAULT_VALUES.get(field, 0)
+            continue
+
+        value = payload[field]
+        if field == 'bug_fix_rate':
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 100
+        else:
+            valid = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+        if not valid:
+            raise ValueError(f"{field} 不是有效的非负数: {value}")
+        report[field] = value
+
+    return report, fields
+
+
+class IngestService:
+    """带写入缓冲的 HTTP 服务
+
+    请求处理只做校验和入队；后台任务按条数或时间阈值把缓冲区写入数据库，
+    同一批中按提供的指标组合分组，每组一次 upsert_many（单个事务，executemany）；
+    同一团队周的数据按到达顺序生效。
+    """
+
+    def __init__(self, db: WeeklyReportDB, flush_size: int = FLUSH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, max_buffer: int = MAX_BUFFER,
+                 token: Optional[str] = None):
+        """初始化服务
+
+        Args:
+            db: 数据库对象
+            flush_size: 触发写入的缓冲条数
+            flush_interval: 缓冲数据最长等待秒数
+            max_buffer: 缓冲区上限
+            token: 访问令牌，None 表示不校验
+        """
+        self.db = db
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.token = token
+
+        self._buffer: List[PendingReport] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closing = False
+        self.flushed_count = 0
+        self.batch_count = 0
+
+    async def start(self, host: str = INGEST_HOST, port: int = INGEST_PORT):
+        """启动 HTTP 监听及后台写入任务"""
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info("写入服务已启动: %s", ", ".join(
+            str(sock.getsockname()) for sock in self._server.sockets))
+
+    async def close(self):
+        """停止接收请求，写入缓冲区中剩余的数据"""
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._flusher is not None:
+            self._wakeup.set()
+            await self._flusher
+        await self.flush()
+
+    def submit(self, payloads: List) -> Tuple[List[asyncio.Future], List[Dict]]:
+        """校验并把数据放入缓冲区
+
+        Args:
+            payloads: 推送数据列表
+
+        Returns:
+            (已入队数据的写入结果 Future 列表, 校验失败的 {index, error} 列表)
+        """
+        loop = asyncio.get_running_loop()
+        futures, rejected = [], []
+        for index, payload in enumerate(payloads):
+            try:
+                report, fields = validate_payload(payload)
+            except ValueError as e:
+                rejected.append({'index': index, 'error': str(e)})
+                continue
+            future = loop.create_future()
+            self._buffer.append(PendingReport(report, fields, future))
+            futures.append(future)
+
+        if len(self._buffer) >= self.flush_size:
+            self._wakeup.set()
+        return futures, rejected
+
+    async def flush(self):
+        """把当前缓冲区写入数据库"""
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+
+        # 按提供的指标组合分组：同组数据共用一条 UPSERT 语句（同组内同一周以最后一次为准）。
+        # 同一团队周以不同指标组合出现时必须按到达顺序写入，此时另起一轮分组，各轮依次写入
+        rounds: List[Dict[Tuple[str, ...], List[PendingReport]]] = [{}]
+        week_fields: Dict[Tuple[int, str], Tuple[str, ...]] = {}
+        for pending in batch:
+            week = (pending.report['team_id'], pending.report['monday_date'])
+            if week_fields.get(week, pending.fields) != pending.fields:
+                rounds.append({})
+                week_fields = {}
+            week_fields[week] = pending.fields
+            rounds[-1].setdefault(pending.fields, []).append(pending)
+
+        groups = [group for round_groups in rounds for group in round_groups.items()]
+        for fields, pendings in groups:
+            reports = [pending.report for pending in pendings]
+            try:
+                # 写入在线程池中执行，不阻塞事件循环
+                outcomes = await asyncio.to_thread(self.db.upsert_many, reports, fields)
+            except Exception as e:
+                # 写入失败记为该组每条数据的结果（不用 set_exception：未等待结果的请求不会取走异常）
+                logger.exception("批量写入失败（%d 条）", len(reports))
+                outcomes = [RowOutcome(index, None, STATUS_INVALID, str(e)) for index in range(len(reports))]
+
+            for pending, outcome in zip(pendings, outcomes):
+                if not pending.future.done():
+                    pending.future.set_result(outcome)
+
+        self.flushed_count += len(batch)
+        self.batch_count += 1
+        logger.info("已批量写入 %d 条数据（%d 组）", len(batch), len(groups))
+
+    async def _flush_loop(self):
+        """后台写入任务：缓冲区满或等待超时后写入"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个 HTTP 连接（支持 keep-alive）"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                status, body, headers, keep_alive = request
+                if status is None:
+                    status, body, headers = await self._dispatch(*body)
+                await self._write_response(writer, status, body, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """读取一个请求
+
+        Returns:
+            连接已关闭时为 None；请求格式错误时为 (状态码, 响应体, 响应头, False)；
+            否则为 (None, (方法, 路径, 请求头, 请求体), None, 是否保持连接)
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            return 400, {'error': "请求行格式错误"}, {}, False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # 只接受非负十进制整数（int() 还会接受负数、正负号和下划线）
+        raw_length = headers.get('content-length') or '0'
+        if not (raw_length.isascii() and raw_length.isdigit()):
+            return 400, {'error': "Content-Length 格式错误"}, {}, False
+        length = int(raw_length)
+        if length > MAX_BODY_SIZE:
+            return 413, {'error': f"请求体超过 {MAX_BODY_SIZE} 字节"}, {}, False
+        body = await reader.readexactly(length) if length else b''
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return None, (method, target, headers, body), None, keep_alive
+
+    async def _dispatch(self, method: str, target: str, headers: Dict, body: bytes):
+        """路由请求，返回 (状态码, 响应体, 额外响应头)"""
+        url = urlsplit(target)
+
+        if self.token is not None and headers.get('authorization') != f"Bearer {self.token}":
+            return 401, {'error': "未授权"}, {}
+
+        if url.path == '/health':
+            if method != 'GET':
+                return 405, {'error': "仅支持 GET"}, {'Allow': 'GET'}
+            return 200, {
+                'status': 'ok',
+                'buffered': len(self._buffer),
+                'flushed': self.flushed_count,
+                'batches': self.batch_count,
+            }, {}
+
+        if url.path != '/reports':
+            return 404, {'error': "未知路径"}, {}
+        if method != 'POST':
+            return 405, {'error': "仅支持 POST"}, {'Allow': 'POST'}
+        if self._closing:
+            return 503, {'error': "服务正在停止"}, {}
+
+        try:
+            payload = json.loads(body or b'null')
+        except ValueError:
+            return 400, {'error': "请求体不是有效的 JSON"}, {}
+        if isinstance(payload, dict) and 'reports' in payload:
+            payload = payload['reports']
+        payloads = payload if isinstance(payload, list) else [payload]
+
+        if len(self._buffer) + len(payloads) > self.max_buffer:
+            return 503, {'error': "写入缓冲区已满，请稍后重试"}, {'Retry-After': '1'}
+
+        futures, rejected = self.submit(payloads)
+        if not futures and rejected:
+            return 400, {'accepted': 0, 'rejected': rejected}, {}
+
+        if parse_qs(url.query).get('wait', ['0'])[0] not in ('1', 'true'):
+            return 202, {'accepted': len(futures), 'rejected': rejected}, {}
+
+        # 等待所在批次落库，返回每条的写入结果
+        results = [
+            {'report_id': outcome.report_id, 'status': outcome.status, 'error': outcome.error}
+            for outcome in await asyncio.gather(*futures)
+        ]
+        return 200, {'accepted': len(futures), 'rejected': rejected, 'results': results}, {}
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, body: Dict,
+                              headers: Dict, keep_alive: bool):
+        """写出 JSON 响应"""
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        lines = [
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ] + [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + payload)
+        await writer.drain()
+
+
+async def serve(args: argparse.Namespace):
+    """运行服务直到被中断"""
+    db = WeeklyReportDB(args.db)
+    service = IngestService(
+        db,
+        flush_size=args.flush_size,
+        flush_interval=args.flush_interval,
+        token=os.environ.get('RD_INGEST_TOKEN') or None
+    )
+    await service.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="周报数据 HTTP 写入服务")
+    parser.add_argument('--host', default=INGEST_HOST, help="监听地址")
+    parser.add_argument('--port', type=int, default=INGEST_PORT, help="监听端口")
+    parser.add_argument('--db', default='rd_report.db', help="数据库文件路径")
+    parser.add_argument('--flush-size', type=int, default=FLUSH_SIZE, help="触发写入的缓冲条数")
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL, help="缓冲数据最长等待秒数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        logger.info("写入服务已停止")
+
+
+if __name__ == "__main__":
+    main()
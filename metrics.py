@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标计算模块：一次性向量化计算所有指标的周环比/月环比/年同比
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# 周报指标及其中文名称（顺序即页面展示顺序）
+METRIC_LABELS = OrderedDict([
+    ('online_requirements', '上线需求数'),
+    ('online_req_count', '需求关联req数'),
+    ('fixed_bugs', '解决的BUG数'),
+    ('new_bugs', '新增BUG数'),
+    ('release_orders', '发布工单数'),
+    ('release_failures', '发布失败数'),
+    ('new_reuse_units', '新增可复用的最小单元数'),
+    ('new_reuse_events', '新增复用事件数'),
+])
+
+METRICS = tuple(METRIC_LABELS)
+
+# 派生指标及其中文名称（由数据库生成列或周期合计计算，见 database.DERIVED_METRICS）
+DERIVED_METRIC_LABELS = OrderedDict([
+    ('bug_fix_rate', 'BUG修复率(%)'),
+    ('release_failure_rate', '发布失败率(%)'),
+    ('net_bug_change', 'BUG净增数'),
+    ('reqs_per_requirement', '单个需求关联req数'),
+])
+
+# 趋势图、团队对比可选的全部指标
+CHART_METRIC_LABELS = OrderedDict(list(METRIC_LABELS.items()) + list(DERIVED_METRIC_LABELS.items()))
+
+# 对比方式 -> 回看的天数；None 表示与上一条记录对比（周环比，缺周时与最近一条有数据的周对比）
+COMPARISONS: Dict[str, Optional[int]] = {
+    'wow': None,
+    'mom': 28,
+    'yoy': 364,
+}
+
+
+def change_rate(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """向量化计算变化百分比
+
+    上期为 0 时：本期也为 0 记为 0%，否则记为 100%；没有上期数据时为 NaN。
+
+    Args:
+        current: 本期数值
+        previous: 上期数值（缺失为 NaN）
+
+    Returns:
+        变化百分比数组
+    """
+    current = np.asarray(current, dtype='float64')
+    previous = np.asarray(previous, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = (current - previous) / previous * 100
+    rate = np.where(previous == 0, np.where(current == 0, 0.0, 100.0), rate)
+    return np.where(np.isnan(previous), np.nan, rate)
+
+
+def change_direction(rate: np.ndarray) -> np.ndarray:
+    """变化方向：1 上升，-1 下降，0 持平或无对比数据"""
+    return np.nan_to_num(np.sign(rate)).astype('int8')
+
+
+def compute_changes(df: pd.DataFrame, metrics: Sequence[str] = METRICS,
+                    comparisons: Sequence[str] = tuple(COMPARISONS),
+                    date_column: str = 'monday_date',
+                    group_by: Optional[str] = None) -> pd.DataFrame:
+    """一次性计算所有指标的对比列
+
+    对每个指标 m 和对比方式 c 生成两列：
+    - {m}_{c}: 变化百分比（无对比数据为 NaN）
+    - {m}_{c}_dir: 变化方向（1/-1/0）
+
+    Args:
+        df: 周报数据，需包含 date_column 和各指标列
+        metrics: 需要计算的指标
+        comparisons: 对比方式，取自 COMPARISONS
+        date_column: 周期日期列
+        group_by: 可选的分组列（如团队），各组独立计算
+
+    Returns:
+        按 (分组, 日期) 升序排列、附加了对比列的新 DataFrame
+    """
+    sort_columns = [group_by, date_column] if group_by else [date_column]
+    result = df.sort_values(sort_columns, kind='stable').reset_index(drop=True)
+    values = result[list(metrics)].to_numpy(dtype='float64')
+
+    # (分组, 日期) 的索引，用于按日期回看
+    if group_by:
+        key_index = pd.MultiIndex.from_arrays([result[group_by], result[date_column]])
+    else:
+        key_index = pd.Index(result[date_column])
+
+    new_columns = {}
+    for comparison in comparisons:
+        lookback = COMPARISONS[comparison]
+        if lookback is None:
+            previous = _previous_record(values, result[group_by].to_numpy() if group_by else None)
+        else:
+            target_dates = result[date_column] - pd.Timedelta(days=lookback)
+            if group_by:
+                targets = pd.MultiIndex.from_arrays([result[group_by], target_dates])
+            else:
+                targets = pd.Index(target_dates)
+            positions = key_index.get_indexer(targets)
+            previous = np.where((positions >= 0)[:, None], values[positions], np.nan)
+
+        rates = change_rate(values, previous)
+        directions = change_direction(rates)
+        for i, metric in enumerate(metrics):
+            new_columns[f'{metric}_{comparison}'] = rates[:, i]
+            new_columns[f'{metric}_{comparison}_dir'] = directions[:, i]
+
+    return pd.concat([result, pd.DataFrame(new_columns, index=result.index)], axis=1)
+
+
+def _previous_record(values: np.ndarray, groups: Optional[np.ndarray]) -> np.ndarray:
+    """上一条记录的指标值，每组第一条为 NaN"""
+    previous = np.empty_like(values)
+    if len(values) == 0:
+        return previous
+    previous[0] = np.nan
+    previous[1:] = values[:-1]
+    if groups is not None and len(groups) > 1:
+        previous[1:][groups[1:] != groups[:-1]] = np.nan
+    return previous
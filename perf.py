@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轻量级耗时统计
+
+    with timed('page.load'):
+        ...
+
+每段耗时同时记录到三处：
+- 当前运行（一次 Streamlit 重跑）的明细列表，用于侧边栏性能面板；
+- 按名称保存的最近 ROLLING_WINDOW 次耗时，用于计算滚动分位数；
+- 名为 rd_report.perf 的 logger，每段一行 JSON（仅在该 logger 配置了处理器时才序列化）。
+
+设置环境变量 RD_PERF_LOG=<文件路径> 可把 JSON 日志写入文件。
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# 不向根 logger 传播：只有通过 RD_PERF_LOG / configure_json_log 显式配置了处理器时才输出
+logger = logging.getLogger('rd_report.perf')
+logger.propagate = False
+
+# 每个名称保留的最近耗时条数
+ROLLING_WINDOW = 500
+
+# 一段耗时：depth 为嵌套层级（0 为最外层），started 为开始时刻（perf_counter）
+Timing = namedtuple('Timing', ['name', 'ms', 'depth', 'started'])
+
+_current_run: ContextVar[Optional[List[Timing]]] = ContextVar('perf_current_run', default=None)
+_depth: ContextVar[int] = ContextVar('perf_depth', default=0)
+
+_history: Dict[str, Deque[float]] = {}
+_history_lock = threading.Lock()
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """统计一段代码的耗时
+
+    Args:
+        name: 统计项名称，如 db.get_reports_frame、page.数据可视化.load
+    """
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        _depth.reset(token)
+        _record(Timing(name, elapsed, depth, started))
+
+
+def _record(timing: Timing):
+    """保存一段耗时"""
+    run = _current_run.get()
+    if run is not None:
+        run.append(timing)
+
+    with _history_lock:
+        history = _history.get(timing.name)
+        if history is None:
+            history = _history[timing.name] = deque(maxlen=ROLLING_WINDOW)
+        history.append(timing.ms)
+
+    if logger.handlers and logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            'event': 'timing',
+            'name': timing.name,
+            'ms': round(timing.ms, 3),
+            'depth': timing.depth,
+            'ts': time.time(),
+            'thread': threading.current_thread().name,
+        }, ensure_ascii=False))
+
+
+def timed_function(name: str) -> Callable:
+    """装饰器：统计函数每次调用的耗时"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(prefix: str) -> Callable[[type], type]:
+    """类装饰器：为所有公开方法加上耗时统计，名称为 {prefix}.{方法名}
+
+    上下文管理器形式的方法（生成器函数）不统计：调用本身只创建对象，耗时没有意义。
+    """
+    def decorator(cls: type) -> type:
+        for attr, func in list(vars(cls).items()):
+            if attr.startswith('_') or not inspect.isfunction(func):
+                continue
+            if inspect.isgeneratorfunction(inspect.unwrap(func)):
+                continue
+            setattr(cls, attr, timed_function(f"{prefix}.{attr}")(func))
+        return cls
+    return decorator
+
+
+def start_run() -> List[Timing]:
+    """开始一次新的运行（如一次页面重跑），返回收集本次耗时明细的列表"""
+    run: List[Timing] = []
+    _current_run.set(run)
+    return run
+
+
+def current_run() -> List[Timing]:
+    """本次运行到目前为止的耗时明细，按开始时刻排序（外层在其内层之前）"""
+    return sorted(_current_run.get() or [], key=lambda timing: timing.started)
+
+
+def rolling_percentiles(percentiles=(50, 95, 99)) -> List[Dict]:
+    """各统计项最近 ROLLING_WINDOW 次耗时的分位数
+
+    Returns:
+        每项一个字典：name、count 以及 p50 / p95 / p99（毫秒），按 p95 降序
+    """
+    with _history_lock:
+        snapshot = {name: np.fromiter(history, dtype='float64') for name, history in _history.items()}
+
+    rows = []
+    for name, values in snapshot.items():
+        if not len(values):
+            continue
+        row = {'name': name, 'count': len(values)}
+        for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+            row[f'p{percentile}'] = float(value)
+        rows.append(row)
+    rows.sort(key=lambda row: row.get('p95', 0), reverse=True)
+    return rows
+
+
+def reset_history():
+    """清空滚动统计"""
+    with _history_lock:
+        _history.clear()
+
+
+def configure_json_log(path: str):
+    """把耗时 JSON 日志追加写入文件（同一文件只配置一次）"""
+    path = os.path.abspath(path)
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == path:
+            return
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+if os.environ.get('RD_PERF_LOG'):
+    configure_json_log(os.environ['RD_PERF_LOG'])
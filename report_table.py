@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周报对比表格的 HTML 渲染模块
+"""
+
+import html
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from metrics import METRICS, METRIC_LABELS
+
+
+# 表格样式：所有单元格共用 class，不再为每个单元格写内联样式
+TABLE_CSS = """
+<style>
+.rd-table { width: 100%; border-collapse: collapse; font-size: 14px; }
+.rd-table th { padding: 12px; text-align: left; border: 1px solid #dee2e6; font-weight: bold;
+               background-color: #f8f9fa; border-bottom: 2px solid #dee2e6; }
+.rd-table td { padding: 10px; border: 1px solid #dee2e6; }
+.rd-table tbody tr:nth-child(even) { background-color: #f8f9fa; }
+.rd-up { color: #28a745; font-weight: bold; }
+.rd-down { color: #dc3545; font-weight: bold; }
+.rd-flat { color: #6c757d; }
+</style>
+"""
+
+# 渲染结果缓存的条目数
+RENDER_CACHE_SIZE = 32
+
+_render_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+
+def render_comparison_table(frame: pd.DataFrame, window: int = 4,
+                            metrics: Sequence[str] = METRICS,
+                            labels: Optional[Dict[str, str]] = None,
+                            comparison: str = 'wow',
+                            cache_key: Optional[Hashable] = None) -> str:
+    """渲染最近若干周的指标对比表格（最新一周在顶部）
+
+    frame 需要是 metrics.compute_changes 的结果，环比及方向直接取预先计算好的列，
+    单元格内容按列批量生成，整张表只拼接一次。
+
+    Args:
+        frame: 附加了对比列、按日期升序的周报数据
+        window: 显示的周数
+        metrics: 显示的指标
+        labels: 指标的列标题，默认使用 METRIC_LABELS
+        comparison: 对比方式（wow / mom / yoy）
+        cache_key: 数据版本标识（如数据代数）；提供时按 (cache_key, 参数) 缓存渲染结果
+
+    Returns:
+        包含样式的 HTML 字符串
+    """
+    labels = labels or METRIC_LABELS
+    key = None
+    if cache_key is not None:
+        key = (cache_key, window, tuple(metrics), tuple(labels[metric] for metric in metrics), comparison)
+        with _render_cache_lock:
+            cached = _render_cache.get(key)
+            if cached is not None:
+                _render_cache.move_to_end(key)
+                return cached
+
+    rows = frame.tail(window).iloc[::-1]
+
+    periods = (rows['monday_date'].dt.strftime('%m-%d') + " 至 "
+               + rows['sunday_date'].dt.strftime('%m-%d')).to_numpy(dtype=object)
+    columns = [periods]
+    for metric in metrics:
+        columns.append(format_change_cells(
+            rows[metric].to_numpy(),
+            rows[f'{metric}_{comparison}'].to_numpy(),
+            rows[f'{metric}_{comparison}_dir'].to_numpy()
+        ))
+
+    header = "".join(f"<th>{html.escape(title)}</th>"
+                     for title in ["周期"] + [labels[metric] for metric in metrics])
+    cells = np.column_stack(columns) if len(rows) else np.empty((0, len(columns)), dtype=object)
+    body = "".join("<tr><td>" + "</td><td>".join(row) + "</td></tr>" for row in cells)
+    table = f"{TABLE_CSS}<table class='rd-table'><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>"
+
+    if key is not None:
+        with _render_cache_lock:
+            _render_cache[key] = table
+            while len(_render_cache) > RENDER_CACHE_SIZE:
+                _render_cache.popitem(last=False)
+    return table
+
+
+def format_change_cells(values: np.ndarray, changes: np.ndarray, directions: np.ndarray) -> np.ndarray:
+    """批量生成"数值 ▲(+x.x%)"样式的单元格内容
+
+    Args:
+        values: 指标数值
+        changes: 变化百分比（NaN 表示无对比数据）
+        directions: 变化方向（1/-1/0）
+
+    Returns:
+        单元格 HTML 字符串数组
+    """
+    numbers = np.char.mod('%d', np.asarray(values, dtype='int64'))
+    percents = np.char.mod('%.1f', np.nan_to_num(np.asarray(changes, dtype='float64')))
+
+    up = np.char.add(np.char.add(" <span class='rd-up'>▲(+", percents), "%)</span>")
+    down = np.char.add(np.char.add(" <span class='rd-down'>▼(", percents), "%)</span>")
+    flat = " <span class='rd-flat'>➡️(0.0%)</span>"
+    missing = " (-)"
+
+    suffix = np.where(directions > 0, up, np.where(directions < 0, down, flat))
+    suffix = np.where(np.isnan(np.asarray(changes, dtype='float64')), missing, suffix)
+    return np.char.add(numbers, suffix).astype(object)
+
+
+def clear_render_cache():
+    """清空渲染结果缓存"""
+    with _render_cache_lock:
+        _render_cache.clear()
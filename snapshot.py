@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周报数据的列式快照（Arrow IPC 文件）
+
+进程重启后看板首次加载需要从 SQLite 读取并转换整张 weekly_reports 表。
+快照把同样的数据按列保存在数据库旁的 <db_path>.snapshot.arrow 中：
+
+- 启动时以内存映射方式打开，get_reports_frame 直接从快照构造 DataFrame（数值列零拷贝）；
+- 快照记录生成时的变更版本号（report_changes.version），与数据库不一致时不使用，
+  读取回退到 SQLite 并在后台重建；
+- 本进程写入后由后台线程合并短时间内的多次写入、只重建一次。
+
+SQLite 始终是唯一的数据源，快照文件可以随时删除。需要安装 pyarrow：
+
+    db = WeeklyReportDB("rd_report.db")
+    ReportSnapshot(db)          # 挂到 db.snapshot 上
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from database import WeeklyReportDB, COLUMN_DTYPES, EXPORT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 快照文件后缀（与数据库文件同目录）
+SNAPSHOT_SUFFIX = ".snapshot.arrow"
+
+# 写入后等待多久再重建（秒），期间的其他写入合并为一次重建
+REBUILD_DEBOUNCE = 2.0
+
+# 快照元数据中保存变更版本号的键
+VERSION_KEY = b"rd_report.version"
+
+# 进程退出时等待进行中的重建取消的最长时间（秒）
+CLOSE_TIMEOUT = 5.0
+
+
+class RebuildCancelled(Exception):
+    """快照关闭时中止进行中的重建"""
+
+
+def snapshot_available() -> bool:
+    """是否安装了快照所需的 pyarrow"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_schema():
+    """快照的 Arrow 结构，列类型与 COLUMN_DTYPES 一致"""
+    import pyarrow as pa
+
+    fields = []
+    for column, dtype in COLUMN_DTYPES.items():
+        if dtype.startswith('datetime64'):
+            arrow_type = pa.timestamp('s')
+        elif dtype == 'float64':
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.int64()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+
+class ReportSnapshot:
+    """weekly_reports 的列式快照，创建后挂到 db.snapshot 上"""
+
+    def __init__(self, db: WeeklyReportDB, path: Optional[str] = None,
+                 debounce: float = REBUILD_DEBOUNCE):
+        """
+        Args:
+            db: 数据库对象
+            path: 快照文件路径，默认为数据库路径加 SNAPSHOT_SUFFIX
+            debounce: 写入后等待多久再重建（秒）
+        """
+        import pyarrow  # noqa: F401  缺少 pyarrow 时在此处直接报错
+
+        self.db = db
+        self.path = path or db.db_path + SNAPSHOT_SUFFIX
+        self.debounce = debounce
+
+        self._lock = threading.Lock()
+        self._table = None
+        self._version: Optional[int] = None
+        # 团队ID -> 该团队的行号（升序），按快照版本惰性构建
+        self._team_rows: Optional[Dict[int, np.ndarray]] = None
+
+        # 后台重建线程：单线程保证同一时间只有一次重建
+        self._rebuild_requested = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+        db.add_write_listener(self.schedule_rebuild)
+        db.snapshot = self
+        # 后台线程是守护线程，退出前先中止重建，避免留下写了一半的临时文件
+        atexit.register(self.close)
+
+    def read_frame(self, columns: Sequence[str], start: Optional[str] = None,
+                   end: Optional[str] = None, team_id: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """从快照读取周报数据（参数与返回值同 get_reports_frame）
+
+        不按团队过滤时数值列直接引用内存映射的数据，不复制；返回的 DataFrame
+        依赖 pandas 的写时复制，调用方修改时才会产生副本。
+
+        Returns:
+            周报数据 DataFrame；快照不存在或已过期时返回 None（并在后台安排重建）
+        """
+        import pyarrow.compute as pc
+
+        table = self._current_table()
+        if table is None:
+            return None
+
+        if team_id is not None:
+            table = table.take(self._rows_of_team(table, int(team_id)))
+
+        mask = None
+        if start:
+            mask = _and(mask, pc.greater_equal(table['monday_date'], _timestamp_scalar(start)))
+        if end:
+            mask = _and(mask, pc.less_equal(table['monday_date'], _timestamp_scalar(end)))
+        if mask is not None:
+            table = table.filter(mask)
+
+        return table.select(list(columns)).to_pandas(split_blocks=True)
+
+    def warm_up(self) -> bool:
+        """启动时调用：快照有效则映射到内存，否则安排后台重建
+
+        Returns:
+            快照是否可以直接使用
+        """
+        return self._current_table() is not None
+
+    def _current_table(self):
+        """返回与数据库变更版本一致的快照表，没有时返回 None"""
+        version = self.db.get_change_version()
+        with self._lock:
+            if self._table is not None and self._version == version:
+                return self._table
+
+        table = self._open(version)
+        if table is None:
+            self.schedule_rebuild()
+            return None
+        with self._lock:
+            self._table, self._version, self._team_rows = table, version, None
+        return table
+
+    def _rows_of_team(self, table, team_id: int) -> np.ndarray:
+        """某个团队在快照中的行号，首次按团队过滤时一次性为所有团队建立"""
+        with self._lock:
+            team_rows = self._team_rows if self._table is table else None
+        if team_rows is None:
+            team_ids = table['team_id'].to_numpy()
+            # 稳定排序保证同一团队内仍按周一日期升序
+            order = np.argsort(team_ids, kind='stable')
+            teams, starts = np.unique(team_ids[order], return_index=True)
+            team_rows = dict(zip(teams.tolist(), np.split(order, starts[1:])))
+            with self._lock:
+                if self._table is table:
+                    self._team_rows = team_rows
+        return team_rows.get(team_id, np.array([], dtype='int64'))
+
+    def _open(self, version: int):
+        """内存映射打开快照文件，文件不存在、损坏或版本不一致时返回 None"""
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        try:
+            source = pa.memory_map(self.path, 'r')
+            reader = ipc.open_file(source)
+        except (FileNotFoundError, pa.ArrowInvalid, OSError):
+            return None
+
+        metadata = reader.schema.metadata or {}
+        if metadata.get(VERSION_KEY) != str(version).encode('ascii'):
+            return None
+        if reader.schema.remove_metadata() != _arrow_schema():
+            return None
+        return reader.read_all()
+
+    def schedule_rebuild(self):
+        """安排一次后台重建（非阻塞，短时间内的多次调用只重建一次）"""
+        if self._closed:
+            return
+        self._rebuild_requested.set()
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="report-snapshot", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        """后台线程：等待重建请求，去抖后重建"""
+        while not self._closed:
+            self._rebuild_requested.wait()
+            # 去抖：等待期间又有写入则继续等待
+            while self._rebuild_requested.is_set() and not self._closed:
+                self._rebuild_requested.clear()
+                time.sleep(self.debounce)
+            if self._closed:
+                return
+            try:
+                self.rebuild()
+            except RebuildCancelled:
+                return
+            except Exception:
+                logger.exception("重建周报快照失败: %s", self.path)
+
+    def rebuild(self) -> int:
+        """在当前线程中重建快照文件
+
+        在同一个读事务内读取变更版本号和全部数据，写入临时文件后原子替换，
+        读取方不会看到写了一半的快照。重建期间需要约一份快照大小的内存。
+
+        Returns:
+            快照对应的变更版本号
+        """
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        schema = _arrow_schema()
+        columns = list(COLUMN_DTYPES)
+        started = time.perf_counter()
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        try:
+            with self.db.connection() as conn:
+                began = not conn.in_transaction
+                if began:
+                    conn.execute("BEGIN")
+                try:
+                    version = self.db.get_change_version()
+                    schema = schema.with_metadata({VERSION_KEY: str(version).encode('ascii')})
+                    batches = []
+                    for frame in self.db.iter_report_frames(EXPORT_CHUNK_SIZE, columns):
+                        if self._closed:
+                            raise RebuildCancelled()
+                        batches.append(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+                finally:
+                    if began and conn.in_transaction:
+                        conn.execute("COMMIT")
+
+            # 合并为单个连续的数据块：读取时按行号 take 不必跨块查找，速度快两个数量级
+            table = pa.Table.from_batches(batches, schema=schema).combine_chunks()
+            del batches
+            rows = table.num_rows
+            with pa.OSFile(temp_path, 'wb') as sink, ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        logger.info("周报快照已重建: %d 行, 版本 %d, 耗时 %.0fms",
+                    rows, version, (time.perf_counter() - started) * 1000)
+        return version
+
+    def close(self, timeout: float = CLOSE_TIMEOUT):
+        """停止后台重建，进行中的重建在处理完当前数据块后中止"""
+        self._closed = True
+        self._rebuild_requested.set()
+        worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+
+
+def _timestamp_scalar(day: str):
+    """YYYY-MM-DD 转为与快照日期列同类型的标量"""
+    import pyarrow as pa
+
+    return pa.scalar(datetime.strptime(day, '%Y-%m-%d'), pa.timestamp('s'))
+
+
+def _and(mask, condition):
+    """合并过滤条件"""
+    import pyarrow.compute as pc
+
+    return condition if mask is None else pc.and_(mask, condition)
@@ -4,15 +4,26 @@
 Streamlit 周报表管理应用
 """
 
+import io
+import os
+import time
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from database import WeeklyReportDB
+from database import (WeeklyReportDB, STATUS_INSERTED, STATUS_UPDATED, STATUS_DUPLICATE, ANOMALY_METRICS,
+                      STATS_METRICS, DERIVED_METRICS, RATIO_METRICS, HISTORY_DELETE, set_current_actor)
+from importer import iter_import_chunks, COLUMN_ALIASES
+from metrics import METRICS, METRIC_LABELS, CHART_METRIC_LABELS, DERIVED_METRIC_LABELS, compute_changes
+from report_table import render_comparison_table
+from charts import build_trend_figure, add_anomaly_markers
+from exporter import EXPORT_FORMATS, export_reports
+from snapshot import ReportSnapshot, snapshot_available
+from perf import timed, start_run, current_run, rolling_percentiles
+from auth import configure_auth_logging, load_credentials, verify_credentials
 from streamlit_option_menu import option_menu
 
-
 # 页面配置
 st.set_page_config(
     page_title="周报表管理系统",
@@ -21,67 +32,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# 本次重跑的耗时明细（数据库方法及各页面分段）
+start_run()
+rerun_started = time.perf_counter()
+
 # 初始化session state
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 
+# 认证日志只在进程启动后配置一次；凭据读取一次后保存在内存中
+@st.cache_resource
+def load_login_credentials():
+    configure_auth_logging()
+    return load_credentials(st.secrets)
+
 # 登录验证
 def check_credentials(username, password):
     """验证用户名和密码"""
-    import hashlib
-    import os
-    import base64
-    import logging
-    
-    # 配置日志
-    logging.basicConfig(level=logging.INFO, 
-                      format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                      handlers=[logging.FileHandler("auth.log"), logging.StreamHandler()])
-    logger = logging.getLogger("auth")
-    
-    # 使用环境变量或secrets存储盐值，这里使用固定盐值作为示例
-    # 实际应用中应该使用环境变量或其他安全方式存储
-    salt = "RD_COST_SALT"
-    
-    # 对密码进行加盐哈希
-    def hash_password(pwd, salt_value):
-        salted = (pwd + salt_value).encode('utf-8')
-        return hashlib.sha256(salted).hexdigest()
-    
-    try:
-        # 首选从secrets中获取凭据
-        secrets = st.secrets["login"]
-        stored_username = secrets["username"]
-        stored_password_hash = secrets.get("password_hash")
-        
-        # 记录验证信息
-        hashed_input = hash_password(password, salt)
-        logger.info(f"验证用户: {username}, 存储用户名: {stored_username}")
-        
-        # 如果存储的是哈希密码
-        if stored_password_hash:
-            result = username == stored_username and hashed_input == stored_password_hash
-            logger.info(hashed_input)
-            logger.info(stored_password_hash)
-            logger.info(f"哈希密码验证结果: {result}")
-            return result
-        # 如果存储的是明文密码（不推荐）
-        else:
-            result = username == stored_username and password == secrets["password"]
-            logger.info(f"明文密码验证结果: {result}")
-            return result
-    except Exception as e:
-        # 回退到默认凭据（仅用于开发环境）
-        default_username = "xd"
-        default_password_hash = "5c28b8dab232deda9713e631a3d5e2718f5cb082f5e8a688eec4742c3ac56e77"
-        
-        # 记录回退到默认凭据的情况
-        logger.warning(f"使用默认凭据验证，异常: {str(e)}")
-        hashed_input = hash_password(password, salt)
-        result = username == default_username and hashed_input == default_password_hash
-        logger.info(f"默认凭据验证结果: {result}")
-        
-        return result
+    return verify_credentials(username, password, load_login_credentials())
 
 def login_page():
     """显示登录页面"""
@@ -117,6 +85,7 @@ def login_page():
             if submitted:
                 if check_credentials(username, password):
                     st.session_state.authenticated = True
+                    st.session_state.username = username
                     st.rerun()
                 else:
                     st.error("❌ 用户名或密码错误")
@@ -128,12 +97,37 @@ if not st.session_state.authenticated:
     login_page()
     st.stop()
 
-# 初始化数据库
+# 本次重跑中的写入在修改历史中记为当前登录用户
+set_current_actor(st.session_state.get('username'))
+
+# 异常提醒最多显示的条数
+MAX_ANOMALY_ALERTS = 10
+
+# 修改历史中各字段、操作的显示名称
+HISTORY_FIELD_LABELS = {field: label for label, field in COLUMN_ALIASES.items()}
+HISTORY_ACTION_LABELS = {'insert': '新增', 'update': '修改', HISTORY_DELETE: '删除'}
+
+# 初始化数据库（进程内所有会话共享同一个实例，重跑脚本时不再重复建表/检查结构）
+@st.cache_resource
 def init_database():
-    return WeeklyReportDB()
+    db = WeeklyReportDB()
+    # 列式快照加速重启后的首次看板加载（需要 pyarrow，设置 RD_SNAPSHOT=0 可关闭）
+    if os.environ.get('RD_SNAPSHOT', '1') != '0' and snapshot_available():
+        ReportSnapshot(db).warm_up()
+    return db
 
 db = init_database()
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_dashboard_frame(generation, team_id):
+    """读取某个团队的看板数据并一次性向量化计算所有指标的周环比/月环比/年同比
+    
+    generation 为数据代数，只用作缓存键：数据变化后代数增大，缓存自动失效。
+    """
+    frame = db.get_reports_frame(columns=['monday_date', 'sunday_date'] + list(METRICS), team_id=team_id)
+    with timed('page.数据可视化.compute_changes'):
+        return compute_changes(frame)
+
 # 侧边栏导航
 # 设置侧边栏样式，使其更窄
 st.markdown("""
@@ -149,29 +143,54 @@ st.markdown("""
 
 with st.sidebar:
     # 显示当前登录用户
-    st.markdown(f"👤 **当前用户**: xd")
+    st.markdown(f"👤 **当前用户**: {st.session_state.get('username', 'xd')}")
     
     selected = option_menu(
         "主菜单",
-        ["数据可视化", "数据录入", "数据管理"],
-        icons=["bar-chart", "pencil-square", "table"],
+        ["数据可视化", "数据录入", "数据导入", "数据管理"],
+        icons=["bar-chart", "pencil-square", "upload", "table"],
         menu_icon="cast",
         default_index=0,
     )
     
+    # 当前团队：所有页面的录入、导入、查询都限定在该团队
+    teams = db.get_teams()
+    team_names = {team['id']: team['name'] for team in teams}
+    team_id = st.selectbox(
+        "🏢 当前团队",
+        options=list(team_names.keys()),
+        format_func=lambda x: team_names[x]
+    )
+    
+    with st.expander("➕ 新建团队"):
+        new_team_name = st.text_input("团队名称")
+        if st.button("创建团队", use_container_width=True):
+            try:
+                db.create_team(new_team_name)
+                st.rerun()
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+    
     # 添加登出按钮
     if st.button("🚪 登出", use_container_width=True):
         st.session_state.authenticated = False
         st.rerun()
+    
+    show_perf_panel = st.checkbox("⏱️ 性能面板", help="显示本次页面刷新的分段耗时及最近的耗时分位数")
+    perf_panel = st.container()
 
 # 主标题
 st.title("📊 周报表管理系统")
 
-def calculate_week_over_week_change(current_value, previous_value):
-    """计算周环比变化"""
-    if previous_value == 0:
-        return 0 if current_value == 0 else 100
-    return ((current_value - previous_value) / previous_value) * 100
+def period_floor(day, granularity):
+    """日期所在月/季度/年的起始日期（YYYY-MM-DD）"""
+    if granularity == 'month':
+        day = day.replace(day=1)
+    elif granularity == 'quarter':
+        day = day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    else:
+        day = day.replace(month=1, day=1)
+    return day.strftime('%Y-%m-%d')
 
 def format_change_display(change):
     """格式化变化显示"""
@@ -182,15 +201,6 @@ def format_change_display(change):
     else:
         return "➡️ 0.0%"
 
-def format_change_with_color(value, change):
-    """格式化带颜色的变化显示"""
-    if change > 0:
-        return f"{value} <span style='color: #28a745; font-weight: bold;'>▲(+{change:.1f}%)</span>"
-    elif change < 0:
-        return f"{value} <span style='color: #dc3545; font-weight: bold;'>▼({change:.1f}%)</span>"
-    else:
-        return f"{value} <span style='color: #6c757d;'>➡️(0.0%)</span>"
-
 # 数据录入页面
 if selected == "数据录入":
     st.header("📝 周报数据录入")
@@ -272,6 +282,12 @@ if selected == "数据录入":
                 help="本周新增的复用事件数量"
             )
         
+        overwrite = st.checkbox(
+            "该周已有记录时覆盖更新",
+            value=False,
+            help="勾选后如果该周已存在记录，将直接更新为本次填写的数据"
+        )
+        
         # 提交按钮
         submitted = st.form_submit_button(
             "💾 保存周报数据",
@@ -280,15 +296,15 @@ if selected == "数据录入":
         )
         
         if submitted:
-            # 准备数据
+            # 准备数据（BUG修复率由数据库按解决/新增BUG数计算）
             report_data = {
+                'team_id': team_id,
                 'monday_date': monday_date,
                 'sunday_date': sunday_date,
                 'online_requirements': online_requirements,
                 'online_req_count': online_req_count,
                 'fixed_bugs': fixed_bugs,
                 'new_bugs': new_bugs,
-                'bug_fix_rate': 95.0,  # 默认值，保持数据库兼容性
                 'release_orders': release_orders,
                 'release_failures': release_failures,
                 'new_reuse_units': new_reuse_units,
@@ -296,209 +312,243 @@ if selected == "数据录入":
             }
             
             try:
-                report_id = db.insert_weekly_report(report_data)
-                st.success(f"✅ 周报数据保存成功！记录ID: {report_id}，周期：{monday_date} 至 {sunday_date}，上线需求数：{online_requirements}，需求关联req数：{online_req_count}，解决的BUG数：{fixed_bugs}，新增BUG数：{new_bugs}，发布工单数：{release_orders}，发布失败数：{release_failures}，新增可复用的最小单元数：{new_reuse_units}，新增复用事件数：{new_reuse_events}")
+                if overwrite:
+                    report_id, inserted = db.upsert_weekly_report(report_data)
+                else:
+                    report_id, inserted = db.insert_weekly_report(report_data), True
+                action = "保存" if inserted else "覆盖更新"
+                st.success(f"✅ 周报数据{action}成功！记录ID: {report_id}，周期：{monday_date} 至 {sunday_date}，上线需求数：{online_requirements}，需求关联req数：{online_req_count}，解决的BUG数：{fixed_bugs}，新增BUG数：{new_bugs}，发布工单数：{release_orders}，发布失败数：{release_failures}，新增可复用的最小单元数：{new_reuse_units}，新增复用事件数：{new_reuse_events}")
                 st.balloons()
             except Exception as e:
                 st.error(f"❌ 保存失败: {str(e)}")
 
+# 数据导入页面
+if selected == "数据导入":
+    st.header("📥 批量导入历史数据")
+    
+    st.markdown(
+        "支持 CSV / XLSX 文件，第一行为表头。列名可使用英文字段名或以下中文列名："
+        + "、".join(COLUMN_ALIASES.keys())
+        + "。日期可以是该周任意一天，系统会自动对齐到周一和周日；缺少的指标列按 0 处理；"
+        + f"没有团队ID列时导入到当前团队（{team_names[team_id]}）。"
+    )
+    
+    uploaded_file = st.file_uploader("选择导入文件", type=["csv", "xlsx"])
+    import_mode = st.radio(
+        "该周已有记录时",
+        ["跳过", "覆盖更新"],
+        horizontal=True
+    )
+    
+    if uploaded_file is not None and st.button("📥 开始导入", type="primary"):
+        counts = {STATUS_INSERTED: 0, STATUS_UPDATED: 0, STATUS_DUPLICATE: 0}
+        failed_rows = []
+        progress = st.progress(0.0, text="正在导入...")
+        total_size = max(uploaded_file.size, 1)
+        
+        try:
+            for chunk in iter_import_chunks(uploaded_file, uploaded_file.name, team_id=team_id):
+                failed_rows.extend(chunk.errors)
+                
+                reports = [report for _, report in chunk.rows]
+                if import_mode == "覆盖更新":
+                    outcomes = db.upsert_many(reports)
+                else:
+                    outcomes = db.insert_many(reports)
+                
+                for (line, _), outcome in zip(chunk.rows, outcomes):
+                    if outcome.status in counts:
+                        counts[outcome.status] += 1
+                    else:
+                        failed_rows.append((line, outcome.error))
+                
+                progress.progress(
+                    min(uploaded_file.tell() / total_size, 1.0),
+                    text=f"已处理 {sum(counts.values()) + len(failed_rows)} 行"
+                )
+            
+            progress.progress(1.0, text="导入完成")
+            st.success(
+                f"✅ 导入完成！新增 {counts[STATUS_INSERTED]} 条，"
+                f"覆盖更新 {counts[STATUS_UPDATED]} 条，"
+                f"跳过已存在 {counts[STATUS_DUPLICATE]} 条，"
+                f"失败 {len(failed_rows)} 条"
+            )
+            
+            if failed_rows:
+                st.subheader("⚠️ 未导入的行")
+                st.dataframe(
+                    pd.DataFrame(failed_rows[:1000], columns=["文件行号", "原因"]),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        except Exception as e:
+            st.error(f"❌ 导入失败: {str(e)}")
+
 # 数据可视化页面
 if selected == "数据可视化":
     st.header("📈 数据可视化分析")
     
-    # 获取所有报告数据
-    reports = db.get_all_reports()
+    # 数据及对比列按数据代数缓存，没有写入时重跑脚本不再重新查询和计算
+    with timed('page.数据可视化.load'):
+        generation = db.get_data_generation()
+        df = load_dashboard_frame(generation, team_id)
     
-    if not reports:
+    if df.empty:
         st.warning("📭 暂无数据，请先在数据录入页面添加周报数据。")
     else:
-        # 转换为DataFrame
-        df = pd.DataFrame(reports)
-        df['monday_date'] = pd.to_datetime(df['monday_date'])
-        df = df.sort_values('monday_date')
-        
-        # 确保new_bugs字段存在，如果不存在则添加默认值0
-        if 'new_bugs' not in df.columns:
-            df['new_bugs'] = 0
-        
-        # 计算周环比
-        metrics = ['online_requirements', 'online_req_count', 'fixed_bugs', 'new_bugs',
-                  'release_orders', 'release_failures', 
-                  'new_reuse_units', 'new_reuse_events']
-        
-        for metric in metrics:
-            df[f'{metric}_change'] = df[metric].pct_change() * 100
+        # 近N周数据对比（移到第一部分）
+        table_weeks = st.selectbox("对比表显示周数", [4, 8, 13, 26, 52], index=0)
+        st.subheader(f"📊 近{table_weeks}周数据对比")
         
-        # 近4周数据对比（移到第一部分）
-        st.subheader("📊 近4周数据对比")
+        # 表格HTML按 (数据代数, 团队, 显示周数) 缓存，数据和团队未变化时直接复用
+        with timed('page.数据可视化.table'):
+            table_html = render_comparison_table(df, window=table_weeks, cache_key=(generation, team_id))
+        st.markdown(table_html, unsafe_allow_html=True)
         
-        # 获取最近4周的数据
-        recent_weeks = df.tail(4) if len(df) >= 4 else df
-        
-        if len(recent_weeks) > 0:
-            # 准备表格数据（倒序显示，最新周在顶部）
-            weekly_data = []
-            recent_weeks_reversed = recent_weeks.iloc[::-1]  # 倒序
-            
-            for i, (_, week_data) in enumerate(recent_weeks_reversed.iterrows()):
-                # 格式化周期显示
-                week_period = f"{week_data['monday_date'].strftime('%m-%d')} 至 {pd.to_datetime(week_data['sunday_date']).strftime('%m-%d')}"
-                
-                # 计算环比（与上一周对比）
-                if i < len(recent_weeks_reversed) - 1:
-                    # 获取上一周数据（在倒序数组中的下一个元素）
-                    prev_week_data = recent_weeks_reversed.iloc[i + 1]
-                    
-                    # 计算各指标的环比
-                    req_change = calculate_week_over_week_change(week_data['online_requirements'], prev_week_data['online_requirements'])
-                    req_count_change = calculate_week_over_week_change(week_data['online_req_count'], prev_week_data['online_req_count'])
-                    bug_change = calculate_week_over_week_change(week_data['fixed_bugs'], prev_week_data['fixed_bugs'])
-                    new_bug_change = calculate_week_over_week_change(week_data['new_bugs'], prev_week_data['new_bugs'])
-                    release_change = calculate_week_over_week_change(week_data['release_orders'], prev_week_data['release_orders'])
-                    failure_change = calculate_week_over_week_change(week_data['release_failures'], prev_week_data['release_failures'])
-                    unit_change = calculate_week_over_week_change(week_data['new_reuse_units'], prev_week_data['new_reuse_units'])
-                    event_change = calculate_week_over_week_change(week_data['new_reuse_events'], prev_week_data['new_reuse_events'])
-                    
-                    row_data = {
-                        '周期': week_period,
-                        '上线需求数': format_change_with_color(int(week_data['online_requirements']), req_change),
-                        '需求关联req数': format_change_with_color(int(week_data['online_req_count']), req_count_change),
-                        '解决的BUG数': format_change_with_color(int(week_data['fixed_bugs']), bug_change),
-                        '新增BUG数': format_change_with_color(int(week_data['new_bugs']), new_bug_change),
-                        '发布工单数': format_change_with_color(int(week_data['release_orders']), release_change),
-                        '发布失败数': format_change_with_color(int(week_data['release_failures']), failure_change),
-                        '新增可复用的最小单元数': format_change_with_color(int(week_data['new_reuse_units']), unit_change),
-                        '新增复用事件数': format_change_with_color(int(week_data['new_reuse_events']), event_change)
-                    }
-                else:
-                    # 最早的一周没有环比数据
-                    row_data = {
-                        '周期': week_period,
-                        '上线需求数': f"{int(week_data['online_requirements'])} (-)",
-                        '需求关联req数': f"{int(week_data['online_req_count'])} (-)",
-                        '解决的BUG数': f"{int(week_data['fixed_bugs'])} (-)",
-                        '新增BUG数': f"{int(week_data['new_bugs'])} (-)",
-                        '发布工单数': f"{int(week_data['release_orders'])} (-)",
-                        '发布失败数': f"{int(week_data['release_failures'])} (-)",
-                        '新增可复用的最小单元数': f"{int(week_data['new_reuse_units'])} (-)",
-                        '新增复用事件数': f"{int(week_data['new_reuse_events'])} (-)"
-                    }
-                
-                weekly_data.append(row_data)
-            
-            # 显示表格
-            weekly_df = pd.DataFrame(weekly_data)
-            
-            # 使用HTML表格来支持颜色显示
-            html_table = "<table style='width: 100%; border-collapse: collapse; font-size: 14px;'>"
-            
-            # 表头
-            html_table += "<thead><tr style='background-color: #f8f9fa; border-bottom: 2px solid #dee2e6;'>"
-            for col in weekly_df.columns:
-                html_table += f"<th style='padding: 12px; text-align: left; border: 1px solid #dee2e6; font-weight: bold;'>{col}</th>"
-            html_table += "</tr></thead>"
-            
-            # 表体
-            html_table += "<tbody>"
-            for i, row in weekly_df.iterrows():
-                bg_color = "#ffffff" if i % 2 == 0 else "#f8f9fa"
-                html_table += f"<tr style='background-color: {bg_color};'>"
-                for col in weekly_df.columns:
-                    html_table += f"<td style='padding: 10px; border: 1px solid #dee2e6;'>{row[col]}</td>"
-                html_table += "</tr>"
-            html_table += "</tbody></table>"
-            
-            st.markdown(html_table, unsafe_allow_html=True)
-            
-            # 添加说明信息
-            st.info("💡 表格按时间倒序排列，最新一周在顶部。▲绿色表示上升，▼红色表示下降，➡️灰色表示无变化，'-'表示无对比数据。")
+        # 添加说明信息
+        st.info("💡 表格按时间倒序排列，最新一周在顶部。▲绿色表示上升，▼红色表示下降，➡️灰色表示无变化，'-'表示无对比数据。")
         
         # 显示最新一周的关键指标
         st.subheader("📊 本周关键指标")
         
         if len(df) >= 1:
             latest_report = df.iloc[-1]
-            previous_report = df.iloc[-2] if len(df) >= 2 else None
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                change = latest_report['online_requirements_change'] if previous_report is not None else 0
-                st.metric(
-                    "上线需求数",
-                    int(latest_report['online_requirements']),
-                    delta=f"{change:.1f}%" if previous_report is not None else None
-                )
-            
-            with col2:
-                change = latest_report['fixed_bugs_change'] if previous_report is not None else 0
-                st.metric(
-                    "解决的BUG数",
-                    int(latest_report['fixed_bugs']),
-                    delta=f"{change:.1f}%" if previous_report is not None else None
-                )
-            
-            with col3:
-                change = latest_report['new_bugs_change'] if previous_report is not None else 0
-                st.metric(
-                    "新增BUG数",
-                    int(latest_report['new_bugs']),
-                    delta=f"{change:.1f}%" if previous_report is not None else None
-                )
             
-            with col4:
-                change = latest_report['release_orders_change'] if previous_report is not None else 0
-                st.metric(
-                    "发布工单数",
-                    int(latest_report['release_orders']),
-                    delta=f"{change:.1f}%" if previous_report is not None else None
+            for column, metric in zip(st.columns(4), ['online_requirements', 'fixed_bugs', 'new_bugs', 'release_orders']):
+                with column:
+                    change = latest_report[f'{metric}_wow']
+                    st.metric(
+                        METRIC_LABELS[metric],
+                        int(latest_report[metric]),
+                        delta=None if pd.isna(change) else f"{change:.1f}%"
+                    )
+        
+        # 异常提醒：z 分数在周报写入时计算并保存，这里只按索引读取，不扫描历史数据
+        st.subheader("🚨 异常提醒")
+        with timed('page.数据可视化.anomalies'):
+            alert_start = df['monday_date'].iloc[max(len(df) - table_weeks, 0)].strftime('%Y-%m-%d')
+            anomalies = db.get_anomalies(start=alert_start, team_id=team_id)
+        if anomalies.empty:
+            st.success(f"✅ 近{table_weeks}周{'、'.join(METRIC_LABELS[m] for m in ANOMALY_METRICS)}未发现异常波动")
+        else:
+            for anomaly in anomalies.head(MAX_ANOMALY_ALERTS).itertuples():
+                direction = "高于" if anomaly.z > 0 else "低于"
+                st.warning(
+                    f"{anomaly.monday_date.strftime('%Y-%m-%d')} 周 {METRIC_LABELS[anomaly.metric]} 为 {anomaly.value}，"
+                    f"显著{direction}近期水平（z = {anomaly.z:+.1f}）"
                 )
+            if len(anomalies) > MAX_ANOMALY_ALERTS:
+                st.caption(f"另有 {len(anomalies) - MAX_ANOMALY_ALERTS} 条更早的异常未显示")
         
         # 趋势图表
         st.subheader("📈 趋势分析")
         
-        # 选择要显示的指标
-        chart_options = {
-            "上线需求数": "online_requirements",
-            "需求关联req数": "online_req_count",
-            "解决的BUG数": "fixed_bugs",
-            "新增BUG数": "new_bugs",
-            "发布工单数": "release_orders",
-            "发布失败数": "release_failures",
-            "新增可复用的最小单元数": "new_reuse_units",
-            "新增复用事件数": "new_reuse_events"
+        # 选择要显示的指标（含由数据库计算的派生指标）
+        chart_options = {label: metric for metric, label in CHART_METRIC_LABELS.items()}
+        
+        # 统计周期：在数据库中聚合，按周扫描周报索引，按月/季度/年读取增量维护的汇总表
+        period_options = {
+            "周": "week",
+            "月": "month",
+            "季度": "quarter",
+            "年": "year"
         }
         
-        selected_metrics = st.multiselect(
-            "选择要显示的指标",
-            options=list(chart_options.keys()),
-            default=["上线需求数", "解决的BUG数"]
-        )
+        # 移动平均包含的周期数，None 表示显示原始值
+        smoothing_options = {
+            "不平滑": None,
+            "4 个周期": 4,
+            "13 个周期": 13,
+            "52 个周期": 52
+        }
+        
+        trend_col1, trend_col2, trend_col3 = st.columns([3, 1, 1])
+        with trend_col1:
+            selected_metrics = st.multiselect(
+                "选择要显示的指标",
+                options=list(chart_options.keys()),
+                default=["上线需求数", "解决的BUG数"]
+            )
+        with trend_col2:
+            selected_period = st.selectbox("统计周期", list(period_options.keys()))
+        with trend_col3:
+            selected_smoothing = st.selectbox("移动平均", list(smoothing_options.keys()))
+        
+        # 显示范围：缩小范围时从数据库按范围重新读取完整分辨率的数据
+        first_monday, last_monday = df['monday_date'].iloc[0].date(), df['monday_date'].iloc[-1].date()
+        if first_monday < last_monday:
+            trend_start, trend_end = st.slider(
+                "显示范围",
+                min_value=first_monday,
+                max_value=last_monday,
+                value=(first_monday, last_monday),
+                step=timedelta(weeks=1),
+                format="YYYY-MM-DD"
+            )
+        else:
+            trend_start, trend_end = first_monday, last_monday
+        range_start, range_end = trend_start.strftime('%Y-%m-%d'), trend_end.strftime('%Y-%m-%d')
+        
+        granularity = period_options[selected_period]
+        window = smoothing_options[selected_smoothing]
         
         if selected_metrics:
-            # 创建趋势图
-            fig = go.Figure()
-            
-            for metric_name in selected_metrics:
-                metric_col = chart_options[metric_name]
-                fig.add_trace(go.Scatter(
-                    x=df['monday_date'],
-                    y=df[metric_col],
-                    mode='lines+markers',
-                    name=metric_name,
-                    line=dict(width=3),
-                    marker=dict(size=8)
-                ))
-            
-            fig.update_layout(
-                title="周报指标趋势图",
-                xaxis_title="周期 (周一日期)",
-                yaxis_title="数值",
-                hovermode='x unified',
-                height=500
+            # 只聚合选中的指标；范围起点所在的周期也包含在内，移动平均所需的更早周期由数据库向前补读
+            trend_df = db.aggregate(
+                [chart_options[metric_name] for metric_name in selected_metrics],
+                window=window,
+                start=range_start if granularity == 'week' else period_floor(trend_start, granularity),
+                end=range_end,
+                period=granularity,
+                team_id=team_id
             )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            with timed('page.数据可视化.trend_chart'):
+                suffix = '' if window is None else '_rolling_avg'
+                title = f"周报指标趋势图（按{selected_period}）"
+                if window is not None:
+                    title = f"周报指标趋势图（按{selected_period}，{window} 个周期移动平均）"
+                # 点数多时自动降采样并使用 WebGL 渲染
+                fig = build_trend_figure(
+                    trend_df,
+                    'period_start',
+                    {metric_name: chart_options[metric_name] + suffix for metric_name in selected_metrics},
+                    title=title,
+                    xaxis_title="周期 (周一日期)" if granularity == 'week' else f"周期 ({selected_period}起始日期)"
+                )
+                # 按周显示原始值时标出写入时检测到的异常点
+                if granularity == 'week' and window is None:
+                    add_anomaly_markers(
+                        fig,
+                        db.get_anomalies(
+                            start=range_start, end=range_end, team_id=team_id,
+                            metrics=[chart_options[metric_name] for metric_name in selected_metrics
+                                     if chart_options[metric_name] in STATS_METRICS]
+                        ),
+                        METRIC_LABELS
+                    )
+                st.plotly_chart(fig, use_container_width=True)
+        
+        # 跨团队对比（每个团队一次索引范围扫描，在数据库中汇总）
+        if len(teams) > 1:
+            st.subheader("🏢 团队对比")
+            compare_metric = st.selectbox("对比指标", list(chart_options.keys()), key="team_compare_metric")
+            with timed('page.数据可视化.team_chart'):
+                team_summaries = db.get_team_summaries()
+                team_fig = go.Figure(go.Bar(
+                    x=team_summaries['team_name'],
+                    y=team_summaries[chart_options[compare_metric]],
+                    text=team_summaries[chart_options[compare_metric]],
+                    textposition='auto'
+                ))
+                team_fig.update_layout(
+                    title=f"各团队{compare_metric}" if chart_options[compare_metric] in RATIO_METRICS
+                    else f"各团队累计{compare_metric}",
+                    xaxis_title="团队",
+                    yaxis_title="数值",
+                    height=400
+                )
+                st.plotly_chart(team_fig, use_container_width=True)
         
 
 
@@ -506,18 +556,43 @@ if selected == "数据可视化":
 elif selected == "数据管理":
     st.header("🗂️ 数据管理")
     
-    # 获取所有报告数据
-    reports = db.get_all_reports()
+    # 筛选条件（在数据库中过滤）
+    filter_col1, filter_col2 = st.columns([3, 1])
+    with filter_col1:
+        date_range = st.date_input(
+            "按周一日期筛选",
+            value=(),
+            help="选择起止日期，留空表示全部数据"
+        )
+    with filter_col2:
+        page_size = st.selectbox("每页条数", [20, 50, 100, 200], index=1)
+    
+    range_start = date_range[0].strftime('%Y-%m-%d') if len(date_range) >= 1 else None
+    range_end = date_range[1].strftime('%Y-%m-%d') if len(date_range) >= 2 else None
+    
+    # 筛选条件或每页条数变化时回到第一页；manage_page_cursors[i] 是第 i+1 页的起始游标
+    filter_key = (team_id, range_start, range_end, page_size)
+    if st.session_state.get('manage_filter_key') != filter_key:
+        st.session_state.manage_filter_key = filter_key
+        st.session_state.manage_page_cursors = [None]
+    page_cursors = st.session_state.manage_page_cursors
     
-    if not reports:
+    with timed('page.数据管理.summary'):
+        summary = db.get_reports_summary(range_start, range_end, team_id=team_id)
+    
+    if summary['report_count'] == 0:
         st.info("📭 暂无数据")
     else:
-        # 显示数据表格
-        df = pd.DataFrame(reports)
-        
-        # 确保new_bugs字段存在，如果不存在则添加默认值
-        if 'new_bugs' not in df.columns:
-            df['new_bugs'] = 0
+        # 只读取当前页
+        with timed('page.数据管理.load'):
+            reports, next_cursor = db.get_reports_page(
+                limit=page_size,
+                after=page_cursors[-1],
+                start=range_start,
+                end=range_end,
+                team_id=team_id
+            )
+            df = pd.DataFrame(reports)
         
         # 重新排列和重命名列
         display_columns = {
@@ -545,41 +620,133 @@ elif selected == "数据管理":
             hide_index=True
         )
         
-        # 数据统计
+        # 翻页
+        total_pages = max((summary['report_count'] + page_size - 1) // page_size, 1)
+        nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+        with nav_col1:
+            if st.button("⬅️ 上一页", disabled=len(page_cursors) <= 1, use_container_width=True):
+                page_cursors.pop()
+                st.rerun()
+        with nav_col2:
+            st.markdown(
+                f"<div style='text-align: center;'>第 {len(page_cursors)} / {total_pages} 页，共 {summary['report_count']} 条</div>",
+                unsafe_allow_html=True
+            )
+        with nav_col3:
+            if st.button("下一页 ➡️", disabled=next_cursor is None, use_container_width=True):
+                page_cursors.append(next_cursor)
+                st.rerun()
+        
+        # 派生指标排行（在数据库中按生成列上的索引过滤、排序，只读取显示的条数）
+        with st.expander("🔝 派生指标排行"):
+            rank_col1, rank_col2, rank_col3, rank_col4 = st.columns([2, 1, 1, 1])
+            with rank_col1:
+                rank_metric = st.selectbox(
+                    "排序指标",
+                    list(DERIVED_METRICS),
+                    format_func=lambda metric: DERIVED_METRIC_LABELS[metric]
+                )
+            with rank_col2:
+                rank_order = st.selectbox("排序方式", ["从高到低", "从低到高"])
+            with rank_col3:
+                rank_min = st.number_input("最小值", value=None, help="留空表示不限")
+            with rank_col4:
+                rank_max = st.number_input("最大值", value=None, help="留空表示不限")
+
+            with timed('page.数据管理.ranking'):
+                ranked = db.get_reports_by_metric(
+                    rank_metric,
+                    descending=rank_order == "从高到低",
+                    limit=20,
+                    min_value=rank_min,
+                    max_value=rank_max,
+                    start=range_start,
+                    end=range_end,
+                    team_id=team_id
+                )
+            if ranked:
+                rank_columns = dict(display_columns, **{rank_metric: DERIVED_METRIC_LABELS[rank_metric]})
+                st.dataframe(
+                    pd.DataFrame(ranked)[list(rank_columns.keys())].rename(columns=rank_columns),
+                    use_container_width=True,
+                    hide_index=True
+                )
+            else:
+                st.info("筛选范围内没有符合条件的记录")
+
+        # 导出（筛选范围内的全部记录，按块流式读取，不经过页面上的表格）
+        with st.expander("📤 导出数据"):
+            export_format = st.selectbox(
+                "导出格式",
+                list(EXPORT_FORMATS.keys()),
+                format_func=lambda x: {'csv': 'CSV', 'jsonl': 'JSON Lines', 'parquet': 'Parquet'}[x]
+            )
+            extension, mime = EXPORT_FORMATS[export_format]
+            
+            def build_export(fmt=export_format, start=range_start, end=range_end, team=team_id):
+                # 点击下载时才在后台线程生成（Streamlit 会把下载内容整体保存在内存中，
+                # 超大数据量请使用命令行 python exporter.py 直接写文件）
+                output = io.BytesIO()
+                export_reports(db, fmt, output, start=start, end=end, team_id=team)
+                return output
+            
+            st.download_button(
+                f"⬇️ 下载 {summary['report_count']} 条记录",
+                data=build_export,
+                file_name=f"weekly_reports_{team_names[team_id]}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
+        
+        # 历史时点：从该时间点之前最近的检查点重放修改历史，查看当时的数据
+        with st.expander("🕰️ 历史时点数据"):
+            as_of_date = st.date_input("查看该日结束时（UTC）的数据", value=None, key="as_of_date")
+            if as_of_date is not None:
+                with timed('page.数据管理.as_of'):
+                    past_df = db.as_of(as_of_date.strftime('%Y-%m-%d'), team_id=team_id)
+                if past_df.empty:
+                    st.info("该时间点没有数据（早于启用修改历史的时间或当时尚无记录）")
+                else:
+                    st.caption(f"当时共 {len(past_df)} 条记录，显示最近 {min(len(past_df), page_size)} 周")
+                    past_df = past_df.iloc[::-1].head(page_size).drop(columns=['team_id'])
+                    st.dataframe(
+                        past_df.rename(columns=dict(HISTORY_FIELD_LABELS, id='ID')),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+        
+        # 数据统计（筛选范围内，由数据库汇总）
         st.subheader("📊 数据统计")
         col1, col2, col3, col4, col5 = st.columns(5)
         
         with col1:
-            st.metric("总记录数", len(df))
+            st.metric("总记录数", summary['report_count'])
         
         with col2:
-            total_requirements = df['online_requirements'].sum()
-            st.metric("累计上线需求", int(total_requirements))
+            st.metric("累计上线需求", int(summary['total_online_requirements']))
         
         with col3:
-            total_bugs = df['fixed_bugs'].sum()
-            st.metric("累计解决BUG", int(total_bugs))
+            st.metric("累计解决BUG", int(summary['total_fixed_bugs']))
             
         with col4:
-            # 处理可能不存在的new_bugs字段
-            if 'new_bugs' in df.columns:
-                total_new_bugs = df['new_bugs'].sum()
-                st.metric("累计新增BUG", int(total_new_bugs))
-            else:
-                st.metric("累计新增BUG", 0)
+            st.metric("累计新增BUG", int(summary['total_new_bugs']))
         
         with col5:
-            avg_release_orders = df['release_orders'].mean()
-            st.metric("平均发布工单", f"{avg_release_orders:.1f}")
+            st.metric("平均发布工单", f"{summary['avg_release_orders']:.1f}")
+        
+        # 当前页记录作为编辑/删除的候选项
+        record_options = [
+            (report['id'], f"ID: {report['id']} - {report['monday_date']} 至 {report['sunday_date']}")
+            for report in reports
+        ]
         
         # 编辑功能
         st.subheader("✏️ 数据编辑")
         
         if st.checkbox("启用编辑功能"):
             record_to_edit = st.selectbox(
-                "选择要编辑的记录",
-                options=[(row['id'], f"ID: {row['id']} - {row['monday_date']} 至 {row['sunday_date']}") 
-                        for _, row in df.iterrows()],
+                "选择要编辑的记录（当前页）",
+                options=record_options,
                 format_func=lambda x: x[1]
             )
             
@@ -670,7 +837,7 @@ elif selected == "数据管理":
                     )
                     
                     if submitted:
-                        # 准备更新数据
+                        # 准备更新数据（BUG修复率按更新后的BUG数重新计算）
                         update_data = {
                             'monday_date': selected_record['monday_date'],
                             'sunday_date': selected_record['sunday_date'],
@@ -678,7 +845,6 @@ elif selected == "数据管理":
                             'online_req_count': edit_online_req_count,
                             'fixed_bugs': edit_fixed_bugs,
                             'new_bugs': edit_new_bugs,
-                            'bug_fix_rate': 95.0,  # 默认值，保持数据库兼容性
                             'release_orders': edit_release_orders,
                             'release_failures': edit_release_failures,
                             'new_reuse_units': edit_new_reuse_units,
@@ -695,27 +861,121 @@ elif selected == "数据管理":
                                 st.error("❌ 更新失败！")
                         except Exception as e:
                             st.error(f"❌ 更新失败: {str(e)}")
+                
+                # 修改历史（只追加，每次修改记录变化的字段）
+                with st.expander("🕘 修改历史"):
+                    history = db.get_report_history(int(selected_record['id']))
+                    st.dataframe(
+                        pd.DataFrame([
+                            {
+                                "时间 (UTC)": entry['changed_at'],
+                                "操作人": entry['actor'] or "-",
+                                "操作": HISTORY_ACTION_LABELS[entry['action']],
+                                "修改内容": "、".join(
+                                    f"{HISTORY_FIELD_LABELS.get(field, field)}: {value}"
+                                    for field, value in (entry['changes'] or {}).items()
+                                ),
+                            }
+                            for entry in history
+                        ], columns=["时间 (UTC)", "操作人", "操作", "修改内容"]),
+                        use_container_width=True,
+                        hide_index=True
+                    )
         
-        # 删除功能
-        st.subheader("🗑️ 数据删除")
-        st.warning("⚠️ 删除操作不可恢复，请谨慎操作！")
+    # 删除功能（软删除：一次提交删除所选的全部记录，可撤销）
+    # 撤销和已删除记录不依赖当前页的数据：删掉当前筛选下的最后几条后仍然可以恢复
+    st.subheader("🗑️ 数据删除")
+    
+    # 上一次删除的记录，提供撤销；切换团队后不再提供
+    if st.session_state.get('last_deleted_team_id') != team_id:
+        st.session_state.last_deleted_ids = None
+    last_deleted = st.session_state.get('last_deleted_ids')
+    if last_deleted:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.info(f"已删除 {len(last_deleted)} 条记录")
+        with col2:
+            if st.button("↩️ 撤销删除", use_container_width=True):
+                restored = db.restore_reports(last_deleted)
+                st.session_state.last_deleted_ids = None
+                if len(restored) < len(last_deleted):
+                    st.session_state.delete_notice = (
+                        f"已恢复 {len(restored)} 条记录，{len(last_deleted) - len(restored)} 条因同一周已有新数据未恢复"
+                    )
+                st.rerun()
+    
+    notice = st.session_state.pop('delete_notice', None)
+    if notice:
+        st.warning(notice)
+    
+    if summary['report_count'] > 0 and st.checkbox("启用删除功能"):
+        select_all = st.checkbox("全选当前页")
+        records_to_delete = st.multiselect(
+            "选择要删除的记录（当前页）",
+            options=record_options,
+            default=record_options if select_all else [],
+            format_func=lambda x: x[1]
+        )
         
-        if st.checkbox("启用删除功能"):
-            record_to_delete = st.selectbox(
-                "选择要删除的记录",
-                options=[(row['id'], f"ID: {row['id']} - {row['monday_date']} 至 {row['sunday_date']}") 
-                        for _, row in df.iterrows()],
-                format_func=lambda x: x[1]
+        if st.button(f"🗑️ 确认删除 {len(records_to_delete)} 条", type="secondary",
+                     disabled=not records_to_delete):
+            # 确保ID是Python原生int类型
+            delete_ids = [int(record[0]) for record in records_to_delete]
+            deleted = db.delete_reports(delete_ids)
+            st.session_state.last_deleted_ids = delete_ids
+            st.session_state.last_deleted_team_id = team_id
+            if deleted < len(delete_ids):
+                st.session_state.delete_notice = f"{len(delete_ids) - deleted} 条记录已不存在，未删除"
+            st.rerun()
+    
+    # 已删除的记录可以批量恢复
+    with st.expander("♻️ 已删除的记录"):
+        deleted_reports = db.get_deleted_reports(team_id=team_id)
+        if deleted_reports:
+            st.dataframe(
+                pd.DataFrame(deleted_reports)[['id', 'team_id', 'monday_date', 'sunday_date', 'deleted_at', 'deleted_by']]
+                .rename(columns={'id': 'ID', 'team_id': '团队', 'monday_date': '周一日期', 'sunday_date': '周日日期',
+                                 'deleted_at': '删除时间 (UTC)', 'deleted_by': '操作人'}),
+                use_container_width=True,
+                hide_index=True
+            )
+            records_to_restore = st.multiselect(
+                "选择要恢复的记录",
+                options=[report['id'] for report in deleted_reports],
+                format_func=lambda x: f"ID: {x}"
+            )
+            if st.button("♻️ 恢复所选记录", disabled=not records_to_restore):
+                restored = db.restore_reports([int(report_id) for report_id in records_to_restore])
+                # 已经恢复的记录不能再撤销删除
+                st.session_state.last_deleted_ids = None
+                skipped = len(records_to_restore) - len(restored)
+                if skipped:
+                    st.session_state.delete_notice = f"已恢复 {len(restored)} 条记录，{skipped} 条因同一周已有新数据未恢复"
+                st.rerun()
+        else:
+            st.info("暂无已删除的记录")
+
+# 性能面板：本次刷新的分段耗时（缩进表示嵌套）及各项最近的耗时分位数
+if show_perf_panel:
+    with perf_panel:
+        st.caption(f"本次刷新耗时 {(time.perf_counter() - rerun_started) * 1000:.1f} ms")
+        perf_run = current_run()
+        st.dataframe(
+            pd.DataFrame({
+                "项目": ["　" * timing.depth + timing.name for timing in perf_run],
+                "耗时(ms)": [round(timing.ms, 2) for timing in perf_run],
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        percentiles = pd.DataFrame(rolling_percentiles())
+        if not percentiles.empty:
+            st.caption("最近耗时分位数 (ms)")
+            st.dataframe(
+                percentiles.round(2).rename(columns={'name': '项目', 'count': '次数'}),
+                use_container_width=True,
+                hide_index=True
             )
-            
-            if st.button("🗑️ 确认删除", type="secondary"):
-                # 确保ID是Python原生int类型
-                delete_id = int(record_to_delete[0])
-                if db.delete_report(delete_id):
-                    st.success("✅ 删除成功！")
-                    st.rerun()
-                else:
-                    st.error("❌ 删除失败！")
 
 # 页脚
 st.markdown("---")